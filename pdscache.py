@@ -1,7 +1,9 @@
+import heapq
 import os
 import sys
 import time
 import random
+from collections import OrderedDict
 
 try:
     import pylibmc
@@ -37,7 +39,17 @@ class DictionaryCache(PdsCache):
         """
 
         self.dict = {}              # returns (value, expiration) by key
-        self.keys = set()           # set of non-permanent keys
+
+        self.lru = OrderedDict()
+        # This contains every non-permanent key, in order from least to most
+        # recently used. When the limit is exceeded, keys are evicted from the
+        # front.
+
+        self.heap = []
+        # This is a heap of (expiration, key) tuples, used to remove expired
+        # values. An entry is out of date if the key has since been deleted or
+        # given a new expiration time; such entries are skipped when popped and
+        # discarded whenever the heap is rebuilt.
 
         if type(lifetime).__name__ == 'function':
             self.lifetime_func = lifetime
@@ -54,30 +66,73 @@ class DictionaryCache(PdsCache):
 
         self.preload_eligible = True
 
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
     def _trim(self):
-        """Trim the dictionary if it is too big."""
-
-        if len(self.keys) > self.limit + self.slop:
-            expirations = [(self.dict[k][1], k) for k in self.keys if
-                            self.dict[k][1] is not None]
-            expirations.sort()
-            pairs = expirations[:-self.limit]
-            for (_, key) in pairs:
+        """Remove expired values, and then remove the least recently used
+        values until the limit is satisfied."""
+
+        now = time.time()
+        expirations = 0
+        while self.heap and self.heap[0][0] < now:
+            (expiration, key) = heapq.heappop(self.heap)
+            pair = self.dict.get(key, None)
+            if pair is not None and pair[1] == expiration:
                 del self.dict[key]
-                self.keys.remove(key)
+                del self.lru[key]
+                expirations += 1
 
-            if self.logger:
-                self.logger.debug('%d items trimmed from DictionaryCache' %
-                                  len(pairs))
+        evictions = 0
+        while len(self.lru) > self.limit:
+            (key, _) = self.lru.popitem(last=False)
+            del self.dict[key]
+            evictions += 1
+
+        # Discard out-of-date heap entries once they outnumber current ones
+        if len(self.heap) > 2 * len(self.lru) + self.slop:
+            self.heap = [(self.dict[k][1], k) for k in self.lru]
+            heapq.heapify(self.heap)
+
+        self.expirations += expirations
+        self.evictions += evictions
+
+        if (expirations or evictions) and self.logger:
+            self.logger.debug('%d items trimmed from DictionaryCache' %
+                              (expirations + evictions))
 
     def _trim_if_necessary(self):
         if self.pauses == 0:
             self._trim()
 
+    def stats(self):
+        """Dictionary of statistics about the cache contents and usage."""
+
+        return {
+            'size': len(self.dict),
+            'permanent': len(self.dict) - len(self.lru),
+            'limit': self.limit,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
     def flush(self):
         """Flush any buffered items. Not used for DictionaryCache."""
         return
 
+    def round_trip_stats(self):
+        """Dictionary of round trips to an external cache. Always zero for
+        DictionaryCache."""
+        return {'total': 0}
+
+    def reset_round_trips(self):
+        """Reset the counts of round trips. Not used for DictionaryCache."""
+        return
+
     def wait_for_unblock(self, funcname=''):
         """Pause until another process stops blocking, or until timeout."""
         return
@@ -131,24 +186,36 @@ class DictionaryCache(PdsCache):
 
         return len(self.dict)
 
+    @property
+    def permanent_values(self):
+        """Dictionary of the values that never expire, keyed by key."""
+
+        return {key:pair[0] for (key, pair) in self.dict.items()
+                            if key not in self.lru}
+
     ######## Get methods
 
     def get(self, key):
         """Return the value associated with a key. Return None if the key is
         missing."""
 
-        if key not in self.dict:
+        pair = self.dict.get(key, None)
+        if pair is None:
+            self.misses += 1
             return None
 
-        (value, expiration) = self.dict[key]
+        (value, expiration) = pair
 
-        if expiration is None:
-            return value
+        if expiration is not None:
+            if expiration < time.time():
+                self.delete(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
 
-        if expiration < time.time():
-            del self[key]
-            return None
+            self.lru.move_to_end(key)
 
+        self.hits += 1
         return value
 
     def __getitem__(self, key):
@@ -166,12 +233,16 @@ class DictionaryCache(PdsCache):
 
         mydict = {}
         for key in keys:
-            value = self[key]
+            value = self.get(key)
             if value is not None:
                 mydict[key] = value
 
         return mydict
 
+    def prefetch(self, keys):
+        """Retrieve multiple keys in advance. Not used for DictionaryCache."""
+        return 0
+
     def get_local(self, key):
         """Return the value associated with a key, only using the local dict."""
 
@@ -191,6 +262,15 @@ class DictionaryCache(PdsCache):
                     None to use the default lifetime.
         """
 
+        self._set(key, value, lifetime)
+
+        # Trim if necessary
+        if not self.is_paused:
+            self._trim_if_necessary()
+
+    def _set(self, key, value, lifetime):
+        """Set the value associated with a key, without trimming."""
+
         # Determine the expiration time
         if lifetime is None:
             if self.lifetime:
@@ -198,19 +278,16 @@ class DictionaryCache(PdsCache):
             else:
                 lifetime = self.lifetime_func(value)
 
+        # Save in the dictionary
         if lifetime == 0:
-            expiration = None
+            self.dict[key] = (value, None)
+            self.lru.pop(key, None)
         else:
             expiration = time.time() + lifetime
-
-        # Save in the dictionary
-        self.dict[key] = (value, expiration)
-        if expiration:
-            self.keys.add(key)
-
-        # Trim if necessary
-        if not self.is_paused:
-            self._trim_if_necessary()
+            self.dict[key] = (value, expiration)
+            self.lru[key] = None
+            self.lru.move_to_end(key)
+            heapq.heappush(self.heap, (expiration, key))
 
     def __setitem__(self, key, value):
         """Enable dictionary syntax."""
@@ -221,7 +298,7 @@ class DictionaryCache(PdsCache):
         """Set multiple values at one time based on a dictionary."""
 
         for (key, value) in mydict.items():
-            self.set(key, value, lifetime, pause=True)
+            self._set(key, value, lifetime)
 
         if not pause:
             self._trim_if_necessary()
@@ -241,6 +318,7 @@ class DictionaryCache(PdsCache):
 
         if key in self.dict:
             del self.dict[key]
+            self.lru.pop(key, None)
             return True
 
         return False
@@ -248,11 +326,8 @@ class DictionaryCache(PdsCache):
     def __delitem__(self, key):
         """Enable the "del" operator. Raise KeyError if the key is absent."""
 
-        if key in self.dict:
-            del self.dict[key]
-            return
-
-        raise KeyError(key)
+        if not self.delete(key):
+            raise KeyError(key)
 
     def delete_multi(self, keys):
         """Delete multiple items based on a list of keys. Keys not found in
@@ -260,10 +335,7 @@ class DictionaryCache(PdsCache):
 
         status = True
         for key in keys:
-            if key in self.dict:
-                del self.dict[key]
-            else:
-                status = False
+            status &= self.delete(key)
 
         return status
 
@@ -271,7 +343,8 @@ class DictionaryCache(PdsCache):
         """Clear all contents of the cache."""
 
         self.dict.clear()
-        self.keys = set()
+        self.lru.clear()
+        self.heap = []
 
     def replicate_clear(self, clear_count):
         """Clear the local cache if clear_count was incremented.
@@ -297,9 +370,33 @@ class DictionaryCache(PdsCache):
 
 MAX_BLOCK_SECONDS = 120.
 
+CONTROL_INTERVAL = 0.5  # seconds that $CLEAR_COUNT and $OK_PID are trusted
+                        # by operations that only read the cache
+
+# Memcached->get_multi has been seen to hang on long lists; individual requests
+# work fine. By default, keys are therefore requested one at a time. A positive
+# value enables memcached get_multi requests of up to this many keys.
+GET_MULTI_CHUNK = 0
+CHUNK_SUFFIX = '$CHUNK-'
+
+class CachedChunks(object):
+    """Saved in memcache in place of a value that was split into chunks by its
+    split_for_cache() method. The chunks are saved under the same key followed
+    by CHUNK_SUFFIX and the chunk index, and they are passed to the
+    join_from_cache() method of the saved value on retrieval."""
+
+    def __init__(self, value, count):
+        self.value = value
+        self.count = count
+
+def _chunk_key(key, k):
+    return key + CHUNK_SUFFIX + str(k)
+
 class MemcachedCache(PdsCache):
 
-    def __init__(self, port=11211, lifetime=86400, logger=None):
+    def __init__(self, port=11211, lifetime=86400, logger=None,
+                       control_interval=CONTROL_INTERVAL,
+                       get_multi_chunk=GET_MULTI_CHUNK):
         """Constructor.
 
         Input:
@@ -311,9 +408,38 @@ class MemcachedCache(PdsCache):
                             the default lifetime must be returned by
                                 lifetime(self)
             logger          PdsLogger to use, optional.
+            control_interval
+                            number of seconds during which the most recently
+                            read values of '$CLEAR_COUNT' and '$OK_PID' are
+                            trusted without another trip to memcache, by
+                            operations that only read the cache. Operations
+                            that change the cache always check them. Use 0 to
+                            check them before every operation.
+            get_multi_chunk maximum number of keys to request from memcache in
+                            one get_multi call; 0 to request keys one at a time.
         """
 
         self.port = port
+        self.control_interval = control_interval
+        self.get_multi_chunk = get_multi_chunk
+
+        self.round_trips = {}
+        # This is a count of trips to memcache, keyed by the name of the
+        # operation that required it. The control keys '$CLEAR_COUNT' and
+        # '$OK_PID' are counted under 'control'.
+
+        self.control_time = 0.
+        self.control_values = (None, None)
+        # These are the time and values (clear_count, ok_pid) of the most
+        # recent check of the control keys. A control_time of zero forces the
+        # next check to go to memcache.
+
+        self.prefetched = {}
+        self.prefetch_time = 0.
+        # prefetched is an internal dictionary of values retrieved from memcache
+        # in advance by prefetch(). They are trusted for the same interval as
+        # the control keys, so that the gets issued by a single request can be
+        # served by one round trip.
 
         if type(port) == str:
             self.mc = pylibmc.Client([port], binary=True)
@@ -360,9 +486,11 @@ class MemcachedCache(PdsCache):
         # Test the cache with a random key so as not to clobber existing keys
         while True:
             key = str(random.randint(0,10**40))
+            self._tally('init')
             if key in self.mc:
                 continue
 
+            self._tally('init', 2)
             self.mc[key] = 1
             del self.mc[key]
             break
@@ -371,32 +499,81 @@ class MemcachedCache(PdsCache):
         self.pid = os.getpid()
 
         # Initialize cache as unblocked
+        self._tally('init')
         ok_pid = self.mc.get('$OK_PID')
         if ok_pid is None:
+            self._tally('init')
             self.mc.set('$OK_PID', 0, time=0)
         # When the cached value of '$OK_PID' is nonzero, it means that the
         # thread with this process ID is currently blocking it.
 
         # Get the current count of clear() events and save it internally
+        self._tally('init')
         self.clear_count = self.mc.get('$CLEAR_COUNT')
         if self.clear_count is None:
             self.clear_count = 0
+            self._tally('init')
             self.mc.set('$CLEAR_COUNT', 0, time=0)
         # This is the internal copy of the cached value of '$CLEAR_COUNT'. When
         # a thread clears the cache, this value is incremented. If this thread
         # finds a cached value that differs from its internal value, it knows
         # to clear its own contents.
 
-    def _wait_for_ok(self, funcname='', try_to_block=False):
-        """Pause until another process stops blocking, or until timeout."""
+    ######## Round trip methods
+
+    def _tally(self, op, count=1):
+        """Add to the count of round trips to memcache for an operation."""
+
+        self.round_trips[op] = self.round_trips.get(op, 0) + count
+
+    def round_trip_stats(self):
+        """Dictionary of the number of round trips to memcache, keyed by the
+        name of the operation. Key 'total' is the sum over all operations."""
+
+        stats = self.round_trips.copy()
+        stats['total'] = sum(self.round_trips.values())
+        return stats
+
+    def reset_round_trips(self):
+        """Reset all the counts of round trips to memcache."""
+
+        self.round_trips.clear()
+
+    ######## Control key methods
+
+    def _read_controls(self, force=False):
+        """Tuple (clear_count, ok_pid) from memcache. Values read within the
+        last control_interval seconds are re-used unless force is True."""
+
+        now = time.time()
+        if (not force and self.control_time and
+            now - self.control_time < self.control_interval):
+                return self.control_values
+
+        mydict = self._get_multi_from_mc(['$CLEAR_COUNT', '$OK_PID'], 'control')
+        self.control_values = (mydict.get('$CLEAR_COUNT'),
+                               mydict.get('$OK_PID'))
+        self.control_time = now
+        return self.control_values
+
+    def _expire_controls(self):
+        """Force the next check of the control keys to go to memcache."""
+
+        self.control_time = 0.
+
+    def _wait_for_ok(self, funcname='', try_to_block=False, force=False):
+        """Pause until another process stops blocking, or until timeout. If
+        force is True, the block status is re-read from memcache."""
 
         was_blocked = False
         broken_block = False
+        force = force or try_to_block
         while True:
-            blocking_pid = self.mc.get('$OK_PID')
+            blocking_pid = self._read_controls(force=force)[1]
             if blocking_pid in (0, self.pid):
                 break
 
+            force = True
             was_blocked = True
             unblock_time = time.time() + MAX_BLOCK_SECONDS
             if self.logger:
@@ -412,20 +589,25 @@ class MemcachedCache(PdsCache):
             while True:
                 time.sleep(0.5 * (1. + random.random())) # A random short delay
 
+                self._tally('control')
                 test_pid = self.mc.get('$OK_PID')
                 if test_pid != blocking_pid:
                     break
 
                 if time.time() > unblock_time:
                     new_pid = self.pid if try_to_block else 0
+                    self._tally('control')
                     self.mc.set('$OK_PID', new_pid, time=0)
+                    self._expire_controls()
                     self.logger.warn(f'Process {self.pid} broke a block by ' +
                                      f'{blocking_pid} on ' +
                                      f'MemcacheCache [{self.port}]')
                     return True
 
         if try_to_block and blocking_pid != self.pid:
+            self._tally('control')
             self.mc.set('$OK_PID', self.pid, time=0)
+            self._expire_controls()
 
         return was_blocked
 
@@ -440,6 +622,19 @@ class MemcachedCache(PdsCache):
 
         return was_blocked
 
+    def _wait_to_write(self, funcname=''):
+        """Same as wait_for_unblock(), but always re-read the block status from
+        memcache. Use before any operation that changes the cache, so that it
+        cannot proceed on an old status while another process blocks."""
+
+        was_blocked = self._wait_for_ok(funcname=funcname, try_to_block=False,
+                                        force=True)
+        if was_blocked and self.logger:
+            self.logger.info(f'Process {self.pid} is unblocked on ' +
+                             f'MemcacheCache [{self.port}]')
+
+        return was_blocked
+
     def wait_and_block(self, funcname=''):
         """Pause until another process stops blocking, or until timeout, and
         then obtain the block. True if any wait was required."""
@@ -449,6 +644,7 @@ class MemcachedCache(PdsCache):
             was_blocked |= self._wait_for_ok(funcname=funcname,
                                              try_to_block=True)
 
+            self._tally('control')
             test_pid = self.mc.get('$OK_PID')
             if test_pid == self.pid:
                 if self.logger:
@@ -462,6 +658,7 @@ class MemcachedCache(PdsCache):
     def unblock(self, flush=True):
         """Remove block preventing processes from touching the cache."""
 
+        self._tally('control')
         test_pid = self.mc.get('$OK_PID')
         if not test_pid:
             if self.logger:
@@ -477,7 +674,9 @@ class MemcachedCache(PdsCache):
                                   f'Cache is blocked by process {test_pid}')
                 return
 
+        self._tally('control')
         self.mc.set('$OK_PID', 0, time=0)
+        self._expire_controls()
         if self.logger:
             self.logger.info(f'Process {self.pid} removed block of ' +
                              f'MemcachedCache [{self.port}]')
@@ -489,9 +688,12 @@ class MemcachedCache(PdsCache):
         """Status of blocking. 0 if unblocked; otherwise ID of process that is
         now blocking."""
 
+        self._tally('control')
         test_pid = self.mc.get('$OK_PID')
         if test_pid is None:                    # repair a missing $OK_PID
+            self._tally('control')
             self.mc.set('$OK_PID', 0, time=0)
+            self._expire_controls()
             test_pid = 0
 
         if test_pid in (0, self.pid):
@@ -533,6 +735,7 @@ class MemcachedCache(PdsCache):
         if key in self.toobig_dict: return True
         if key in self.local_value_by_key: return True
         if key in self.permanent_values: return True
+        self._tally('contains')
         return key in self.mc
 
     def __len__(self):
@@ -541,16 +744,19 @@ class MemcachedCache(PdsCache):
         items = self.len_mc()
 
         for key in self.toobig_dict:
+            self._tally('len')
             if key not in self.mc:
                 items += 1
 
         for key in self.local_value_by_key:
+            self._tally('len')
             if key not in self.mc:
                 items += 1
 
         return items
 
     def len_mc(self):
+        self._tally('len')
         return int(self.mc.get_stats()[0][1]['curr_items'])
 
     ######## Flush methods
@@ -562,6 +768,8 @@ class MemcachedCache(PdsCache):
         if len(self.local_value_by_key) == 0:
             return
 
+        # Wait first, so the clear count checked below is also up to date
+        self._wait_to_write('flush')
         if self.replicate_clear_if_necessary():
             return
 
@@ -570,28 +778,30 @@ class MemcachedCache(PdsCache):
             for k in self.local_keys_by_lifetime[0]:
                 self.permanent_values[k] = self.local_value_by_key[k]
 
-        self.wait_for_unblock('flush')
-
         # Cache items grouped by lifetime
         failures = []
         toobigs = []
         for lifetime in self.local_keys_by_lifetime:
 
             # Save tuples (value, lifetime)
-            mydict = {k:(self.local_value_by_key[k], lifetime) for
-                                k in self.local_keys_by_lifetime[lifetime]}
+            mydict = {}
+            for k in self.local_keys_by_lifetime[lifetime]:
+                mydict.update(self._split_value(k, self.local_value_by_key[k],
+                                                lifetime))
 
             # Update to memcache
             try:
+                self._tally('flush')
                 self.mc.set_multi(mydict, time=lifetime)
             except pylibmc.TooBig:
                 for (k,v) in mydict.items():
                   try:
+                    self._tally('flush')
                     self.mc.set(k, v, time=lifetime)
                   except pylibmc.TooBig:
                     toobigs.append(k)
                     failures.append(k)
-                    self.toobig_dict[k] = v[0]
+                    self.toobig_dict[k] = self.local_value_by_key.get(k, v[0])
                     if self.logger:
                       self.logger.warn(f'TooBig error in process ' +
                                        f'{self.pid}; ' +
@@ -645,9 +855,21 @@ class MemcachedCache(PdsCache):
         if key in self.local_value_by_key:
             return self.local_value_by_key[key]
 
+        # Use a recently prefetched value if available
+        self._expire_prefetched_if_necessary()
+        if key in self.prefetched:
+            pair = self.prefetched[key]
+
         # Otherwise, go to memcache
-        self.wait_for_unblock('get')
-        pair = self.mc.get(key)
+        else:
+            self.wait_for_unblock('get')
+            self._tally('get')
+            pair = self.mc.get(key)
+
+        # Re-assemble a value saved in chunks; treat a lost chunk as missing
+        if pair is not None:
+            value = self._join_value(key, pair[0])
+            pair = None if value is None else (value, pair[1])
 
         # Value not found...
         if pair is None:
@@ -694,17 +916,15 @@ class MemcachedCache(PdsCache):
         # Retrieve non-local keys if any
         if nonlocal_keys:
             self.wait_for_unblock('get_multi')
+            pairs = self._get_multi_from_mc(nonlocal_keys, 'get_multi')
 
-# Memcached->get_multi hangs on long lists; individual requests work fine
-#             mydict = self.mc.get_multi(nonlocal_keys)
             mydict = {}
-            for key in nonlocal_keys:
-                pair = self.mc.get(key)
-                if pair:
-                    mydict[key] = pair
-
-            for (key, tuple) in mydict.items():
+            for (key, tuple) in pairs.items():
                 (value, lifetime) = tuple
+                value = self._join_value(key, value)
+                if value is None:
+                    continue
+
                 mydict[key] = value
 
                 # Update the local copy of any permanent values
@@ -729,6 +949,107 @@ class MemcachedCache(PdsCache):
 
         return mydict
 
+    def _get_multi_from_mc(self, keys, funcname):
+        """Return a dictionary of (value, lifetime) tuples from memcache based
+        on a list or set of keys. Missing keys do not appear in the returned
+        dictionary."""
+
+        # Memcached->get_multi hangs on long lists; individual requests work
+        # fine. Chunks of limited size are only used if enabled.
+        mydict = {}
+        if not self.get_multi_chunk:
+            for key in keys:
+                self._tally(funcname)
+                pair = self.mc.get(key)
+                if pair is not None:
+                    mydict[key] = pair
+
+            return mydict
+
+        keys = list(keys)
+        chunk = self.get_multi_chunk
+        for k in range(0, len(keys), chunk):
+            self._tally(funcname)
+            mydict.update(self.mc.get_multi(keys[k:k+chunk]))
+
+        return mydict
+
+    def _split_value(self, key, value, lifetime):
+        """Dictionary of (value, lifetime) tuples to save in memcache for one
+        key. A value with a split_for_cache() method may be saved as a
+        CachedChunks object plus separate keys for its chunks."""
+
+        split_for_cache = getattr(value, 'split_for_cache', None)
+        split = split_for_cache() if split_for_cache else None
+        if split is None:
+            return {key: (value, lifetime)}
+
+        (value, chunks) = split
+        mydict = {key: (CachedChunks(value, len(chunks)), lifetime)}
+        for (k, chunk) in enumerate(chunks):
+            mydict[_chunk_key(key, k)] = (chunk, lifetime)
+
+        return mydict
+
+    def _join_value(self, key, value):
+        """Re-assemble a value retrieved from memcache if it was saved in
+        chunks. Return None if any chunk is missing."""
+
+        if not isinstance(value, CachedChunks):
+            return value
+
+        keys = [_chunk_key(key, k) for k in range(value.count)]
+        chunks = {k:self.toobig_dict[k] for k in keys if k in self.toobig_dict}
+        pairs = self._get_multi_from_mc([k for k in keys if k not in chunks],
+                                        'chunks')
+        for (k, pair) in pairs.items():
+            chunks[k] = pair[0]
+
+        if len(chunks) < len(keys):
+            return None
+
+        return value.value.join_from_cache([chunks[k] for k in keys])
+
+    def prefetch(self, keys):
+        """Retrieve multiple keys from memcache using as few round trips as
+        possible, so that calls to get() for these keys during the next
+        control_interval seconds require no further trips. Use this when a
+        single request is about to look up many keys, e.g., the children of a
+        directory. Return the number of keys found."""
+
+        self.replicate_clear_if_necessary()
+        self._expire_prefetched_if_necessary()
+
+        keys = [k for k in set(keys) if k not in self.toobig_dict and
+                                        k not in self.local_value_by_key and
+                                        k not in self.prefetched]
+        if not keys:
+            return 0
+
+        self.wait_for_unblock('prefetch')
+        mydict = self._get_multi_from_mc(keys, 'prefetch')
+
+        if not self.prefetched:
+            self.prefetch_time = time.time()
+
+        # Missing keys are saved as None, same as the result of mc.get()
+        for key in keys:
+            pair = mydict.get(key, None)
+            self.prefetched[key] = pair
+
+            # Update the local copy of any permanent values
+            if pair and pair[1] == 0 and not isinstance(pair[0], CachedChunks):
+                self.permanent_values[key] = pair[0]
+
+        return len(mydict)
+
+    def _expire_prefetched_if_necessary(self):
+        """Discard prefetched values older than the control interval."""
+
+        if (self.prefetched and
+            time.time() - self.prefetch_time >= self.control_interval):
+                self.prefetched.clear()
+
     def get_local(self, key):
         """Return the value associated with a key, only using the local dict."""
 
@@ -744,12 +1065,13 @@ class MemcachedCache(PdsCache):
     def get_now(self, key):
         """Return the non-local value associated with a key, even if blocked."""
 
+        self._tally('get_now')
         result = self.mc.get(key)
         if result is None:
             return None
 
         (value, lifetime) = result
-        return value
+        return self._join_value(key, value)
 
     ######## Set methods
 
@@ -763,6 +1085,7 @@ class MemcachedCache(PdsCache):
 
         if (lifetime is None) and (key not in self.local_lifetime_by_key):
             try:
+                self._tally('set')
                 (_, lifetime) = self.mc[key]
             except KeyError:
                 pass
@@ -794,8 +1117,8 @@ class MemcachedCache(PdsCache):
 
         # Retrieve lifetimes from cache if necessary
         if lifetime is None and nonlocal_keys:
-            nonlocal_dict = self.mc.get_multi(nonlocal_keys)
-            for (key, tuple) in nonlocal_dict:
+            nonlocal_dict = self._get_multi_from_mc(nonlocal_keys, 'set_multi')
+            for (key, tuple) in nonlocal_dict.items():
                 lifetime = tuple[1]
                 self.local_lifetime_by_key[key] = lifetime
 
@@ -822,6 +1145,7 @@ class MemcachedCache(PdsCache):
 
         # Save the value
         self.local_value_by_key[key] = value
+        self.prefetched.pop(key, None)
 
         # Determine the lifetime
         if lifetime is None:
@@ -857,9 +1181,11 @@ class MemcachedCache(PdsCache):
     def delete(self, key):
         """Delete one key. Return True if it was deleted, False otherwise."""
 
-        self.wait_for_unblock('delete')
+        self._wait_to_write('delete')
+        self._tally('delete')
         status1 = self.mc.delete(key)
         status2 = self._delete_local(key)
+        self.prefetched.pop(key, None)
 
         if key in self.permanent_values:
             del self.permanent_values[key]
@@ -882,7 +1208,8 @@ class MemcachedCache(PdsCache):
         """Delete multiple items based on a list of keys. Keys not found in
         the cache are ignored. Returns True if all keys were deleted."""
 
-        self.wait_for_unblock('delete_multi')
+        self._wait_to_write('delete_multi')
+        self._tally('delete_multi')
         _ = self.mc.del_multi(keys)
 
         # Save the current length
@@ -890,7 +1217,7 @@ class MemcachedCache(PdsCache):
 
         # Delete whatever we can from the local cache and  permanent dictionary
         for key in keys:
-            _ = self._del_local(key)
+            _ = self._delete_local(key)
 
             if key in self.permanent_values:
                 del self.permanent_values[key]
@@ -898,6 +1225,8 @@ class MemcachedCache(PdsCache):
             if key in self.toobig_dict:
                 del self.toobig_dict[key]
 
+            self.prefetched.pop(key, None)
+
         count = len(self) - prev_len
         return (count == len(keys))
 
@@ -929,14 +1258,17 @@ class MemcachedCache(PdsCache):
         if block:
             self.wait_and_block('clear')
         else:
-            self.wait_for_unblock('clear')
+            self._wait_to_write('clear')
 
+        self._tally('clear', 3)
         clear_count = max(self.mc.get('$CLEAR_COUNT'), self.clear_count) + 1
         self.mc.flush_all()
         self.mc.set_multi({'$OK_PID': self.pid, # retain block!
                            '$CLEAR_COUNT': clear_count}, time=0)
+        self._expire_controls()
 
         self.local_value_by_key.clear()
+        self.prefetched.clear()
         self.local_keys_by_lifetime.clear()
         self.local_lifetime_by_key.clear()
         self.permanent_values.clear()
@@ -966,10 +1298,13 @@ class MemcachedCache(PdsCache):
             return False
 
         if clear_count is None:         # lost from memcache!
+            self._tally('control')
             self.mc.set('$CLEAR_COUNT', clear_count, time=0)
+            self._expire_controls()
             return False
 
         self.local_value_by_key.clear()
+        self.prefetched.clear()
         self.local_keys_by_lifetime.clear()
         self.local_lifetime_by_key.clear()
         self.permanent_values.clear()
@@ -982,14 +1317,17 @@ class MemcachedCache(PdsCache):
         return True
 
     def replicate_clear_if_necessary(self):
-        """Clear the local cache if MemCache was cleared by another process."""
+        """Clear the local cache if MemCache was cleared by another process. The
+        clear count is only re-read from memcache after the control interval.
+        """
 
-        clear_count = self.mc.get('$CLEAR_COUNT')
+        clear_count = self._read_controls()[0]
         return self.replicate_clear(clear_count)
 
     def was_cleared(self):
         """Returns True if the cache has been cleared."""
 
+        self._tally('control')
         clear_count = self.mc.get('$CLEAR_COUNT')
         return clear_count > self.clear_count
 
@@ -1005,25 +1343,24 @@ class MemcachedCache(PdsCache):
         # Update permanent values from cache
         local_dict = self.permanent_values.copy()
 
-# Memcached->get_multi hangs on long lists; individual requests work fine
-#         permanent_keys = list(self.permanent_values.keys())
-#         mydict = self.mc.get_multi(permanent_keys)
-#         for (key, pair) in mydict.items():
-#             self.permanent_values[key] = pair[0]
-#             del local_dict[key]
-
-        for key in self.permanent_values:
-            pair = self.mc.get(key)
-            if pair:
-                self.permanent_values[key] = pair[0]
+        mydict = self._get_multi_from_mc(self.permanent_values, 'restore')
+        for (key, pair) in mydict.items():
+            value = self._join_value(key, pair[0])
+            if value is not None:
+                self.permanent_values[key] = value
                 del local_dict[key]
 
         # At this point, local_dict contains all the permanent values currently
         # missing from the cache. Also, self.permanent_values is as up to date
         # as it can be.
 
-        mydict = {k:(v,0) for (k,v) in local_dict.items()}
+        mydict = {}
+        for (k,v) in local_dict.items():
+            mydict.update(self._split_value(k, v, 0))
+
+        self._wait_to_write('restore')
         try:
+            self._tally('restore')
             self.mc.set_multi(mydict, time=0)
 
         except pylibmc.TooBig:
@@ -1034,13 +1371,360 @@ class MemcachedCache(PdsCache):
 
             for (k,v) in mydict.items():
                 try:
+                    self._tally('restore')
                     self.mc.set(k, v, time=0)
                 except pylibmc.TooBig:
                     self.logger.warn(f'Permanent object is TooBig in process ' +
                                      f'{self.pid}; ' +
                                      'removed from permanent list and saved ' +
                                      'to internal cache', k)
-                    self.toobig_dict[k] = v[0]
-                    del self.permanent_values[k]
+                    self.toobig_dict[k] = local_dict.get(k, v[0])
+                    self.permanent_values.pop(k, None)
+
+################################################################################
+################################################################################
+################################################################################
+
+NEAR_LIFETIME = 60      # default seconds to keep a value in the near cache
+
+class TwoTierCache(PdsCache):
+    """A bounded, in-process LRU cache (the "near" tier) in front of a
+    MemcachedCache (the "far" tier).
+
+    Values found in the near tier are returned without a trip to memcache or
+    any unpickling. Every set goes to both tiers. The near tier is emptied
+    whenever the MemcachedCache replicates a clear() by any process, using the
+    '$CLEAR_COUNT' protocol. Values changed by other processes can be seen late
+    by up to near_lifetime seconds.
+    """
+
+    def __init__(self, port=11211, lifetime=86400, logger=None,
+                       limit=1000, near_lifetime=NEAR_LIFETIME,
+                       control_interval=CONTROL_INTERVAL,
+                       get_multi_chunk=GET_MULTI_CHUNK):
+        """Constructor.
+
+        Input:
+            port            port number for the memcache, which must already
+                            have been established. Alternatively, the absolute
+                            path to a Unix socket.
+            lifetime        default lifetime in seconds in memcache; 0 for no
+                            expiration. Can be a constant or a function; see
+                            MemcachedCache.
+            logger          PdsLogger to use, optional.
+            limit           maximum number of values in the near tier.
+            near_lifetime   maximum number of seconds that a value is kept in
+                            the near tier.
+            control_interval
+                            seconds to trust the block and clear status of the
+                            memcache; see MemcachedCache.
+            get_multi_chunk maximum number of keys in one memcache get_multi
+                            call; see MemcachedCache.
+        """
+
+        self.far = MemcachedCache(port, lifetime=lifetime, logger=logger,
+                                  control_interval=control_interval,
+                                  get_multi_chunk=get_multi_chunk)
+        self.port = port
+        self.logger = logger
+        self.limit = limit
+        self.near_lifetime = near_lifetime
+
+        self.near = OrderedDict()
+        # This is the near tier, returning (value, expiration time) by key, in
+        # order from least to most recently used.
+
+        self.clear_count = self.far.clear_count
+        # This is the clear count of the far tier when the near tier was last
+        # known to be valid.
+
+        self.near_hits = 0
+        self.far_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    ######## Near tier methods
+
+    def _check_clear(self):
+        """Empty the near tier if the far tier has cleared or replicated a clear
+        since the last check."""
+
+        if self.far.clear_count != self.clear_count:
+            self.near.clear()
+            self.clear_count = self.far.clear_count
+
+    def _near_get(self, key):
+        """Return the value from the near tier or None."""
+
+        try:
+            (value, expiration) = self.near[key]
+        except KeyError:
+            return None
+
+        if expiration < time.time():
+            del self.near[key]
+            return None
+
+        self.near.move_to_end(key)
+        return value
+
+    def _near_set(self, key, value):
+        """Save a value in the near tier, evicting the least recently used
+        values if necessary."""
+
+        if value is None:
+            self.near.pop(key, None)
+            return
+
+        self.near[key] = (value, time.time() + self.near_lifetime)
+        self.near.move_to_end(key)
+
+        while len(self.near) > self.limit:
+            self.near.popitem(last=False)
+            self.evictions += 1
 
+    def stats(self):
+        """Dictionary of statistics for the near tier."""
+
+        return {
+            'size': len(self.near),
+            'near_hits': self.near_hits,
+            'far_hits': self.far_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def round_trip_stats(self):
+        """Dictionary of the number of round trips to memcache, keyed by the
+        name of the operation."""
+
+        return self.far.round_trip_stats()
+
+    def reset_round_trips(self):
+        """Reset all the counts of round trips to memcache."""
+
+        self.far.reset_round_trips()
+
+    @property
+    def permanent_values(self):
+        return self.far.permanent_values
+
+    ######## Blocking and flushing methods
+
+    def flush(self):
+        """Flush any buffered items into the cache."""
+        self.far.flush()
+
+    def wait_for_unblock(self, funcname=''):
+        """Pause until another process stops blocking, or until timeout."""
+        return self.far.wait_for_unblock(funcname)
+
+    def wait_and_block(self, funcname=''):
+        """Pause until another process stops blocking, or until timeout, and
+        then obtain the block."""
+        return self.far.wait_and_block(funcname)
+
+    def unblock(self, flush=True):
+        """Remove block preventing processes from touching the cache."""
+        self.far.unblock(flush=flush)
+
+    def is_blocked(self):
+        """Status of blocking. 0 if unblocked; otherwise ID of process that is
+        now blocking."""
+        return self.far.is_blocked()
+
+    def pause(self):
+        """Increment the pause count. Flushing will resume when this count
+        returns to zero."""
+        self.far.pause()
+
+    @property
+    def is_paused(self):
+        """Report on status of automatic flushing for this thread."""
+        return self.far.is_paused
+
+    def resume(self):
+        """Decrement the pause count. Flushing of this thread will resume when
+        the count returns to zero."""
+        self.far.resume()
+
+    def __contains__(self, key):
+        """Enable the "in" operator."""
+
+        self.replicate_clear_if_necessary()
+        if self._near_get(key) is not None:
+            return True
+
+        return key in self.far
+
+    def __len__(self):
+        """Enable len() operator."""
+
+        return len(self.far)
+
+    ######## Get methods
+
+    def get(self, key):
+        """Return the value associated with a key. Return None if the key is
+        missing."""
+
+        self.replicate_clear_if_necessary()
+
+        value = self._near_get(key)
+        if value is not None:
+            self.near_hits += 1
+            return value
+
+        value = self.far.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.far_hits += 1
+        self._near_set(key, value)
+        return value
+
+    def __getitem__(self, key):
+        """Enable dictionary syntax. Raise KeyError if the key is missing."""
+
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+
+        return value
+
+    def get_multi(self, keys):
+        """Return a dictionary of multiple values based on a list or set of
+        keys. Missing keys do not appear in the returned dictionary."""
+
+        self.replicate_clear_if_necessary()
+
+        mydict = {}
+        far_keys = []
+        for key in keys:
+            value = self._near_get(key)
+            if value is None:
+                far_keys.append(key)
+            else:
+                mydict[key] = value
+
+        self.near_hits += len(mydict)
+
+        if far_keys:
+            far_dict = self.far.get_multi(far_keys)
+            for (key, value) in far_dict.items():
+                self._near_set(key, value)
+
+            self.far_hits += len(far_dict)
+            self.misses += len(far_keys) - len(far_dict)
+            mydict.update(far_dict)
+
+        return mydict
+
+    def prefetch(self, keys):
+        """Retrieve multiple keys from memcache in advance, skipping any already
+        in the near tier. Return the number of keys found in memcache."""
+
+        self.replicate_clear_if_necessary()
+        keys = [k for k in keys if self._near_get(k) is None]
+        return self.far.prefetch(keys)
+
+    def get_local(self, key):
+        """Return the value associated with a key, only using the local dict."""
+
+        value = self._near_get(key)
+        if value is not None:
+            return value
+
+        return self.far.get_local(key)
+
+    def get_now(self, key):
+        """Return the non-local value associated with a key, even if blocked."""
+
+        return self.far.get_now(key)
+
+    ######## Set methods
+
+    def set(self, key, value, lifetime=None):
+        """Set a single value. Preserve a previously-defined lifetime if
+        lifetime is None."""
+
+        self.replicate_clear_if_necessary()
+        self._near_set(key, value)
+        return self.far.set(key, value, lifetime=lifetime)
+
+    def __setitem__(self, key, value):
+        """Enable dictionary syntax."""
+
+        _ = self.set(key, value, lifetime=None)
+
+    def set_multi(self, mydict, lifetime=None):
+        """Set multiple values at one time based on a dictionary. Preserve a
+        previously-defined lifetime if lifetime is None."""
+
+        self.replicate_clear_if_necessary()
+        for (key, value) in mydict.items():
+            self._near_set(key, value)
+
+        return self.far.set_multi(mydict, lifetime=lifetime)
+
+    def set_local(self, key, value, lifetime=None):
+        """Set or update a single value in the local cache."""
+
+        self._near_set(key, value)
+        self.far.set_local(key, value, lifetime=lifetime)
+
+    ######## Delete methods
+
+    def delete(self, key):
+        """Delete one key. Return True if it was deleted, False otherwise."""
+
+        self.near.pop(key, None)
+        return self.far.delete(key)
+
+    def __delitem__(self, key):
+        """Enable the "del" operator. Raise KeyError if the key is absent."""
+
+        status = self.delete(key)
+        if status:
+            return
+
+        raise KeyError(key)
+
+    def delete_multi(self, keys):
+        """Delete multiple items based on a list of keys. Keys not found in
+        the cache are ignored. Returns True if all keys were deleted."""
+
+        for key in keys:
+            self.near.pop(key, None)
+
+        return self.far.delete_multi(keys)
+
+    def clear(self, block=False):
+        """Clear all contents of the cache."""
+
+        self.near.clear()
+        self.far.clear(block=block)
+        self.clear_count = self.far.clear_count
+
+    def replicate_clear(self, clear_count):
+        """Clear the local cache if clear_count was incremented.
+
+        Return True if cache was cleared; False otherwise.
+        """
+
+        status = self.far.replicate_clear(clear_count)
+        self._check_clear()
+        return status
+
+    def replicate_clear_if_necessary(self):
+        """Clear the local cache if MemCache was cleared by another process."""
+
+        status = self.far.replicate_clear_if_necessary()
+        self._check_clear()
+        return status
+
+    def was_cleared(self):
+        """Returns True if the cache has been cleared."""
 
+        return self.far.was_cleared()
@@ -1,4 +1,5 @@
 import bisect
+import concurrent.futures
 import datetime
 import fnmatch
 import functools
@@ -7,7 +8,6 @@ import math
 import numbers
 import os
 import pickle
-import PIL
 import random
 import re
 import sys
@@ -23,11 +23,14 @@ except ImportError: # pragma: no cover
 import pdsfile_rules        # Default parsing rules
 import pdscache
 import pdslogger
+import pdsshelf
 import pdsviewable
-import pdstable
-import pdsparser
 import translator
 
+# PIL, pdsparser and pdstable are only needed to read images, labels and index
+# tables, so they are imported where they are used. This keeps them out of the
+# start-up time of programs that never touch those files.
+
 ################################################################################
 # Configuration
 ################################################################################
@@ -141,11 +144,15 @@ CATEGORIES = set(CATEGORY_LIST)
 # Extra description files that can appear in volset directories
 EXTRA_README_BASENAMES = ('AAREADME.txt', 'AAREADME.pdf')
 
+# Number of primary products imported together by iter_opus_products()
+OPUS_BATCH_SIZE = 200
+
 # Directory prefix and file suffix for shelf files
 SHELF_PATH_INFO = {
     'index': ('_indexshelf-', '_index'),
     'info' : ('_infoshelf-', '_info'),
     'link' : ('_linkshelf-', '_links'),
+    'opus' : ('_infoshelf-', '_opus'),      # OPUS ID index, with info shelves
 }
 
 ################################################################################
@@ -193,6 +200,95 @@ def use_shelves_only(status=True):
 
     SHELVES_ONLY = status
 
+################################################################################
+# Shelf store shared across processes
+################################################################################
+
+SHELF_STORE = None
+
+def use_shared_shelf_store(status=True, store_dir=None, check_interval=10.):
+    """Call before preload(). Status=True to convert pickle shelf files into a
+    directory of memory-mapped shelf files shared by every process on this host,
+    rather than having each process unpickle its own copy.
+
+    Input:
+        status          True to use the shared store; False to stop using it.
+        store_dir       directory for the shared shelf files; default is
+                        /dev/shm/pdsshelf where available.
+        check_interval  minimum seconds between checks of whether a pickle file
+                        has been modified since it was stored.
+    """
+
+    global SHELF_STORE
+
+    if status:
+        SHELF_STORE = pdsshelf.SharedShelfStore(store_dir, check_interval,
+                                                logger=LOGGER)
+    else:
+        SHELF_STORE = None
+
+    PdsFile.close_all_shelves()
+
+################################################################################
+# OPUS ID index
+################################################################################
+
+# Precomputed index shelves, one per volume, map each OPUS ID to the logical
+# paths of its primary products. See validation/pdsopusindex.py.
+USE_OPUS_INDEX = True
+
+def use_opus_index(status=True):
+    """Status=True to consult the OPUS ID index shelves first in
+    PdsFile.from_opus_id(); False to use only the translation rules."""
+
+    global USE_OPUS_INDEX
+
+    USE_OPUS_INDEX = status
+
+################################################################################
+# Translator memos
+################################################################################
+
+# Translators that are applied repeatedly to the same paths and basenames
+MEMO_TRANSLATOR_NAMES = ('DESCRIPTION_AND_ICON', 'VIEW_OPTIONS', 'NEIGHBORS',
+                         'SPLIT_RULES', 'SORT_KEY')
+MEMO_TRANSLATOR_SIZE = 2000
+
+def use_translator_memos(status=True, maxsize=MEMO_TRANSLATOR_SIZE,
+                         names=MEMO_TRANSLATOR_NAMES):
+    """Call after all rules have been imported. Status=True to remember the
+    results of the named translators in PdsFile and in every subclass, using a
+    cache of up to maxsize results per translator. Status=False to remove the
+    caches."""
+
+    classes = set(PdsFile.SUBCLASSES.values()) | {PdsFile}
+    for cls in classes:
+        for name in names:
+            if name not in cls.__dict__:    # inherited translators are shared
+                continue
+
+            value = cls.__dict__[name]
+            if not isinstance(value, translator.Translator):
+                continue
+
+            if status:
+                setattr(cls, name, translator.MemoTranslator(value, maxsize))
+            elif isinstance(value, translator.MemoTranslator):
+                setattr(cls, name, value.translator)
+
+def translator_memo_stats():
+    """Dictionary of cache statistics for every translator memo, keyed by
+    (class name, translator name)."""
+
+    stats = {}
+    classes = set(PdsFile.SUBCLASSES.values()) | {PdsFile}
+    for cls in classes:
+        for (name, value) in cls.__dict__.items():
+            if isinstance(value, translator.MemoTranslator):
+                stats[(cls.__name__, name)] = value.stats()
+
+    return stats
+
 ################################################################################
 # How to handle missing shelf files
 ################################################################################
@@ -275,6 +371,12 @@ def cache_lifetime(arg):
 LOCAL_PRELOADED = []        # local copy of CACHE['$PRELOADED']
 MEMCACHE_PORT = 0           # default is to use a DictionaryCache instead
 DICTIONARY_CACHE_LIMIT = 200000
+MEMCACHE_CONTROL_INTERVAL = pdscache.CONTROL_INTERVAL
+                            # seconds to trust the memcache block and clear
+                            # status before checking again
+MEMCACHE_NEAR_LIMIT = 0     # number of PdsFiles to keep in-process in front of
+                            # memcache; 0 to use memcache alone
+MEMCACHE_NEAR_LIFETIME = pdscache.NEAR_LIFETIME
 
 # This cache is used if preload() is never called. No filesystem is required.
 CACHE = pdscache.DictionaryCache(lifetime=cache_lifetime,
@@ -286,9 +388,26 @@ DEFAULT_CACHING = 'dir'     # 'dir', 'all' or 'none';
                             # use 'all' for Viewmaster with MemCache;
 
 PRELOAD_TRIES = 3
+PRELOAD_THREADS = 8         # worker threads used by preload() to scan the
+                            # holdings directories; 1 to scan serially
+_PRELOAD_SCAN = {}          # abspath -> list of child basenames, True for an
+                            # unlisted directory, or None for a file; filled
+                            # only while preload() is running
+_SNAPSHOT_VERSION = 1       # version of the preload snapshot file format
+
+# Compact serialization of PdsFiles; see PdsFile.__getstate__()
+CHILDNAMES_PER_CHUNK = 2000 # longer lists of child names are saved to memcache
+                            # in separate chunks
+_PICKLE_VERSION = 1
+_INTERNED_ATTRIBUTES = ('disk_', 'root_', 'html_root_', 'category_',
+                        'checksums_', 'archives_', 'voltype_', 'volset_',
+                        'volset', 'suffix', 'version_message', 'version_id',
+                        'volname_', 'volname')
+_BLANK_ATTRIBUTES = None    # filled in by the first call to __getstate__()
 
 def preload(holdings_list, port=0, clear=False, force_reload=False,
-            icon_color='blue'):
+            icon_color='blue', near_limit=None, threads=None,
+            incremental=False, snapshot=None):
     """Cache the top-level directories, starting from the given holdings
     directories.
 
@@ -302,10 +421,27 @@ def preload(holdings_list, port=0, clear=False, force_reload=False,
                             appears to contain the needed holdings.
         icon_color          color of the icons to load from each holdings
                             directory; default "blue".
+        near_limit          number of PdsFiles to keep within this process in
+                            front of memcached, using a TwoTierCache; 0 to use
+                            memcached alone; None to use MEMCACHE_NEAR_LIMIT.
+        threads             number of worker threads used to scan the holdings
+                            directories and read the volume info; None to use
+                            PRELOAD_THREADS.
+        incremental         True to re-scan any category directories of
+                            holdings that are already cached, if the category
+                            or any of its volume sets has been modified since
+                            the cache was loaded.
+        snapshot            optional path to a snapshot file of the preloaded
+                            cache. If the file matches these holdings and none
+                            of their category or volume set directories has
+                            been modified since it was written, the cache is
+                            filled from the file instead of the holdings.
+                            Otherwise, the holdings are preloaded and the file
+                            is re-written.
     """
 
     global CACHE, MEMCACHE_PORT, DEFAULT_CACHING, LOCAL_PRELOADED, PRELOAD_TRIES
-    global FS_IS_CASE_INSENSITIVE
+    global FS_IS_CASE_INSENSITIVE, MEMCACHE_NEAR_LIMIT
 
     # Convert holdings to a list of absolute paths
     if not isinstance(holdings_list, (list,tuple)):
@@ -313,6 +449,11 @@ def preload(holdings_list, port=0, clear=False, force_reload=False,
 
     holdings_list = [_clean_abspath(h) for h in holdings_list]
 
+    if threads is None:
+        threads = PRELOAD_THREADS
+
+    scans = None                # results of _scan_holdings(), if needed
+
     # Use cache as requested
     if (port == 0 and MEMCACHE_PORT == 0) or not HAS_PYLIBMC:
         if not isinstance(CACHE, pdscache.DictionaryCache):
@@ -323,12 +464,23 @@ def preload(holdings_list, port=0, clear=False, force_reload=False,
 
     else:
         MEMCACHE_PORT = MEMCACHE_PORT or port
+        if near_limit is not None:
+            MEMCACHE_NEAR_LIMIT = near_limit
 
         for k in range(PRELOAD_TRIES):
           try:
-            CACHE = pdscache.MemcachedCache(MEMCACHE_PORT,
-                                            lifetime=cache_lifetime,
-                                            logger=LOGGER)
+            if MEMCACHE_NEAR_LIMIT:
+                CACHE = pdscache.TwoTierCache(MEMCACHE_PORT,
+                                lifetime=cache_lifetime,
+                                logger=LOGGER,
+                                limit=MEMCACHE_NEAR_LIMIT,
+                                near_lifetime=MEMCACHE_NEAR_LIFETIME,
+                                control_interval=MEMCACHE_CONTROL_INTERVAL)
+            else:
+                CACHE = pdscache.MemcachedCache(MEMCACHE_PORT,
+                                lifetime=cache_lifetime,
+                                logger=LOGGER,
+                                control_interval=MEMCACHE_CONTROL_INTERVAL)
             LOGGER.info('Connecting to PdsFile Memcache [%s]' % MEMCACHE_PORT)
             break
 
@@ -384,6 +536,18 @@ def preload(holdings_list, port=0, clear=False, force_reload=False,
                 else:
                     something_is_missing = True
 
+            # Check the cached holdings for modified category directories
+            if incremental and not something_is_missing:
+                if scans is None:
+                    scans = _scan_holdings(holdings_list, threads)
+
+                stale = _stale_categories(scans,
+                                    CACHE.get_now('$PRELOAD_MTIMES') or {})
+                for category_abspath in stale:
+                    LOGGER.info('Category directory modified',
+                                category_abspath)
+                    something_is_missing = True
+
             if not something_is_missing:
                 if MEMCACHE_PORT:
                     get_permanent_values(holdings_list, MEMCACHE_PORT)
@@ -438,19 +602,86 @@ def preload(holdings_list, port=0, clear=False, force_reload=False,
 
     #### Fill CACHE
 
+    if snapshot and scans is None:
+        scans = _scan_holdings(holdings_list, threads)
+
+    snapshot_mtimes = {abspath:mtimes for (abspath, (mtimes, _))
+                                      in scans.items()} if snapshot else {}
+    from_snapshot = False
+    complete = not LOCAL_PRELOADED  # False if this process did not load every
+                                    # permanent value itself
+
     try:    # we will undo the pause and block in the "finally" clause below
 
+        # Use the snapshot file if it is current
+        if snapshot and not force_reload:
+            from_snapshot = _load_snapshot(snapshot, holdings_list, icon_color,
+                                           snapshot_mtimes)
+            if from_snapshot:
+                LOCAL_PRELOADED = CACHE.get_now('$PRELOADED') or holdings_list
+                return
+
+        # Decide which holdings to load and which categories of the holdings
+        # already in the cache to re-load
+        preloaded = list(LOCAL_PRELOADED)
+        new_holdings = [h for h in holdings_list if h not in preloaded]
+        cached_mtimes = {}
+        if preloaded:
+            cached_mtimes = CACHE.get_now('$PRELOAD_MTIMES') or {}
+
+        # Scan the category directories using worker threads. The threads only
+        # touch the file system; everything that updates the cache happens
+        # below, in this thread.
+        if scans is None:
+            scans = _scan_holdings(holdings_list if incremental
+                                   else new_holdings, threads)
+
+        reloads = set()
+        if incremental:
+            for category_abspath in _stale_categories(scans, cached_mtimes):
+                (holdings, _, category) = category_abspath.rpartition('/')
+                if holdings in preloaded:
+                    reloads.add(category)
+
+        for (_, listings) in scans.values():
+            _PRELOAD_SCAN.update(listings)
+
+        # Read the volume info files in parallel too
+        volinfo_holdings = list(new_holdings)
+        if reloads:
+            volinfo_holdings += [h for h in holdings_list if h in preloaded]
+
+        volinfo_dicts = _map_in_threads(_read_volume_info, volinfo_holdings,
+                                        threads)
+        volinfo_dicts = dict(zip(volinfo_holdings, volinfo_dicts))
+
         # Create and cache permanent, category-level merged directories. These
         # are roots of the cache tree and their list of children is merged from
         # multiple physical directories. This makes it possible for our data
         # sets to exist on multiple physical drives in a way that is invisible
-        # to the user.
+        # to the user. A merged directory already in the cache is retained
+        # unless its category is being re-loaded.
         for category in CATEGORY_LIST:
+            if preloaded and category not in reloads:
+                try:
+                    _ = CACHE[category]
+                    continue
+                except KeyError:
+                    pass
+
+            if category in reloads:
+                _forget_category(category)
+
             CACHE.set(category, PdsFile.new_merged_dir(category), lifetime=0)
 
         # Initialize RANKS, VOLS and category list
         for category in CATEGORY_LIST:
           category_ = category + '/'
+          if category in reloads:
+              CACHE.set_multi({'$RANKS-' + category_: {},
+                               '$VOLS-'  + category_: {}}, lifetime=0)
+              continue
+
           key = '$RANKS-' + category_
           try:
               _ = CACHE[key]
@@ -463,23 +694,32 @@ def preload(holdings_list, port=0, clear=False, force_reload=False,
           except KeyError:
               CACHE.set(key, {}, lifetime=0)
 
-        # Cache all of the top-level PdsFile directories
-        for h,holdings in enumerate(holdings_list):
+        # Cache all of the top-level PdsFile directories. A re-loaded category
+        # is rebuilt from every holdings directory that contributes to it.
+        extra_holdings = [h for h in preloaded if h not in holdings_list]
+        for h,holdings in enumerate(holdings_list + extra_holdings):
 
-            if holdings in LOCAL_PRELOADED:
-                LOGGER.info('Pre-load not needed for ' + holdings)
-                continue
+            if holdings in preloaded:
+                categories = [c for c in CATEGORY_LIST if c in reloads]
+                if not categories:
+                    LOGGER.info('Pre-load not needed for ' + holdings)
+                    continue
+
+                LOGGER.info('Re-loading modified categories of ' + holdings)
 
-            LOCAL_PRELOADED.append(holdings)
-            LOGGER.info('Pre-loading ' + holdings)
+            else:
+                categories = CATEGORY_LIST
+                LOCAL_PRELOADED.append(holdings)
+                LOGGER.info('Pre-loading ' + holdings)
 
             # Load volume info
-            load_volume_info(holdings)
+            if holdings in volinfo_dicts:
+                load_volume_info(holdings, volinfo_dicts[holdings])
 
             # Load directories starting from here
             holdings_ = holdings.rstrip('/') + '/'
 
-            for c in CATEGORY_LIST:
+            for c in categories:
                 category_abspath = holdings_ + c
                 if not PdsFile.os_path_exists(category_abspath):
                     LOGGER.warn('Missing category dir: ' + category_abspath)
@@ -494,20 +734,41 @@ def preload(holdings_list, port=0, clear=False, force_reload=False,
                                               caching='all', lifetime=0)
                 _preload_dir(pdsdir)
 
+            if holdings in preloaded:
+                continue
+
             # Load the icons
             icon_path = _clean_join(holdings, '_icons')
             if os.path.exists(icon_path):
                 icon_url = '/holdings' + (str(h) if h > 0 else '') + '/_icons'
                 pdsviewable.load_icons(icon_path, icon_url, icon_color, LOGGER)
 
+        # Save the modification times for the next incremental preload
+        for (category_abspath, (mtimes, _)) in scans.items():
+            cached_mtimes[category_abspath] = mtimes
+
+        CACHE.set('$PRELOAD_MTIMES', cached_mtimes, lifetime=0)
+
     finally:
+        _PRELOAD_SCAN.clear()
         CACHE.set('$PRELOADED', LOCAL_PRELOADED, lifetime=0)
         CACHE.resume()
         CACHE.unblock(flush=True)
 
+        if from_snapshot:
+            _check_case_sensitivity()
+
+    if snapshot and complete:
+        _save_snapshot(snapshot, holdings_list, icon_color, snapshot_mtimes)
+
     LOGGER.info('PdsFile preloading completed')
+    _check_case_sensitivity()
+
+def _check_case_sensitivity():
+    """Determine if the file system is case-sensitive."""
+
+    global FS_IS_CASE_INSENSITIVE
 
-    # Determine if the file system is case-sensitive
     # If any physical volume is case-insensitive, then we treat the whole file
     # system as case-insensitive.
     FS_IS_CASE_INSENSITIVE = False
@@ -569,8 +830,183 @@ def get_permanent_values(holdings_list, port):
     finally:
         resume_caching()
 
-def load_volume_info(holdings):
-    """Load volume info associated with this holdings directory.
+################################################################################
+# Preload support
+################################################################################
+
+def _map_in_threads(func, args, threads):
+    """Return the list [func(arg) for arg in args], using up to the given
+    number of worker threads."""
+
+    args = list(args)
+    if threads <= 1 or len(args) <= 1:
+        return [func(arg) for arg in args]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(func, args))
+
+def _scan_category(category_abspath):
+    """Scan one physical category directory and the volume set directories
+    inside it. Only the file system is consulted, so this is safe to call from
+    a worker thread.
+
+    Returns a tuple (mtimes, listings). The first is a dictionary of
+    modification times keyed by the absolute paths of the category directory
+    and of each volume set directory. The second is a dictionary in the format
+    of _PRELOAD_SCAN. It is empty under SHELVES_ONLY, where directory listings
+    come from the shelf files instead. Both are empty if the category directory
+    is missing.
+    """
+
+    def _listdir(abspath):
+        return _filter_childnames(abspath, os.listdir(abspath))
+
+    mtimes = {}
+    listings = {}
+    try:
+        mtimes[category_abspath] = os.stat(category_abspath).st_mtime
+        basenames = _listdir(category_abspath)
+        listings[category_abspath] = basenames
+
+        for basename in basenames:
+            volset_abspath = category_abspath + '/' + basename
+            if not os.path.isdir(volset_abspath):
+                listings[volset_abspath] = None
+                continue
+
+            mtimes[volset_abspath] = os.stat(volset_abspath).st_mtime
+            volnames = _listdir(volset_abspath)
+            listings[volset_abspath] = volnames
+
+            for volname in volnames:
+                abspath = volset_abspath + '/' + volname
+                listings[abspath] = True if os.path.isdir(abspath) else None
+
+    except OSError:
+        return ({}, {})
+
+    if SHELVES_ONLY:
+        return (mtimes, {})
+
+    return (mtimes, listings)
+
+def _scan_holdings(holdings_list, threads):
+    """Scan every category directory of the given holdings directories using
+    worker threads. Returns a dictionary of (mtimes, listings) tuples from
+    _scan_category(), keyed by the absolute path of each existing category
+    directory."""
+
+    category_abspaths = [h.rstrip('/') + '/' + c for h in holdings_list
+                                                 for c in CATEGORY_LIST]
+    results = _map_in_threads(_scan_category, category_abspaths, threads)
+    return {abspath:result for (abspath, result)
+                           in zip(category_abspaths, results) if result[0]}
+
+def _stale_categories(scans, cached_mtimes):
+    """The list of category directory paths in the given result of
+    _scan_holdings() whose modification times no longer match those cached by
+    the last preload."""
+
+    return [abspath for (abspath, (mtimes, _)) in scans.items()
+                    if cached_mtimes.get(abspath) != mtimes]
+
+def _preloaded_keys(category):
+    """The cache keys of the volume sets and volumes within a category, based
+    on the children of its cached merged directory."""
+
+    try:
+        merged_dir = CACHE[category]
+    except KeyError:
+        return []
+
+    keys = []
+    for volset in merged_dir._childnames_filled or []:
+        volset_key = (category + '/' + volset).lower()
+        keys.append(volset_key)
+        try:
+            pdsf = CACHE[volset_key]
+        except KeyError:
+            continue
+
+        for volname in pdsf._childnames_filled or []:
+            keys.append(volset_key + '/' + volname.lower())
+
+    return keys
+
+def _forget_category(category):
+    """Delete the cached volume sets and volumes within a category so that the
+    next preload rebuilds them."""
+
+    CACHE.delete_multi(_preloaded_keys(category))
+
+def _snapshot_header(holdings_list, icon_color, mtimes):
+    """The header identifying the contents of a preload snapshot file."""
+
+    return {'version': _SNAPSHOT_VERSION,
+            'pickle_version': _PICKLE_VERSION,
+            'holdings': list(holdings_list),
+            'icon_color': icon_color,
+            'shelves_only': SHELVES_ONLY,
+            'mtimes': mtimes}
+
+def _save_snapshot(path, holdings_list, icon_color, mtimes):
+    """Write the permanent values in the cache, the volume set and volume
+    PdsFiles, and the loaded icon sets to a snapshot file. The file contains
+    two pickles, a header and then the contents, so that a stale file can be
+    recognized without reading all of it. The file is replaced atomically."""
+
+    values = dict(CACHE.permanent_values)
+    for category in CATEGORY_LIST:
+        for key in _preloaded_keys(category):
+            if key not in values:
+                pdsf = CACHE.get(key)
+                if pdsf is not None:
+                    values[key] = pdsf
+
+    header = _snapshot_header(holdings_list, icon_color, mtimes)
+    contents = (values, pdsviewable.ICON_SET_BY_TYPE)
+
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(contents, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except (IOError, OSError, pickle.PicklingError) as e:
+        LOGGER.warn('Unable to write preload snapshot: ' + str(e), path)
+        return
+
+    LOGGER.info('Preload snapshot saved', path)
+
+def _load_snapshot(path, holdings_list, icon_color, mtimes):
+    """Fill the cache and the icon sets from a snapshot file. Return True if
+    this succeeded; False if the file is missing, unreadable or stale."""
+
+    header = _snapshot_header(holdings_list, icon_color, mtimes)
+    try:
+        with open(path, 'rb') as f:
+            if pickle.load(f) != header:
+                LOGGER.info('Preload snapshot is out of date', path)
+                return False
+
+            (values, icon_sets) = pickle.load(f)
+
+    except FileNotFoundError:
+        return False
+    except Exception as e:      # corrupted, truncated, or from older code
+        LOGGER.warn('Unable to read preload snapshot: ' + str(e), path)
+        return False
+
+    CACHE.set_multi(values, lifetime=0)
+    pdsviewable.ICON_SET_BY_TYPE.update(icon_sets)
+
+    LOGGER.info('Cache loaded from preload snapshot', path)
+    return True
+
+def load_volume_info(holdings, volinfo_dict=None):
+    """Load volume info associated with this holdings directory. If
+    volinfo_dict is given, it is a previous result of _read_volume_info() for
+    this holdings directory, and is cached without reading the files again.
 
     Each record contains a sequence of values separated by "|":
         key: volset, volset/volname, category/volset, or category/volset/volname
@@ -594,6 +1030,20 @@ def load_volume_info(holdings):
     Blank records and those beginning with "#" are ignored.
     """
 
+    if volinfo_dict is None:
+        volinfo_dict = _read_volume_info(holdings)
+
+    # Save the master dictionary in the cache now
+    CACHE.set_multi({'$VOLINFO-' + key.lower(): volinfo
+                     for (key, volinfo) in volinfo_dict.items()}, lifetime=0)
+
+    LOGGER.info('Volume info loaded', _clean_join(holdings, '_volinfo'))
+
+def _read_volume_info(holdings):
+    """Read the volume info files of this holdings directory and return the
+    dictionary to be cached by load_volume_info(). Only the file system is
+    consulted, so this is safe to call from a worker thread."""
+
     volinfo_path = _clean_join(holdings, '_volinfo')
 
     volinfo_dict = {}           # the master dictionary of high-level paths vs.
@@ -677,11 +1127,47 @@ def load_volume_info(holdings):
                                           volinfo_dict[key][5]))
                     break
 
-    # Save the master dictionary in the cache now
-    for key,volinfo in volinfo_dict.items():
-        CACHE.set('$VOLINFO-' + key.lower(), volinfo, lifetime=0)
+    return volinfo_dict
 
-    LOGGER.info('Volume info loaded', volinfo_path)
+################################################################################
+# PdsFile class
+################################################################################
+
+################################################################################
+# Side record for rarely-filled PdsFile attributes
+################################################################################
+
+class _SideAttribute(object):
+    """Descriptor for a rarely-filled PdsFile attribute. Its value is kept in
+    the object's _extras dictionary, which is only allocated once one of these
+    attributes is given a value other than None."""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+
+        extras = obj._extras
+        if extras is None:
+            return None
+
+        return extras.get(self.name)
+
+    def __set__(self, obj, value):
+        extras = obj._extras
+        if value is None:
+            if extras:
+                extras.pop(self.name, None)
+            return
+
+        if extras is None:
+            obj._extras = extras = {}
+
+        extras[self.name] = value
 
 ################################################################################
 # PdsFile class
@@ -689,12 +1175,37 @@ def load_volume_info(holdings):
 
 class PdsFile(object):
 
+    # Attributes of every PdsFile. Rarely-filled attributes are listed in
+    # _SIDE_ATTRIBUTES, below the class definition. Subclasses must define
+    # __slots__ = () to avoid the overhead of a per-instance dictionary.
+    __slots__ = (
+        'basename', 'abspath', 'logical_path',
+        'disk_', 'root_', 'html_root_',
+        'category_', 'checksums_', 'archives_', 'voltype_',
+        'volset_', 'volset', 'suffix',
+        'version_message', 'version_rank', 'version_id',
+        'volname_', 'volname', 'interior',
+        'is_index_row', 'row_dicts', 'column_names',
+        'permanent', 'is_merged',
+        '_exists_filled', '_islabel_filled', '_isdir_filled', '_split_filled',
+        '_global_anchor_filled', '_childnames_filled', '_childnames_lc_filled',
+        '_info_filled', '_date_filled', '_formatted_size_filled',
+        '_infoshelf_path_and_key', '_is_index',
+        '_extras',      # dictionary of side attributes or None
+    )
+
     # Global registry of subclasses
     SUBCLASSES = {}
 
     # Translator from volume set ID to key in global registry
     VOLSET_TRANSLATOR = translator.TranslatorByRegex([('.*', 0, 'default')])
 
+    # Subclasses already selected by volume set ID, and by volume ID for
+    # from_filespec(). These are discarded whenever the translator they came
+    # from is replaced, e.g., when another rules module is imported.
+    _SUBCLASS_BY_KEY = ({}, None)
+    _VOLSET_BY_VOLUME_ID = ({}, None)
+
     # Default translators, can be overridden by volset-specific subclasses
     DESCRIPTION_AND_ICON = pdsfile_rules.DESCRIPTION_AND_ICON
     ASSOCIATIONS = pdsfile_rules.ASSOCIATIONS
@@ -738,22 +1249,22 @@ class PdsFile(object):
         """If True, all label files will appear after their associated data
         files when sorted."""
 
-        self.SORT_ORDER = self.SORT_ORDER.copy()
-        self.SORT_ORDER['labels_after'] = labels_after
+        self._sort_order = (self._sort_order or self.SORT_ORDER).copy()
+        self._sort_order['labels_after'] = labels_after
 
     def sort_dirs_first(self, dirs_first):
         """If True, directories will appear before all files in a sorted list.
         """
 
-        self.SORT_ORDER = self.SORT_ORDER.copy()
-        self.SORT_ORDER['dirs_first'] = dirs_first
+        self._sort_order = (self._sort_order or self.SORT_ORDER).copy()
+        self._sort_order['dirs_first'] = dirs_first
 
     def sort_dirs_last(self, dirs_last):
         """If True, directories will appear after all files in a sorted list.
         """
 
-        self.SORT_ORDER = self.SORT_ORDER.copy()
-        self.SORT_ORDER['dirs_last'] = dirs_last
+        self._sort_order = (self._sort_order or self.SORT_ORDER).copy()
+        self._sort_order['dirs_last'] = dirs_last
 
     def sort_info_first(self, info_first):
         """If True or 1, info files will be listed first in all sorted lists;
@@ -761,8 +1272,8 @@ class PdsFile(object):
         if an integer bigger than 1, put the info file first only if there are
         at least this many files in the directory."""
 
-        self.SORT_ORDER = self.SORT_ORDER.copy()
-        self.SORT_ORDER['info_first'] = info_first
+        self._sort_order = (self._sort_order or self.SORT_ORDER).copy()
+        self._sort_order['info_first'] = info_first
 
     ############################################################################
     # Constructor
@@ -771,6 +1282,8 @@ class PdsFile(object):
     def __init__(self):
         """Constructor returns a blank PdsFile object. Not for external use."""
 
+        self._extras      = None    # Side record; see _SideAttribute
+
         self.basename     = ''
         self.abspath      = ''
         self.logical_path = ''      # Logical path starting after 'holdings/'
@@ -854,22 +1367,45 @@ class PdsFile(object):
         self._indexshelf_abspath             = None
         self._index_pdslabel                 = None
 
+    @staticmethod
+    def subclass_for_key(key):
+        """The PdsFile subclass for a key in the global registry or a volume
+        set ID.
+
+        Each volume set ID is only translated once. After that, the subclass
+        comes from a dictionary, so the cost of resolving a path does not grow
+        with the number of subclasses.
+        """
+
+        (subclass_by_key, source) = PdsFile._SUBCLASS_BY_KEY
+        if source is not PdsFile.VOLSET_TRANSLATOR:
+            subclass_by_key = {}
+            PdsFile._SUBCLASS_BY_KEY = (subclass_by_key,
+                                        PdsFile.VOLSET_TRANSLATOR)
+
+        try:
+            return subclass_by_key[key]
+        except KeyError:
+            pass
+
+        if key in PdsFile.SUBCLASSES:
+            cls = PdsFile.SUBCLASSES[key]
+        else:
+            cls = PdsFile.SUBCLASSES[PdsFile.VOLSET_TRANSLATOR.first(key)]
+
+        subclass_by_key[key] = cls
+        return cls
+
     def new_pdsfile(self, key=None, copypath=False):
         """Empty PdsFile of the same subclass or a specified subclass."""
 
         if key is None:
             cls = type(self)
-        elif key in PdsFile.SUBCLASSES:
-            cls = PdsFile.SUBCLASSES[key]
         else:
-            key2 = PdsFile.VOLSET_TRANSLATOR.first(key)
-            cls = PdsFile.SUBCLASSES[key2]
+            cls = PdsFile.subclass_for_key(key)
 
         this = cls.__new__(cls)
-
-        source = PdsFile()
-        for (key, value) in source.__dict__.items():
-            this.__dict__[key] = value
+        PdsFile.__init__(this)
 
         if copypath:
             this.basename        = self.basename
@@ -1045,11 +1581,117 @@ class PdsFile(object):
         cls = type(self)
         this = cls.__new__(cls)
 
-        for (key, value) in self.__dict__.items():
-            this.__dict__[key] = value
+        for name in _CORE_ATTRIBUTES:
+            setattr(this, name, getattr(self, name))
+
+        this._extras = self._extras.copy() if self._extras else None
+
+        if hasattr(self, '__dict__'):       # subclass without __slots__
+            this.__dict__.update(self.__dict__)
 
         return this
 
+    def _attribute_dict(self):
+        """Dictionary of every attribute of this PdsFile, whether it is kept in
+        a slot or in the side record. Side attributes equal to None are
+        omitted."""
+
+        attributes = {name:getattr(self, name) for name in _CORE_ATTRIBUTES}
+        if self._extras:
+            attributes.update(self._extras)
+
+        if hasattr(self, '__dict__'):       # subclass without __slots__
+            attributes.update(self.__dict__)
+
+        return attributes
+
+    ############################################################################
+    # Compact serialization
+    ############################################################################
+
+    def __getstate__(self):
+        """Compact state for pickling. Attributes that still have their blank
+        values are omitted, as are paths and lists that can be rebuilt from the
+        other attributes."""
+
+        global _BLANK_ATTRIBUTES
+
+        if _BLANK_ATTRIBUTES is None:
+            _BLANK_ATTRIBUTES = PdsFile()._attribute_dict()
+
+        attributes = self._attribute_dict()
+        rebuilt = _rebuilt_attributes(attributes)
+
+        fields = {}
+        derived = []
+        for (name, value) in attributes.items():
+            if name in rebuilt and rebuilt[name] == value:
+                derived.append(name)
+                continue
+
+            if name in _BLANK_ATTRIBUTES:
+                blank = _BLANK_ATTRIBUTES[name]
+                if type(value) == type(blank) and value == blank:
+                    continue
+
+            fields[name] = value
+
+        return (_PICKLE_VERSION, fields, tuple(derived))
+
+    def __setstate__(self, state):
+        """Restore a PdsFile from the state returned by __getstate__(). Repeated
+        strings such as volume set names are interned."""
+
+        # Support PdsFiles pickled as a complete dictionary
+        if isinstance(state, dict):
+            (fields, derived) = (state, ())
+
+        else:
+            (_, fields, derived) = state
+
+        PdsFile.__init__(self)
+        attributes = self._attribute_dict()
+        attributes.update(fields)
+
+        if derived:
+            rebuilt = _rebuilt_attributes(attributes)
+            for name in derived:
+                attributes[name] = rebuilt[name]
+
+        for name in _INTERNED_ATTRIBUTES:
+            value = attributes[name]
+            if type(value) == str:
+                attributes[name] = sys.intern(value)
+
+        for (name, value) in attributes.items():
+            setattr(self, name, value)
+
+    def split_for_cache(self):
+        """Called by MemcachedCache before saving this object. If the list of
+        child names is too long, return a tuple (copy of this PdsFile without
+        child names, list of chunks of the child names). Otherwise, None."""
+
+        childnames = self._childnames_filled
+        if childnames is None or len(childnames) <= CHILDNAMES_PER_CHUNK:
+            return None
+
+        this = self.copy()
+        this._childnames_filled = None
+        this._childnames_lc_filled = None
+
+        chunks = [childnames[k:k + CHILDNAMES_PER_CHUNK]
+                  for k in range(0, len(childnames), CHILDNAMES_PER_CHUNK)]
+        return (this, chunks)
+
+    def join_from_cache(self, chunks):
+        """Called by MemcachedCache to restore the child names removed by
+        split_for_cache(). Returns this PdsFile."""
+
+        self._childnames_filled = [name for chunk in chunks for name in chunk]
+        self._childnames_lc_filled = [c.lower() for c in
+                                      self._childnames_filled]
+        return self
+
     def __repr__(self):
         if self.abspath is None:
             return 'PdsFile-logical("' + self.logical_path + '")'
@@ -1118,7 +1760,7 @@ class PdsFile(object):
                     shelf = PdsFile._get_shelf(shelf_abspath,
                                                log_missing_file=False)
                     return (key in shelf)
-                elif PdsFile.os_path_exists(shelf_abspath):
+                elif pdsshelf.shelf_exists(shelf_abspath):
                     return True     # Every shelf file has an entry with an
                                     # empty key, so this avoids an unnecessary
                                     # open of the file.
@@ -1137,7 +1779,7 @@ class PdsFile(object):
                     return True
 
                 # Maybe there's an associated shelf file in the infoshelf tree
-                if PdsFile.os_path_exists(shelf_abspath + '_info.pickle'):
+                if pdsshelf.shelf_exists(shelf_abspath + '_info.pickle'):
                     return True
 
                 # Checksum files need special handling
@@ -1163,6 +1805,10 @@ class PdsFile(object):
         rather than refer to the holdings directory.
         """
 
+        # Use the scan made by preload() if available
+        if _PRELOAD_SCAN and abspath in _PRELOAD_SCAN:
+            return _PRELOAD_SCAN[abspath] is not None
+
         if SHELVES_ONLY:
             try:
                 (shelf_abspath,
@@ -1173,7 +1819,7 @@ class PdsFile(object):
                                                log_missing_file=False)
                     (_, _, _, checksum, _) = shelf[key]
                     return (checksum == '')
-                elif PdsFile.os_path_exists(shelf_abspath):
+                elif pdsshelf.shelf_exists(shelf_abspath):
                     return True     # Every shelf file has an entry with an
                                     # empty key, so this avoids an unnecessary
                                     # open of the file.
@@ -1192,7 +1838,7 @@ class PdsFile(object):
                     return True
 
                 # Maybe there's an associated shelf file in the infoshelf tree
-                if os.path.exists(shelf_abspath + '_info.pickle'):
+                if pdsshelf.shelf_exists(shelf_abspath + '_info.pickle'):
                     return True
 
                 # Checksum files need special handling
@@ -1214,6 +1860,12 @@ class PdsFile(object):
         # Make sure there is no trailing slash
         abspath = abspath.rstrip('/')
 
+        # Use the scan made by preload() if available
+        if _PRELOAD_SCAN:
+            childnames = _PRELOAD_SCAN.get(abspath)
+            if isinstance(childnames, list):
+                return list(childnames)
+
         if SHELVES_ONLY:
             try:
                 (shelf_abspath,
@@ -1224,19 +1876,9 @@ class PdsFile(object):
             except (ValueError, IndexError, IOError, OSError):
                 pass
             else:
-                # Look for paths that begin the same and do not have an
-                # additional slash
-                prefix = key + '/' if key else ''
-                lprefix = len(prefix)
-                basenames = []
-                for key in shelf.keys():
-                    if not key.startswith(prefix): continue
-                    if key == '': continue
-                    basename = key[lprefix:]
-                    if '/' not in basename:
-                        basenames.append(basename)
-
-                return basenames
+                # The shelf's directory table lists the children of each
+                # directory, so this does not depend on the size of the volume
+                return shelf.children(key)
 
             # Deal with checksums-archives directories
             if '/holdings/checksums-archives-' in abspath:
@@ -1306,8 +1948,7 @@ class PdsFile(object):
                     # For documentation, we have all files available but not the shelf
                     # files, therefore we will check the actual file system for documents.
                     childnames = os.listdir(abspath)
-                    return [c for c in childnames
-                            if c != '.DS_Store' and not c.startswith('._')]
+                    return _filter_childnames(abspath, childnames)
 
                 if not results:
                     return []
@@ -1337,8 +1978,7 @@ class PdsFile(object):
                 return aareadmes + filtered
 
         childnames = os.listdir(abspath)
-        return [c for c in childnames
-                if c != '.DS_Store' and not c.startswith('._')]
+        return _filter_childnames(abspath, childnames)
 
     @staticmethod
     def glob_glob(abspath, force_case_sensitive=False):
@@ -1380,7 +2020,7 @@ class PdsFile(object):
             shelf_paths = []
         elif _needs_glob(pattern):
             shelf_paths = _clean_glob(pattern)
-        elif os.path.exists(pattern):
+        elif pdsshelf.shelf_exists(pattern):
             shelf_paths = [pattern]
         else:
             shelf_paths = []
@@ -1395,60 +2035,69 @@ class PdsFile(object):
             return [p.replace('/holdings/_infoshelf-', '/holdings/')
                     for p in shelf_paths]
 
-        # Gather the matching entries in each shelf
+        # Gather the matching entries in each shelf. Since shelf keys are
+        # always in alphabetical order, the matching uses a binary search to
+        # skip over keys that do not share the pattern's literal prefix.
         abspaths = []
         for shelf_path in shelf_paths:
             shelf = PdsFile._get_shelf(shelf_path)
-            parts = shelf_path.split('/holdings/_infoshelf-')
-            assert len(parts) == 2
-
-            root_ = parts[0] + '/holdings/' + parts[1].split('_info.')[0] + '/'
-
-            if _needs_glob(key):
-                # Since shelf files are always in alphabetical order, we can
-                # use a binary search to figure out where to start comparing
-                # strings. This is useful because there can be a lot of
-                # paths to search through, and fnmatchcase is slow.
-                w1 = key.find('?')
-                w2 = key.find('*')
-                w3 = key.find('[')
-                wildcard_index = len(key)
-                if w1 != -1:
-                    wildcard_index = w1
-                if w2 != -1:
-                    wildcard_index = min(wildcard_index, w2)
-                if w3 != -1:
-                    wildcard_index = min(wildcard_index, w3)
-                key_prefix = key[:wildcard_index]
-                interior_paths = list(shelf.keys())
-                values = list(shelf.values())
-                starting_pos = bisect.bisect_left(interior_paths, key_prefix)
-                num_key_slashes = len(key.split('/'))
-                for (interior_path, value) in zip(
-                                interior_paths[starting_pos:],
-                                values[starting_pos:]):
-                    # If the key prefix doesn't match the interior_path prefix,
-                    # then we're done since the filenames are in alphabetical
-                    # order.
-                    if (key_prefix.upper() !=
-                        interior_path[:wildcard_index].upper()):
-                        break
-                    # Because fnmatch matches strings instead of filesystems,
-                    # it has the unfortunate property that match patterns can
-                    # accidentally cross directory boundaries. For example, the
-                    # pattern "f*r" will match "foo/bar", when it shouldn't. We
-                    # handle this by also checking that the returned result
-                    # contains the same number of slashes as the pattern.
-                    if (fnmatch.fnmatchcase(interior_path, key) and
-                        len(interior_path.split('/')) == num_key_slashes):
-                            abspaths.append(root_ + interior_path)
-            else:
-                if key in shelf:
-                    abspaths.append(root_ + key)
+            root_ = _infoshelf_root_(shelf_path)
+
+            matches = pdsshelf.glob_keys(shelf, [key])[key]
+            abspaths += [root_ + k for k in matches]
 
         # Remove trailing slashes!
         return [p.rstrip('/') for p in abspaths]
 
+    @staticmethod
+    def glob_glob_batch(abspaths, force_case_sensitive=False):
+        """Apply glob_glob() to each of a list of match patterns. Return a
+        dictionary of the lists of matching absolute paths, keyed by pattern.
+
+        Under SHELVES_ONLY, patterns that refer to the same shelf file are
+        matched together in one pass over its keys.
+        """
+
+        results = {}
+        keys_by_shelf = {}      # shelf path -> list of (pattern, key)
+        for abspath in abspaths:
+            if abspath in results:
+                continue
+
+            shelf_path = ''
+            if SHELVES_ONLY and _needs_glob(abspath):
+                try:
+                    (shelf_path,
+                     key) = PdsFile.shelf_path_and_key_for_abspath(
+                                                abspath.rstrip('/'), 'info')
+                except ValueError:
+                    pass
+
+            # Patterns needing more than a search of one shelf file
+            if (not shelf_path or _needs_glob(shelf_path) or
+                not _needs_glob(key) or
+                not pdsshelf.shelf_exists(shelf_path)):
+                    results[abspath] = PdsFile.glob_glob(abspath,
+                                                         force_case_sensitive)
+                    continue
+
+            results[abspath] = []
+            if shelf_path not in keys_by_shelf:
+                keys_by_shelf[shelf_path] = []
+
+            keys_by_shelf[shelf_path].append((abspath, key))
+
+        for (shelf_path, pairs) in keys_by_shelf.items():
+            shelf = PdsFile._get_shelf(shelf_path)
+            root_ = _infoshelf_root_(shelf_path)
+
+            matches = pdsshelf.glob_keys(shelf, [p[1] for p in pairs])
+            for (abspath, key) in pairs:
+                results[abspath] = [(root_ + k).rstrip('/')
+                                    for k in matches[key]]
+
+        return results
+
     ############################################################################
     # Properties
     ############################################################################
@@ -1646,7 +2295,7 @@ class PdsFile(object):
 
         if self._is_index is None:
             abspath = self.indexshelf_abspath
-            if abspath and os.path.exists(abspath):
+            if abspath and pdsshelf.shelf_exists(abspath):
                 self._is_index = True
             else:
                 self._is_index = False
@@ -1665,6 +2314,8 @@ class PdsFile(object):
         if self._index_pdslabel is None:
             label_abspath = self.abspath.replace ('.tab', '.lbl')
             label_abspath = label_abspath.replace('.TAB', '.LBL')
+
+            import pdsparser
             try:
               self._index_pdslabel = pdsparser.PdsLabel.from_file(label_abspath)
             except:
@@ -1885,6 +2536,7 @@ class PdsFile(object):
 
             LOGGER.warn('Retrieving viewable shape', self.abspath)
             try:
+                import PIL.Image
                 im = PIL.Image.open(self.abspath)
                 shape = im.size
                 im.close()
@@ -2471,6 +3123,7 @@ class PdsFile(object):
                             viewset_dict[key] = viewset
 
                 # Add the unique viewset names of the non-directory children
+                self.prefetch_children(self.childnames[:20])
                 for c in self.childnames[:20]:  # first 20 should be enough
                     child = self.child(c)
                     if child.isdir:
@@ -2895,6 +3548,7 @@ class PdsFile(object):
             if len(basenames) > 20:     # Stop after 20 files max
                 basenames = basenames[:20]
 
+            self.prefetch_children(basenames)
             for basename in basenames:
                 pdsf = self.child(basename)
                 if pdsf.isdir: continue
@@ -3183,6 +3837,17 @@ class PdsFile(object):
                                     CACHE[logical_lc].is_merged):
             CACHE.set(logical_lc, self)
 
+    def prefetch_children(self, basenames=None):
+        """Retrieve the cached PdsFiles of many children of this directory at
+        once, so that subsequent calls to child() need no separate trips to the
+        cache. Default is to prefetch every child."""
+
+        if basenames is None:
+            basenames = self.childnames
+
+        keys = [_clean_join(self.logical_path, b).lower() for b in basenames]
+        _ = CACHE.prefetch(keys)
+
     ############################################################################
     # Alternative constructors
     ############################################################################
@@ -4053,6 +4718,8 @@ class PdsFile(object):
                 rows = (rows,)
 
             row_range = (min(rows), max(rows)+1)
+
+            import pdstable
             table = pdstable.PdsTable(self.label_abspath, self.index_pdslabel,
                                       row_range=row_range)
             table_dicts = table.dicts_by_row()
@@ -4085,6 +4752,8 @@ class PdsFile(object):
         is on the same volume and parallel to the other files in the index.
         """
 
+        import pdstable
+
         # Internal function identifies the row_dict keys for filespec,
         # path_name (optional), and volume
         def get_keys(row_dict):
@@ -4168,7 +4837,21 @@ class PdsFile(object):
         path, without the category or prefix specified.
         """
 
-        volset = PdsFile.FILESPEC_TO_VOLSET.first(filespec)
+        # The volume set only depends on the volume ID, so each volume ID is
+        # only translated once
+        (volset_by_volume_id, source) = PdsFile._VOLSET_BY_VOLUME_ID
+        if source is not PdsFile.FILESPEC_TO_VOLSET:
+            volset_by_volume_id = {}
+            PdsFile._VOLSET_BY_VOLUME_ID = (volset_by_volume_id,
+                                            PdsFile.FILESPEC_TO_VOLSET)
+
+        volume_id = filespec.partition('/')[0]
+        try:
+            volset = volset_by_volume_id[volume_id]
+        except KeyError:
+            volset = PdsFile.FILESPEC_TO_VOLSET.first(filespec)
+            volset_by_volume_id[volume_id] = volset
+
         if not volset:
             raise ValueError('Unrecognized file specification: ' + filespec)
 
@@ -4190,16 +4873,26 @@ class PdsFile(object):
 
         paths = pdsfile_class.OPUS_ID_TO_PRIMARY_LOGICAL_PATH.all(opus_id)
         patterns = [abspath_for_logical_path(p) for p in paths]
+
+        # Consult the OPUS ID index. Search the volumes that are not indexed;
+        # search all of them if the index does not contain this ID.
         matches = []
+        if USE_OPUS_INDEX:
+            (matches, unindexed) = PdsFile._opus_index_lookup(opus_id,
+                                                              patterns)
+            if matches:
+                patterns = unindexed
+
         for pattern in patterns:
             if _needs_glob(pattern):
-                abspaths = PdsFile.glob_glob(pattern, force_case_sensitive=True)
+                abspaths = PdsFile.glob_glob(pattern,
+                                             force_case_sensitive=True)
             elif PdsFile.os_path_exists(pattern, force_case_sensitive=True):
                 abspaths = [pattern]
             else:
                 abspaths = []
 
-            matches += abspaths
+            matches += [a for a in abspaths if a not in matches]
 
         # One match is easy to handle
         if len(matches) == 1:
@@ -4223,6 +4916,66 @@ class PdsFile(object):
 
         return pdsfiles[0]
 
+    @staticmethod
+    def _opus_index_lookup(opus_id, patterns):
+        """Internal method to look up an OPUS ID in the OPUS index shelves.
+
+        Return a tuple (abspaths, unindexed). The first is the list of primary
+        product abspaths for this OPUS ID found in the index shelves, excluding
+        any that no longer exist. The second is the list of path patterns that
+        must still be searched because their volumes have no index shelf.
+
+        Input:
+            opus_id         the OPUS ID.
+            patterns        absolute path patterns of the primary product, as
+                            derived from OPUS_ID_TO_PRIMARY_LOGICAL_PATH. These
+                            identify the volume(s) whose index shelves are
+                            searched.
+        """
+
+        abspaths = []
+        unindexed = []
+        for pattern in patterns:
+            (root, _, logical_path) = pattern.partition('/holdings/')
+            parts = logical_path.split('/')
+            if len(parts) < 4 or logical_path.startswith('archives'):
+                unindexed.append(pattern)
+                continue
+
+            volume_pattern = root + '/holdings/' + '/'.join(parts[:3])
+            interior = '/'.join(parts[3:])
+            if _needs_glob(volume_pattern):
+                volume_paths = PdsFile.glob_glob(volume_pattern,
+                                                 force_case_sensitive=True)
+            else:
+                volume_paths = [volume_pattern]
+
+            for volume_path in volume_paths:
+                (shelf_path, _) = PdsFile.shelf_path_and_key_for_abspath(
+                                                        volume_path, 'opus')
+                shelf = None
+                if pdsshelf.shelf_exists(shelf_path):
+                    try:
+                        shelf = PdsFile._get_shelf(shelf_path,
+                                                   log_missing_file=False)
+                    except (IOError, OSError, ValueError):
+                        pass
+
+                if shelf is None:
+                    unindexed.append(volume_path + '/' + interior)
+                    continue
+
+                # An index can be out of date, so check that each file exists
+                for found in shelf.get(opus_id) or []:
+                    abspath = volume_path + '/' + found
+                    if abspath in abspaths:
+                        continue
+                    if PdsFile.os_path_exists(abspath,
+                                              force_case_sensitive=True):
+                        abspaths.append(abspath)
+
+        return (abspaths, unindexed)
+
     def opus_products(self):
         """For this primary data product or label, return a dictionary keyed
         by a tuple containing this information:
@@ -4253,7 +5006,18 @@ class PdsFile(object):
         alternative products.
         """
 
-        # Get the associated absolute paths
+        abs_patterns_and_opus_types = self._opus_product_patterns()
+        matches = PdsFile.glob_glob_batch([p[0] for p in
+                                           abs_patterns_and_opus_types],
+                                          force_case_sensitive=True)
+
+        return self._opus_products_from_matches(abs_patterns_and_opus_types,
+                                                matches, {}, {})
+
+    def _opus_product_patterns(self):
+        """Internal method returns the list of tuples (absolute match pattern,
+        opus_type or None) for the OPUS products of this file."""
+
         patterns = self.OPUS_PRODUCTS.all(self.logical_path)
 
         abs_patterns_and_opus_types = []
@@ -4264,14 +5028,35 @@ class PdsFile(object):
                 (p, opus_type) = pattern
                 abs_patterns_and_opus_types.append((self.root_ + p, opus_type))
 
+        return abs_patterns_and_opus_types
+
+    def _opus_products_from_matches(self, abs_patterns_and_opus_types,
+                                    matches, pdsfiles_by_abspath,
+                                    label_sublists):
+        """Internal method to construct the dictionary returned by
+        opus_products().
+
+        Input:
+            abs_patterns_and_opus_types
+                                the list returned by _opus_product_patterns().
+            matches             dictionary of matching abspaths keyed by
+                                pattern, as returned by glob_glob_batch().
+            pdsfiles_by_abspath dictionary of PdsFiles keyed by abspath; new
+                                PdsFiles are added to it.
+            label_sublists      dictionary keyed by label abspath, returning
+                                [label_pdsfile, fmt1_pdsfile, ...], or None if
+                                the label has no links info; new labels are
+                                added to it.
+        The latter two dictionaries can be shared across calls.
+        """
+
         # Construct a complete list of matching abspaths.
         # Create a dictionary of opus_types based on abspaths where opus_types
         # have already been specified.
         abspaths = []
         opus_type_for_abspath = {}
         for (pattern, opus_type) in abs_patterns_and_opus_types:
-            these_abspaths = PdsFile.glob_glob(pattern,
-                                               force_case_sensitive=True)
+            these_abspaths = matches[pattern]
             if opus_type:
                 for abspath in these_abspaths:
                     opus_type_for_abspath[abspath] = opus_type
@@ -4284,23 +5069,18 @@ class PdsFile(object):
         label_pdsfiles = {}
         data_pdsfiles = []
         for abspath in abspaths:
-            pdsf = PdsFile.from_abspath(abspath)
+            try:
+                pdsf = pdsfiles_by_abspath[abspath]
+            except KeyError:
+                pdsf = PdsFile.from_abspath(abspath)
+                pdsfiles_by_abspath[abspath] = pdsf
+
             if pdsf.islabel:
-                # Check if the corresponding link info exists. If not, we skip
-                # this label file. That way, the error handled when calling the
-                # linked_abspaths below will not abort the import process.
-                try:
-                    pdsf.shelf_lookup('link')
-                except (OSError, KeyError, ValueError):
-                    LOGGER.warn('Missing links info',
-                                pdsf.logical_path)
-                    continue
-                links = set(pdsf.linked_abspaths)
-                fmts = [f for f in links if f.lower().endswith('.fmt')]
-                fmts.sort()
-                fmt_pdsfiles = PdsFile.pdsfiles_for_abspaths(fmts,
-                                                             must_exist=True)
-                label_pdsfiles[abspath] = [pdsf] + fmt_pdsfiles
+                if abspath not in label_sublists:
+                    label_sublists[abspath] = PdsFile._opus_label_sublist(pdsf)
+
+                if label_sublists[abspath] is not None:
+                    label_pdsfiles[abspath] = label_sublists[abspath]
             else:
                 data_pdsfiles.append(pdsf)
 
@@ -4329,6 +5109,157 @@ class PdsFile(object):
 
         return pdsfile_dict
 
+    @staticmethod
+    def _opus_label_sublist(pdsf):
+        """Internal method returns [label_pdsfile, fmt1_pdsfile, ...] for a
+        label, or None if its links info is missing."""
+
+        # Check if the corresponding link info exists. If not, we skip this
+        # label file. That way, the error handled when calling the
+        # linked_abspaths below will not abort the import process.
+        try:
+            pdsf.shelf_lookup('link')
+        except (OSError, KeyError, ValueError):
+            LOGGER.warn('Missing links info', pdsf.logical_path)
+            return None
+
+        links = set(pdsf.linked_abspaths)
+        fmts = [f for f in links if f.lower().endswith('.fmt')]
+        fmts.sort()
+        fmt_pdsfiles = PdsFile.pdsfiles_for_abspaths(fmts, must_exist=True)
+        return [pdsf] + fmt_pdsfiles
+
+    @staticmethod
+    def opus_products_for_pdsfiles(pdsfiles):
+        """The opus_products() dictionaries for a list of primary data products,
+        returned as a dictionary keyed by the abspath of each primary product.
+
+        This is equivalent to calling opus_products() for each PdsFile, but the
+        shelf searches for all of the products are done together, and the
+        PdsFiles for labels and their FMT files are shared across the batch.
+        """
+
+        patterns_by_abspath = {}
+        all_patterns = []
+        for pdsf in pdsfiles:
+            patterns = pdsf._opus_product_patterns()
+            patterns_by_abspath[pdsf.abspath] = patterns
+            all_patterns += [p[0] for p in patterns]
+
+        matches = PdsFile.glob_glob_batch(all_patterns,
+                                          force_case_sensitive=True)
+
+        pdsfiles_by_abspath = {}
+        label_sublists = {}
+        products = {}
+        for pdsf in pdsfiles:
+            products[pdsf.abspath] = pdsf._opus_products_from_matches(
+                                            patterns_by_abspath[pdsf.abspath],
+                                            matches, pdsfiles_by_abspath,
+                                            label_sublists)
+
+        return products
+
+    def opus_products_for_volume(self):
+        """The opus_products() dictionaries for every primary data product in
+        this volume, keyed by the abspath of each primary product."""
+
+        return PdsFile.opus_products_for_pdsfiles(self.opus_primary_pdsfiles())
+
+    def opus_primary_pdsfiles(self):
+        """The list of primary data products for OPUS in this directory tree,
+        in sorted order. A primary product has an OPUS ID and matches one of
+        the paths returned by OPUS_ID_TO_PRIMARY_LOGICAL_PATH for that ID.
+        """
+
+        return list(self.iter_opus_primary_pdsfiles())
+
+    def iter_opus_primary_pdsfiles(self):
+        """Generator over the primary data products for OPUS in this directory
+        tree, in sorted order. See opus_primary_pdsfiles()."""
+
+        if not self.isdir:
+            return
+
+        paths_by_opus_id = {}
+        pdsdirs = [self]
+        while pdsdirs:
+            pdsdir = pdsdirs.pop()
+            subdirs = []
+            for basename in pdsdir.childnames:
+                pdsf = pdsdir.child(basename, fix_case=False)
+                if pdsf.isdir:
+                    subdirs.append(pdsf)
+                    continue
+
+                if pdsf.islabel:
+                    continue
+
+                opus_id = pdsf.opus_id
+                if not opus_id:
+                    continue
+
+                # Consecutive files usually share an OPUS ID, so only the most
+                # recent patterns are kept
+                if opus_id not in paths_by_opus_id:
+                    paths_by_opus_id = {
+                        opus_id: pdsf._opus_id_primary_patterns(opus_id)}
+
+                for pattern in paths_by_opus_id[opus_id]:
+                    if fnmatch.fnmatchcase(pdsf.logical_path, pattern):
+                        yield pdsf
+                        break
+
+            # Subdirectories are visited depth-first, in sorted order
+            pdsdirs += subdirs[::-1]
+
+    def iter_opus_products(self, batch_size=OPUS_BATCH_SIZE):
+        """Generator over (opus_id, opus_products dictionary) for every primary
+        data product in this directory tree.
+
+        Primary products are imported in batches of batch_size using
+        opus_products_for_pdsfiles(), so memory use is bounded by the batch
+        size rather than by the size of the volume.
+        """
+
+        batch = []
+        for pdsf in self.iter_opus_primary_pdsfiles():
+            batch.append(pdsf)
+            if len(batch) >= batch_size:
+                for record in PdsFile._opus_products_for_batch(batch):
+                    yield record
+                batch = []
+
+        for record in PdsFile._opus_products_for_batch(batch):
+            yield record
+
+    @staticmethod
+    def _opus_products_for_batch(pdsfiles):
+        """Internal method returns a list of (opus_id, opus_products dictionary)
+        for a batch of primary products, in the order given."""
+
+        if not pdsfiles:
+            return []
+
+        products = PdsFile.opus_products_for_pdsfiles(pdsfiles)
+        return [(pdsf.opus_id, products[pdsf.abspath]) for pdsf in pdsfiles]
+
+    def _opus_id_primary_patterns(self, opus_id):
+        """Internal method returns the logical path patterns of the primary
+        product for an OPUS ID."""
+
+        # Access via the class so a function is not bound to self
+        rule = type(self).OPUS_ID_TO_PRIMARY_LOGICAL_PATH
+
+        # If implemented as a function rather than as a translator...
+        if callable(rule):
+            try:
+                return [rule(opus_id).logical_path]
+            except ValueError:
+                return []
+
+        return rule.all(opus_id)
+
     ############################################################################
     # Checksum path associations
     ############################################################################
@@ -4479,21 +5410,66 @@ class PdsFile(object):
     # Shelf support
     ############################################################################
 
-    SHELF_CACHE = {}
-    SHELF_ACCESS = {}
-    SHELF_CACHE_SIZE = 120
-    SHELF_CACHE_SLOP = 20
-    SHELF_ACCESS_COUNT = 0
+    # Open shelves are kept in an LRU cache limited by their estimated size in
+    # memory, which bounds the memory used by each process.
+    SHELF_CACHE_BYTES = 1024 * 1024 * 1024
+    SHELF_CACHE = pdsshelf.ShelfCache(SHELF_CACHE_BYTES)
 
     SHELF_NULL_KEY_VALUES = {}
 
+    @staticmethod
+    def set_shelf_cache_bytes(max_bytes):
+        """Set the byte budget for open shelf files; None for no limit."""
+
+        PdsFile.SHELF_CACHE_BYTES = max_bytes
+        PdsFile.SHELF_CACHE.set_max_bytes(max_bytes)
+
+    @staticmethod
+    def shelf_cache_stats():
+        """Dictionary of statistics about the open shelf cache: numbers of
+        open and pinned shelves, estimated bytes, byte budget, hits, misses and
+        evictions."""
+
+        return PdsFile.SHELF_CACHE.stats()
+
+    @staticmethod
+    def pin_shelf(shelf_path):
+        """Keep this shelf file open permanently once it has been opened."""
+
+        PdsFile.SHELF_CACHE.pin(shelf_path)
+
+    @staticmethod
+    def unpin_shelf(shelf_path):
+        """Allow this shelf file to be closed when the cache is full."""
+
+        PdsFile.SHELF_CACHE.unpin(shelf_path)
+
+    def pin_shelves(self, shelf_types=('info', 'link')):
+        """Keep the shelf files of this object's volume open permanently.
+        Use for the volumes that are accessed most often."""
+
+        for shelf_type in shelf_types:
+            (shelf_path, _) = self.shelf_path_and_key(shelf_type)
+            PdsFile.pin_shelf(shelf_path)
+
+    @staticmethod
+    def pin_most_accessed_shelves(count=10):
+        """Pin the shelf files looked up most often so far. Return the list
+        of shelf paths pinned."""
+
+        pairs = PdsFile.SHELF_CACHE.most_accessed(count)
+        for (shelf_path, _) in pairs:
+            PdsFile.pin_shelf(shelf_path)
+
+        return [p[0] for p in pairs]
+
     def shelf_path_and_lskip(self, shelf_type='info', volname=''):
         """The absolute path to the shelf file associated with this PdsFile.
         Also return the number of characters to skip over in that absolute
         path to obtain the key into the shelf.
 
         Inputs:
-            shelf_type  shelf type ID: 'index', 'info', or 'link'.
+            shelf_type  shelf type ID: 'index', 'info', 'link', or 'opus'.
             volname     an optional volume name to append to the end of a this
                         path, which can be used if this is a volset.
         """
@@ -4547,35 +5523,35 @@ class PdsFile(object):
         """Internal method to open a shelf/pickle file. A limited number of
         shelf files are kept open at all times to reduce file IO.
 
+        If a sorted shelf file (".shelf") exists in place of the given pickle
+        path, it is memory-mapped instead of unpickling the whole dictionary.
+        Either way, the returned object supports the dictionary interface plus
+        binary searches via bisect_left() and keys_with_prefix().
+
         Use log_missing_file = False to suppress log entries when a nonexistent
         shelf file is requested but the exception is handled externally.
         """
 
-        # If the shelf is already open, update the access count and return it
-        if shelf_path in PdsFile.SHELF_CACHE:
-            PdsFile.SHELF_ACCESS_COUNT += 1
-            PdsFile.SHELF_ACCESS[shelf_path] = PdsFile.SHELF_ACCESS_COUNT
+        # If the shelf is already open, mark it as recently used and return it
+        shelf = PdsFile.SHELF_CACHE.get(shelf_path)
+        if shelf is not None:
+            if SHELF_STORE is None or SHELF_STORE.is_current(shelf):
+                return shelf
 
-            return PdsFile.SHELF_CACHE[shelf_path]
+            # The underlying file has changed, so re-open it
+            LOGGER.debug('Shelf file modified', shelf_path)
+            PdsFile.SHELF_CACHE.remove(shelf_path)
+            PdsFile.SHELF_NULL_KEY_VALUES.pop(shelf_path, None)
 
-        if log_missing_file or os.path.exists(shelf_path):
-            LOGGER.debug('Opening pickle file', shelf_path)
+        if log_missing_file or pdsshelf.shelf_exists(shelf_path):
+            LOGGER.debug('Opening shelf file', shelf_path)
 
-        if not os.path.exists(shelf_path):
-            raise IOError('Pickle file not found: %s' % shelf_path)
-
-        try:
-            with open(shelf_path, 'rb') as f:
-                shelf = pickle.load(f)
-        except Exception as e:
-            raise IOError('Unable to open pickle file: %s' % shelf_path)
-
-        # The pickle files do not produce dictionaries that are in
-        # alphabetical order, so we sort them here in case we want to
-        # do a binary search later.
-        keys_vals = list(zip(shelf.keys(), shelf.values()))
-        keys_vals.sort(key=lambda x: x[0])
-        shelf = dict(keys_vals)
+        # The shelf keys are always available in alphabetical order, in case we
+        # want to do a binary search later.
+        if SHELF_STORE is None:
+            shelf = pdsshelf.open_shelf(shelf_path)
+        else:
+            shelf = SHELF_STORE.open_shelf(shelf_path)
 
         # Save the null key values from the info shelves. This can save a lot of
         # shelf open/close operations when we just need info about a volume,
@@ -4583,19 +5559,9 @@ class PdsFile(object):
         if '' in shelf and shelf_path not in PdsFile.SHELF_NULL_KEY_VALUES:
             PdsFile.SHELF_NULL_KEY_VALUES[shelf_path] = shelf['']
 
-        PdsFile.SHELF_ACCESS_COUNT += 1
-        PdsFile.SHELF_ACCESS[shelf_path] = PdsFile.SHELF_ACCESS_COUNT
-        PdsFile.SHELF_CACHE[shelf_path] = shelf
-
-        # Trim the cache if necessary
-        if len(PdsFile.SHELF_CACHE) > (PdsFile.SHELF_CACHE_SIZE +
-                                       PdsFile.SHELF_CACHE_SLOP):
-            pairs = [(PdsFile.SHELF_ACCESS[k],k) for k in PdsFile.SHELF_CACHE]
-            pairs.sort()
-
-            shelf_paths = [p[1] for p in pairs]
-            for shelf_path in shelf_paths[:-PdsFile.SHELF_CACHE_SIZE]:
-                PdsFile._close_shelf(shelf_path)
+        # Adding the shelf evicts the least recently used shelves if the cache
+        # has exceeded its byte budget
+        PdsFile.SHELF_CACHE.set(shelf_path, shelf)
 
         return shelf
 
@@ -4604,25 +5570,20 @@ class PdsFile(object):
         """Internal method to close a shelf file. A limited number of shelf
         files are kept open at all times to reduce file IO."""
 
-        # If the shelf is not already open, return
-        if shelf_path not in PdsFile.SHELF_CACHE:
-            LOGGER.error('Cannot close pickle file; not currently open',
+        # Remove from the cache; log an error if the shelf is not open
+        if not PdsFile.SHELF_CACHE.remove(shelf_path):
+            LOGGER.error('Cannot close shelf file; not currently open',
                          shelf_path)
             return
 
-        # Remove from the cache
-        del PdsFile.SHELF_CACHE[shelf_path]
-        del PdsFile.SHELF_ACCESS[shelf_path]
-
-        LOGGER.debug('Pickle file closed', shelf_path)
+        LOGGER.debug('Shelf file closed', shelf_path)
 
     @staticmethod
     def close_all_shelves():
         """Close all shelf files."""
 
-        keys = list(PdsFile.SHELF_CACHE.keys())     # save keys so dict can be
-        for shelf_path in keys:                     # be modified inside loop!
-            PdsFile._close_shelf(shelf_path)
+        PdsFile.SHELF_CACHE.clear()
+        LOGGER.debug('All shelf files closed')
 
     def shelf_lookup(self, shelf_type='info', volname=''):
         """Return the contents of a shelf file associated with this object.
@@ -4957,17 +5918,19 @@ class PdsFile(object):
 
             return tuple(parts)
 
+        sort_order = self._sort_order or self.SORT_ORDER
+
         if labels_after is None:
-            labels_after = self.SORT_ORDER['labels_after']
+            labels_after = sort_order['labels_after']
 
         if dirs_first is None:
-            dirs_first = self.SORT_ORDER['dirs_first']
+            dirs_first = sort_order['dirs_first']
 
         if dirs_last is None:
-            dirs_last = self.SORT_ORDER['dirs_last']
+            dirs_last = sort_order['dirs_last']
 
         if info_first is None:
-            info_first = self.SORT_ORDER['info_first']
+            info_first = sort_order['info_first']
 
         # Put info file first only if the number of children exceeds the
         # specified threshold:
@@ -5213,6 +6176,7 @@ class PdsFile(object):
 
     def pdsfiles_for_basenames(self, basenames, must_exist=False):
 
+        self.prefetch_children(basenames)
         pdsfiles = [self.child(b) for b in basenames]
 
         if must_exist:
@@ -5327,23 +6291,29 @@ class PdsFile(object):
             if pdsf and pdsf.abspath:
                 patterns = [pdsf.abspath]
 
-        abspaths = []
+        # Handle an index row by separating the filepath from the suffix
+        patterns_and_suffixes = []
         for pattern in patterns:
-
-            # Handle an index row by separating the filepath from the suffix
             if '.tab/' in pattern:
                 parts = pattern.rpartition('.tab')
-                pattern = parts[0] + parts[1]
-                suffix = parts[2][1:]
+                patterns_and_suffixes.append((parts[0] + parts[1],
+                                              parts[2][1:]))
             else:
-                suffix = ''
+                patterns_and_suffixes.append((pattern, ''))
+
+        # Match all the patterns together
+        matches = PdsFile.glob_glob_batch([p[0] for p in patterns_and_suffixes
+                                           if must_exist or _needs_glob(p[0])],
+                                          force_case_sensitive=True)
+
+        abspaths = []
+        for (pattern, suffix) in patterns_and_suffixes:
 
             # Find the file(s) that match the pattern
             if not must_exist and not _needs_glob(pattern):
                 test_abspaths = [pattern]
             else:
-                test_abspaths = PdsFile.glob_glob(pattern,
-                                                  force_case_sensitive=True)
+                test_abspaths = list(matches[pattern])
 
             # With a suffix, make sure it matches a row of the index
             if suffix:
@@ -5531,6 +6501,33 @@ class PdsFile(object):
 
 PdsFile.SUBCLASSES['default'] = PdsFile
 
+################################################################################
+# Install the side record attributes
+################################################################################
+
+_CORE_ATTRIBUTES = tuple(name for name in PdsFile.__slots__
+                         if name != '_extras')
+
+_SIDE_ATTRIBUTES = (
+    '_is_viewable_filled', '_info_basename_filled', '_label_basename_filled',
+    '_viewset_filled', '_local_viewset_filled', '_all_viewsets_filled',
+    '_iconset_filled', '_internal_links_filled', '_mime_type_filled',
+    '_opus_id_filled', '_opus_type_filled', '_opus_format_filled',
+    '_view_options_filled', '_volume_info_filled', '_all_version_abspaths',
+    '_html_path_filled', '_description_and_icon_filled',
+    '_volume_publication_date_filled', '_volume_version_id_filled',
+    '_volume_data_set_ids_filled', '_lid_filled', '_lidvid_filled',
+    '_data_set_id_filled', '_version_ranks_filled',
+    '_exact_archive_url_filled', '_exact_checksum_url_filled',
+    '_associated_parallels_filled', '_filename_keylen_filled',
+    '_indexshelf_abspath', '_index_pdslabel',
+    'parent_basename',      # only used by index rows
+    '_sort_order',          # overrides of SORT_ORDER for this object
+)
+
+for name in _SIDE_ATTRIBUTES:
+    setattr(PdsFile, name, _SideAttribute(name))
+
 ################################################################################
 # This import must wait until after the PdsFile class has been fully initialized
 ################################################################################
@@ -5560,6 +6557,32 @@ for category in CATEGORY_LIST:
 # Support functions
 ################################################################################
 
+def _rebuilt_attributes(attributes):
+    """Dictionary of the PdsFile attributes that can be rebuilt from the
+    others, given the dictionary of attributes. Used for compact pickling."""
+
+    rebuilt = {}
+
+    childnames = attributes['_childnames_filled']
+    if childnames is not None:
+        rebuilt['_childnames_lc_filled'] = [c.lower() for c in childnames]
+
+    # Path components are None for merged directories
+    try:
+        logical_path = (attributes['category_'] + attributes['volset_'] +
+                        attributes['volname_'] + attributes['interior'])
+    except TypeError:
+        return rebuilt
+
+    logical_path = logical_path.rstrip('/')
+    rebuilt['logical_path'] = logical_path
+    rebuilt['basename'] = logical_path.rpartition('/')[2]
+
+    if attributes['root_']:
+        rebuilt['abspath'] = attributes['root_'] + logical_path
+
+    return rebuilt
+
 def _clean_join(a, b):
 #     joined = os.path.join(a,b).replace('\\', '/')
     if a:
@@ -5591,6 +6614,28 @@ def _clean_glob(pattern, force_case_sensitive=False):
     else:
         return results
 
+def _infoshelf_root_(shelf_path):
+    """The absolute path to the directory, with a trailing slash, described by
+    an info shelf file."""
+
+    parts = shelf_path.split('/holdings/_infoshelf-')
+    assert len(parts) == 2
+
+    return parts[0] + '/holdings/' + parts[1].split('_info.')[0] + '/'
+
+def _filter_childnames(abspath, childnames):
+    """Remove the basenames that never appear in a directory listing: .DS_Store,
+    dot-underscore files, and inside the checksums trees, the stat files that
+    validation/pdschecksums.py keeps next to each checksum file."""
+
+    if '/holdings/checksums-' in abspath:
+        return [c for c in childnames
+                if c != '.DS_Store' and not c.startswith('._') and
+                   not c.endswith('_md5_stat.txt')]
+
+    return [c for c in childnames
+            if c != '.DS_Store' and not c.startswith('._')]
+
 def _needs_glob(pattern):
     """True if this expression contains wildcards"""
     return '*' in pattern or '?' in pattern or '[' in pattern
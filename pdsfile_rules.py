@@ -571,7 +571,7 @@ OPUS_ID_TO_PRIMARY_LOGICAL_PATH = translator.TranslatorByRegex([])
 #
 # Translates a file specification, starting from the volume ID, to a logical path. It is shared by all subclasses. Default behavior
 # is to replace the last three characters of the volume name by "xxx". This needs to be overridden for volsets that have a different
-# number of x's in their names.
+# number of x's in their names. The result must depend only on the volume ID, because PdsFile.from_filespec() saves it by volume ID.
 ####################################################################################################################################
 
 FILESPEC_TO_VOLSET = translator.TranslatorByRegex([
@@ -0,0 +1,227 @@
+################################################################################
+# pdsopusimport.py: OpusImporter class streams the OPUS products of the primary
+#   files in a set of volumes, using a pool of processes across volumes.
+################################################################################
+
+import multiprocessing
+import queue
+import time
+
+import pdsfile
+import pdslogger
+
+# Message types passed from the workers to the parent process
+_RECORD = 0         # (_RECORD, logical_path, opus_id, products)
+_DONE   = 1         # (_DONE, logical_path, count, seconds)
+_ERROR  = 2         # (_ERROR, logical_path, message, None)
+_EXIT   = 3         # (_EXIT, None, None, None)
+
+DEFAULT_QUEUE_SIZE = 1000
+
+################################################################################
+# Worker process
+################################################################################
+
+def _import_volume(logical_path, batch_size, put):
+    """Send every record for one volume to the put function, followed by a
+    _DONE message or an _ERROR message."""
+
+    start = time.time()
+    count = 0
+    try:
+        pdsf = pdsfile.PdsFile.from_logical_path(logical_path)
+        for (opus_id, products) in pdsf.iter_opus_products(batch_size):
+            put((_RECORD, logical_path, opus_id, products))
+            count += 1
+
+    except Exception as e:
+        put((_ERROR, logical_path, '%s: %s' % (type(e).__name__, e), None))
+
+    put((_DONE, logical_path, count, time.time() - start))
+
+def _worker(volume_queue, record_queue, batch_size, initializer, initargs):
+    """Import volumes from the volume queue until a None is received."""
+
+    if initializer is not None:
+        initializer(*initargs)
+
+    while True:
+        logical_path = volume_queue.get()
+        if logical_path is None:
+            break
+
+        _import_volume(logical_path, batch_size, record_queue.put)
+
+    record_queue.put((_EXIT, None, None, None))
+
+################################################################################
+# OpusImporter
+################################################################################
+
+class OpusImporter(object):
+    """Streams (opus_id, opus_products dictionary) records for every primary
+    file in a list of volumes.
+
+    Each volume is handled by one worker process, which walks the volume's
+    primary files using PdsFile.iter_opus_products(). Records are passed back
+    through a queue of limited size, so a worker pauses whenever the consumer
+    falls behind and memory use stays flat regardless of the number of volumes.
+    """
+
+    def __init__(self, processes=None, queue_size=DEFAULT_QUEUE_SIZE,
+                       batch_size=pdsfile.OPUS_BATCH_SIZE,
+                       initializer=None, initargs=(), logger=None):
+        """Constructor.
+
+        Input:
+            processes       number of worker processes; None to use the number
+                            of CPUs; 0 to import every volume in this process.
+            queue_size      maximum number of records waiting to be consumed.
+            batch_size      number of primary files imported together within a
+                            volume.
+            initializer     optional function called at the start of each
+                            worker process, e.g., pdsfile.preload.
+            initargs        tuple of arguments to the initializer.
+            logger          optional PdsLogger for per-volume throughput.
+        """
+
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        self.processes = processes
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.initializer = initializer
+        self.initargs = initargs
+        self.logger = logger or pdslogger.NullLogger()
+
+        # Dictionary keyed by volume logical path, returning a dictionary with
+        # keys 'products', 'seconds', 'rate' and, on failure, 'error'
+        self.throughput = {}
+
+    def iter_products(self, logical_paths):
+        """Generator over (opus_id, opus_products dictionary) for every primary
+        file in the given volumes.
+
+        Records from a single volume arrive in order; records from different
+        volumes are interleaved when more than one process is in use.
+        """
+
+        if isinstance(logical_paths, str):
+            logical_paths = [logical_paths]
+
+        logical_paths = list(logical_paths)
+        self.throughput = {}
+
+        if self.processes == 0 or len(logical_paths) == 0:
+            return self._iter_serial(logical_paths)
+
+        return self._iter_parallel(logical_paths)
+
+    def _iter_serial(self, logical_paths):
+        """Generator for imports within the current process."""
+
+        for logical_path in logical_paths:
+            start = time.time()
+            count = 0
+            try:
+                pdsf = pdsfile.PdsFile.from_logical_path(logical_path)
+                for record in pdsf.iter_opus_products(self.batch_size):
+                    count += 1
+                    yield record
+
+            except Exception as e:
+                self._handle_message((_ERROR, logical_path,
+                                      '%s: %s' % (type(e).__name__, e), None))
+
+            self._handle_message((_DONE, logical_path, count,
+                                  time.time() - start))
+
+    def _iter_parallel(self, logical_paths):
+        """Generator for imports using a pool of worker processes."""
+
+        processes = min(self.processes, len(logical_paths))
+
+        volume_queue = multiprocessing.Queue()
+        for logical_path in logical_paths:
+            volume_queue.put(logical_path)
+        for k in range(processes):
+            volume_queue.put(None)
+
+        record_queue = multiprocessing.Queue(maxsize=self.queue_size)
+
+        workers = []
+        for k in range(processes):
+            worker = multiprocessing.Process(target=_worker,
+                                             args=(volume_queue, record_queue,
+                                                   self.batch_size,
+                                                   self.initializer,
+                                                   self.initargs))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        try:
+            running = processes
+            while running:
+                try:
+                    message = record_queue.get(timeout=1.)
+                except queue.Empty:
+                    if not any(w.is_alive() for w in workers):
+                        raise IOError('OPUS import processes exited ' +
+                                      'unexpectedly')
+                    continue
+
+                if message[0] == _EXIT:
+                    running -= 1
+                    continue
+
+                record = self._handle_message(message)
+                if record is not None:
+                    yield record
+
+            for worker in workers:
+                worker.join()
+
+        # If the consumer stops early, don't leave workers blocked on the queue
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+
+    def _handle_message(self, message):
+        """Return the (opus_id, products) record of a _RECORD message; otherwise,
+        update the throughput for the volume and return None."""
+
+        (mtype, logical_path, value, extra) = message
+
+        if mtype == _RECORD:
+            return (value, extra)
+
+        if mtype == _ERROR:
+            self.throughput.setdefault(logical_path, {})['error'] = value
+            self.logger.error('OPUS import failed: ' + value, logical_path)
+            return None
+
+        # _DONE
+        seconds = extra
+        rate = value / seconds if seconds > 0. else 0.
+        stats = self.throughput.setdefault(logical_path, {})
+        stats['products'] = value
+        stats['seconds'] = seconds
+        stats['rate'] = rate
+        self.logger.info('%d OPUS products in %.1f s (%.1f/s)'
+                         % (value, seconds, rate), logical_path)
+        return None
+
+    def summary(self):
+        """Tuple (volumes, products, seconds) summed over every volume imported
+        by the most recent call to iter_products()."""
+
+        volumes = len(self.throughput)
+        products = sum(s.get('products', 0) for s in self.throughput.values())
+        seconds = sum(s.get('seconds', 0.) for s in self.throughput.values())
+        return (volumes, products, seconds)
+
+################################################################################
@@ -0,0 +1,984 @@
+################################################################################
+# pdsshelf.py
+#
+# Sorted, memory-mapped shelf files. A shelf file contains a dictionary keyed
+# by interior path (or index row key). Unlike the pickle version of the same
+# dictionary, it can be opened without deserializing its entire contents. The
+# keys are stored in sorted order along with a table of offsets, so a single
+# key can be located by a binary search and only its value is unpickled.
+#
+# File layout (all integers are little-endian):
+#   header      magic b'PDSSHELF', format version (uint32), entry count
+#               (uint32), directory count (uint32), reserved (uint32), offset
+#               of the directory table (uint64).
+#   offsets     one record per entry: key offset (uint64), key length (uint32),
+#               value length (uint32). The value immediately follows its key.
+#   data        UTF-8 encoded keys, each followed by its pickled value.
+#   directories optional table and data in the same format, keyed by the key
+#               of each directory; the value is the sorted list of the
+#               basenames of its children. Written for info shelves so that
+#               directory listings do not require a scan of every key.
+#
+# Keys are sorted by their UTF-8 encoding, which is the same as Python's
+# ordering of the strings themselves. Version 1 files have a shorter header
+# (magic, version, entry count, data offset) and no directory table.
+################################################################################
+
+import bisect
+import fnmatch
+import functools
+import glob
+import hashlib
+import mmap
+import os
+import pickle
+import re
+import struct
+import sys
+import tempfile
+import time
+
+from collections import OrderedDict
+
+SHELF_MAGIC = b'PDSSHELF'
+SHELF_VERSION = 2
+
+SHELF_EXT = '.shelf'
+PICKLE_EXT = '.pickle'
+
+_HEADER_V1 = struct.Struct('<8sIIQ')
+_HEADER = struct.Struct('<8sIIIIQ')
+_OFFSET = struct.Struct('<QII')
+
+################################################################################
+# Path conversions
+################################################################################
+
+def shelf_path_for_pickle(pickle_path):
+    """The path to the mmap shelf file associated with a pickle shelf file."""
+
+    if pickle_path.endswith(PICKLE_EXT):
+        return pickle_path[:-len(PICKLE_EXT)] + SHELF_EXT
+
+    return pickle_path.rpartition('.')[0] + SHELF_EXT
+
+def pickle_path_for_shelf(shelf_path):
+    """The path to the pickle shelf file associated with an mmap shelf file."""
+
+    if shelf_path.endswith(SHELF_EXT):
+        return shelf_path[:-len(SHELF_EXT)] + PICKLE_EXT
+
+    return shelf_path.rpartition('.')[0] + PICKLE_EXT
+
+def is_info_shelf(path):
+    """True if this is the path to an info shelf, which gets a directory
+    table."""
+
+    return os.path.basename(path).rpartition('.')[0].endswith('_info')
+
+################################################################################
+# Writer
+################################################################################
+
+def children_by_directory(keys):
+    """Dictionary keyed by the interior path of each directory, returning the
+    sorted list of the basenames of its children. The volume itself has an
+    empty key."""
+
+    children = {}
+    for key in keys:
+        if key == '':
+            continue
+
+        (parent, _, basename) = key.rpartition('/')
+        if parent in children:
+            children[parent].append(basename)
+        else:
+            children[parent] = [basename]
+
+    for basenames in children.values():
+        basenames.sort()
+
+    return children
+
+def _pack_section(section_dict, offset):
+    """Offset table and data chunks for a dictionary whose data begins at the
+    given file offset. Also return the file offset following the data."""
+
+    encoded = [(k.encode('utf-8'), k) for k in section_dict.keys()]
+    encoded.sort()
+
+    offsets = bytearray()
+    chunks = []
+    for (key_bytes, key) in encoded:
+        value_bytes = pickle.dumps(section_dict[key],
+                                   protocol=pickle.HIGHEST_PROTOCOL)
+        offsets += _OFFSET.pack(offset, len(key_bytes), len(value_bytes))
+        chunks.append(key_bytes)
+        chunks.append(value_bytes)
+        offset += len(key_bytes) + len(value_bytes)
+
+    return (offsets, chunks, offset)
+
+def write_shelf(shelf_path, shelf_dict, directories=None):
+    """Write a dictionary to a new sorted shelf file.
+
+    If directories is True, include a table of the children of every directory
+    among the keys. If None, the table is included for info shelves only.
+
+    The file is written under a temporary name and then renamed, so processes
+    that already have the old version mapped into memory are not disturbed.
+    """
+
+    if directories is None:
+        directories = is_info_shelf(shelf_path)
+
+    count = len(shelf_dict)
+    (offsets, chunks,
+     dir_table_offset) = _pack_section(shelf_dict,
+                                       _HEADER.size + count * _OFFSET.size)
+
+    if directories:
+        dir_dict = children_by_directory(shelf_dict.keys())
+        dir_count = len(dir_dict)
+        (dir_offsets, dir_chunks,
+         _) = _pack_section(dir_dict,
+                            dir_table_offset + dir_count * _OFFSET.size)
+    else:
+        dir_count = 0
+        dir_offsets = b''
+        dir_chunks = []
+
+    temp_path = shelf_path + '.tmp%d' % os.getpid()
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(_HEADER.pack(SHELF_MAGIC, SHELF_VERSION, count, dir_count,
+                                 0, dir_table_offset))
+            f.write(offsets)
+            for chunk in chunks:
+                f.write(chunk)
+
+            f.write(dir_offsets)
+            for chunk in dir_chunks:
+                f.write(chunk)
+
+        os.replace(temp_path, shelf_path)
+
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def convert_pickle(pickle_path, shelf_path=None):
+    """Create the sorted shelf file associated with an existing pickle file.
+    Return the path to the new shelf file."""
+
+    shelf_path = shelf_path or shelf_path_for_pickle(pickle_path)
+
+    with open(pickle_path, 'rb') as f:
+        shelf_dict = pickle.load(f)
+
+    write_shelf(shelf_path, shelf_dict, is_info_shelf(pickle_path))
+    return shelf_path
+
+################################################################################
+# Readers
+################################################################################
+
+class ShelfFile(object):
+    """A read-only, dictionary-like view of a memory-mapped shelf file.
+
+    Keys are always returned in sorted order. Values are unpickled on demand.
+    """
+
+    def __init__(self, shelf_path):
+
+        self.path = shelf_path
+
+        with open(shelf_path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.mmap) < _HEADER_V1.size:
+            self.mmap.close()
+            raise IOError('Shelf file is truncated: ' + shelf_path)
+
+        (magic, version) = struct.unpack_from('<8sI', self.mmap, 0)
+        if magic != SHELF_MAGIC or version not in (1, SHELF_VERSION):
+            self.mmap.close()
+            raise IOError('Not a valid shelf file: ' + shelf_path)
+
+        if version == 1:
+            (_, _, count, _) = _HEADER_V1.unpack_from(self.mmap, 0)
+            self.table_offset = _HEADER_V1.size
+            self.dir_count = 0
+            self.dir_table_offset = 0
+        else:
+            (_, _, count, self.dir_count, _,
+             self.dir_table_offset) = _HEADER.unpack_from(self.mmap, 0)
+            self.table_offset = _HEADER.size
+
+        self.count = count
+        self.nbytes = len(self.mmap)
+        self._dir_dict = None
+
+    def close(self):
+        self.mmap.close()
+
+    def __repr__(self):
+        return 'ShelfFile("' + self.path + '")'
+
+    ############################################################################
+    # Low-level access by position
+    ############################################################################
+
+    def _key_bytes_at(self, i, table_offset=None):
+        table_offset = table_offset or self.table_offset
+        (offset, klen, _) = _OFFSET.unpack_from(self.mmap,
+                                                table_offset + i * _OFFSET.size)
+        return self.mmap[offset:offset + klen]
+
+    def _value_at(self, i, table_offset):
+        (offset, klen, vlen) = _OFFSET.unpack_from(self.mmap,
+                                                table_offset + i * _OFFSET.size)
+        return pickle.loads(self.mmap[offset + klen:offset + klen + vlen])
+
+    def _bisect_left(self, key_bytes, lo, hi, table_offset):
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes_at(mid, table_offset) < key_bytes:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def key_at(self, i):
+        """The key at the given position in sorted order."""
+
+        return self._key_bytes_at(i).decode('utf-8')
+
+    def value_at(self, i):
+        """The value at the given position in sorted order."""
+
+        return self._value_at(i, self.table_offset)
+
+    def bisect_left(self, key, lo=0, hi=None):
+        """Index where this key would be inserted to maintain sorted order."""
+
+        if hi is None:
+            hi = self.count
+
+        return self._bisect_left(key.encode('utf-8'), lo, hi,
+                                 self.table_offset)
+
+    def index(self, key):
+        """Position of the key in sorted order; raise KeyError if absent."""
+
+        i = self.bisect_left(key)
+        if i < self.count and self.key_at(i) == key:
+            return i
+
+        raise KeyError(key)
+
+    def keys_with_prefix(self, prefix):
+        """Iterator over the sorted keys beginning with this prefix."""
+
+        prefix_bytes = prefix.encode('utf-8')
+        for i in range(self.bisect_left(prefix), self.count):
+            key_bytes = self._key_bytes_at(i)
+            if not key_bytes.startswith(prefix_bytes):
+                return
+
+            yield key_bytes.decode('utf-8')
+
+    def children(self, key):
+        """Sorted list of the basenames of the children of the directory with
+        this key; empty if the key is not a directory. Use the directory table
+        if the file has one; otherwise, build the table on first use."""
+
+        if self.dir_count:
+            key_bytes = key.encode('utf-8')
+            i = self._bisect_left(key_bytes, 0, self.dir_count,
+                                  self.dir_table_offset)
+            if (i < self.dir_count and
+                self._key_bytes_at(i, self.dir_table_offset) == key_bytes):
+                return self._value_at(i, self.dir_table_offset)
+
+            return []
+
+        if self._dir_dict is None:
+            self._dir_dict = children_by_directory(self.keys())
+
+        return list(self._dir_dict.get(key, []))
+
+    ############################################################################
+    # Dictionary interface
+    ############################################################################
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        try:
+            _ = self.index(key)
+        except KeyError:
+            return False
+
+        return True
+
+    def __getitem__(self, key):
+        return self.value_at(self.index(key))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        return self.keys()
+
+    def keys(self):
+        for i in range(self.count):
+            yield self.key_at(i)
+
+    def values(self):
+        for i in range(self.count):
+            yield self.value_at(i)
+
+    def items(self):
+        for i in range(self.count):
+            yield (self.key_at(i), self.value_at(i))
+
+    def to_dict(self):
+        """The complete contents of the shelf as a dictionary."""
+
+        return dict(self.items())
+
+class DictShelf(object):
+    """A shelf loaded from a pickle file, with the same interface as ShelfFile.
+    Used when a volume's shelves have not yet been converted.
+    """
+
+    def __init__(self, shelf_dict, path=''):
+
+        self.path = path
+        self.sorted_keys = sorted(shelf_dict.keys())
+        self.dict = shelf_dict
+        self.count = len(self.sorted_keys)
+
+        # Rough estimate of the memory held by this shelf
+        self.nbytes = (sys.getsizeof(self.dict) +
+                       sys.getsizeof(self.sorted_keys))
+        for (key, value) in self.dict.items():
+            self.nbytes += sys.getsizeof(key) + _estimate_nbytes(value)
+
+        self._dir_dict = None
+
+    def close(self):
+        return
+
+    def __repr__(self):
+        return 'DictShelf("' + self.path + '")'
+
+    def key_at(self, i):
+        return self.sorted_keys[i]
+
+    def value_at(self, i):
+        return self.dict[self.sorted_keys[i]]
+
+    def bisect_left(self, key, lo=0, hi=None):
+        if hi is None:
+            hi = self.count
+
+        return bisect.bisect_left(self.sorted_keys, key, lo, hi)
+
+    def index(self, key):
+        i = self.bisect_left(key)
+        if i < self.count and self.sorted_keys[i] == key:
+            return i
+
+        raise KeyError(key)
+
+    def keys_with_prefix(self, prefix):
+        for i in range(self.bisect_left(prefix), self.count):
+            key = self.sorted_keys[i]
+            if not key.startswith(prefix):
+                return
+
+            yield key
+
+    def children(self, key):
+        if self._dir_dict is None:
+            self._dir_dict = children_by_directory(self.sorted_keys)
+
+        return list(self._dir_dict.get(key, []))
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return key in self.dict
+
+    def __getitem__(self, key):
+        return self.dict[key]
+
+    def get(self, key, default=None):
+        return self.dict.get(key, default)
+
+    def __iter__(self):
+        return iter(self.sorted_keys)
+
+    def keys(self):
+        return iter(self.sorted_keys)
+
+    def values(self):
+        return (self.dict[k] for k in self.sorted_keys)
+
+    def items(self):
+        return ((k, self.dict[k]) for k in self.sorted_keys)
+
+    def to_dict(self):
+        return self.dict.copy()
+
+def _estimate_nbytes(value, depth=2):
+    """Approximate memory size of a shelf value, including the contents of
+    tuples and lists down to the given depth."""
+
+    nbytes = sys.getsizeof(value)
+    if depth > 0 and isinstance(value, (tuple, list)):
+        for item in value:
+            nbytes += _estimate_nbytes(item, depth-1)
+
+    return nbytes
+
+def current_shelf_path(pickle_path):
+    """Path to the sorted shelf file for this pickle path if it exists and is
+    at least as new as the pickle file; otherwise, None."""
+
+    shelf_path = shelf_path_for_pickle(pickle_path)
+    try:
+        shelf_mtime_ns = os.stat(shelf_path).st_mtime_ns
+    except OSError:
+        return None
+
+    try:
+        pickle_mtime_ns = os.stat(pickle_path).st_mtime_ns
+    except OSError:
+        return shelf_path
+
+    if pickle_mtime_ns > shelf_mtime_ns:
+        return None
+
+    return shelf_path
+
+def open_shelf(pickle_path):
+    """Open the shelf associated with this pickle path. Use the sorted shelf
+    file if it exists and is not older than the pickle file; otherwise, fall
+    back to the pickle file.
+
+    Raise IOError if neither file exists or is readable.
+    """
+
+    shelf_path = current_shelf_path(pickle_path)
+    if shelf_path:
+        return ShelfFile(shelf_path)
+
+    if not os.path.exists(pickle_path):
+        raise IOError('Pickle file not found: %s' % pickle_path)
+
+    try:
+        with open(pickle_path, 'rb') as f:
+            shelf_dict = pickle.load(f)
+    except Exception as e:
+        raise IOError('Unable to open pickle file: %s' % pickle_path)
+
+    return DictShelf(shelf_dict, pickle_path)
+
+def shelf_exists(pickle_path):
+    """True if either version of this shelf file exists."""
+
+    return (os.path.exists(shelf_path_for_pickle(pickle_path)) or
+            os.path.exists(pickle_path))
+
+################################################################################
+# Glob matching over sorted keys
+################################################################################
+
+GLOB_CACHE_SIZE = 1000
+
+class GlobPattern(object):
+    """A compiled glob pattern for matching shelf keys.
+
+    A key matches if fnmatch.fnmatchcase() accepts it and it contains the same
+    number of slashes as the pattern. The slash check is needed because fnmatch
+    matches strings rather than paths, so "f*r" would otherwise match "foo/bar".
+    """
+
+    def __init__(self, pattern):
+
+        self.pattern = pattern
+
+        # Everything before the first wildcard is a literal prefix
+        wildcard_index = len(pattern)
+        for c in '?*[':
+            k = pattern.find(c)
+            if k != -1:
+                wildcard_index = min(wildcard_index, k)
+
+        self.prefix = pattern[:wildcard_index]
+        self.is_literal = (wildcard_index == len(pattern))
+        self.slashes = pattern.count('/')
+        self.regex = re.compile(fnmatch.translate(pattern))
+
+    def __repr__(self):
+        return 'GlobPattern("' + self.pattern + '")'
+
+    def matches(self, key):
+        """True if the key matches this pattern."""
+
+        return (key.count('/') == self.slashes and
+                self.regex.match(key) is not None)
+
+@functools.lru_cache(maxsize=GLOB_CACHE_SIZE)
+def compile_glob(pattern):
+    """The GlobPattern for this pattern string, cached."""
+
+    return GlobPattern(pattern)
+
+def glob_keys(shelf, patterns):
+    """Match one or more glob patterns against the keys of a shelf in a single
+    pass over the sorted keys.
+
+    Only the keys sharing the literal prefix of at least one pattern are
+    visited, and each of those keys is read once no matter how many patterns
+    share it. Return a dictionary keyed by pattern, containing the list of
+    matching keys in sorted order.
+    """
+
+    compiled = [compile_glob(p) for p in set(patterns)]
+    results = {c.pattern:[] for c in compiled}
+
+    # Literal patterns need no scan
+    for c in compiled:
+        if c.is_literal and c.pattern in shelf:
+            results[c.pattern].append(c.pattern)
+
+    # Sort the other patterns by the first key with their prefix
+    starts = [(shelf.bisect_left(c.prefix), c.pattern, c) for c in compiled
+              if not c.is_literal]
+    starts.sort()
+
+    count = len(shelf)
+    active = []         # patterns whose prefix range includes the current key
+    j = 0
+    i = starts[0][0] if starts else count
+    while i < count and (active or j < len(starts)):
+
+        # Skip over any gap between prefix ranges
+        if not active:
+            i = max(i, starts[j][0])
+            if i >= count:
+                break
+
+        # Activate each pattern whose range begins here
+        while j < len(starts) and starts[j][0] <= i:
+            active.append(starts[j][2])
+            j += 1
+
+        key = shelf.key_at(i)
+
+        # A pattern stays active while its prefix keeps matching; the keys
+        # sharing a prefix are contiguous because they are sorted.
+        still_active = []
+        for c in active:
+            if key.startswith(c.prefix):
+                still_active.append(c)
+                if c.matches(key):
+                    results[c.pattern].append(key)
+
+        active = still_active
+        i += 1
+
+    return results
+
+################################################################################
+# Cache of open shelves
+################################################################################
+
+class ShelfCache(object):
+    """A least-recently-used cache of open shelves, keyed by shelf path and
+    limited by the estimated number of bytes held in memory.
+
+    Pinned shelves are never evicted, although their bytes count against the
+    budget. All operations are O(1), except that an insertion may evict more
+    than one shelf.
+    """
+
+    def __init__(self, max_bytes, logger=None):
+        """Constructor.
+
+        Input:
+            max_bytes       byte budget for the shelves held open; None for no
+                            limit.
+            logger          PdsLogger to use, optional.
+        """
+
+        self.shelves = OrderedDict()    # shelf path -> shelf, oldest first
+        self.nbytes = {}                # shelf path -> estimated size
+        self.pinned = set()             # shelf paths never to be evicted
+        self.access_counts = {}         # shelf path -> number of lookups
+
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.logger = logger
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.shelves)
+
+    def __contains__(self, shelf_path):
+        return shelf_path in self.shelves
+
+    def keys(self):
+        return list(self.shelves.keys())
+
+    def get(self, shelf_path):
+        """The open shelf, marked as most recently used; None if it is not in
+        the cache. Hits and misses are counted."""
+
+        self.access_counts[shelf_path] = self.access_counts.get(shelf_path,
+                                                                0) + 1
+        try:
+            shelf = self.shelves[shelf_path]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.shelves.move_to_end(shelf_path)
+        self.hits += 1
+        return shelf
+
+    def __getitem__(self, shelf_path):
+        shelf = self.get(shelf_path)
+        if shelf is None:
+            raise KeyError(shelf_path)
+
+        return shelf
+
+    def set(self, shelf_path, shelf, nbytes=None):
+        """Add a shelf to the cache and evict the least recently used
+        shelves if the byte budget is exceeded."""
+
+        if nbytes is None:
+            nbytes = getattr(shelf, 'nbytes', 0)
+
+        if shelf_path in self.shelves:
+            self.remove(shelf_path)
+
+        self.shelves[shelf_path] = shelf
+        self.nbytes[shelf_path] = nbytes
+        self.total_bytes += nbytes
+
+        self._trim()
+
+    def __setitem__(self, shelf_path, shelf):
+        self.set(shelf_path, shelf)
+
+    def remove(self, shelf_path):
+        """Remove a shelf from the cache. Return False if it was not open."""
+
+        if shelf_path not in self.shelves:
+            return False
+
+        del self.shelves[shelf_path]
+        self.total_bytes -= self.nbytes.pop(shelf_path)
+        return True
+
+    def __delitem__(self, shelf_path):
+        if not self.remove(shelf_path):
+            raise KeyError(shelf_path)
+
+    def clear(self):
+        """Remove every shelf, including pinned ones. Pins are retained."""
+
+        self.shelves.clear()
+        self.nbytes.clear()
+        self.total_bytes = 0
+
+    def _trim(self):
+        """Evict least recently used, unpinned shelves until the cache is
+        within its budget."""
+
+        if self.max_bytes is None or self.total_bytes <= self.max_bytes:
+            return
+
+        skipped = []
+        while self.total_bytes > self.max_bytes and self.shelves:
+            (shelf_path, shelf) = self.shelves.popitem(last=False)
+            if shelf_path in self.pinned:
+                skipped.append((shelf_path, shelf))
+                continue
+
+            self.total_bytes -= self.nbytes.pop(shelf_path)
+            self.evictions += 1
+            if self.logger:
+                self.logger.debug('Shelf file evicted', shelf_path)
+
+        # Pinned shelves go back in their original order, as the oldest
+        for (shelf_path, shelf) in reversed(skipped):
+            self.shelves[shelf_path] = shelf
+            self.shelves.move_to_end(shelf_path, last=False)
+
+    def set_max_bytes(self, max_bytes):
+        """Change the byte budget, evicting shelves if necessary."""
+
+        self.max_bytes = max_bytes
+        self._trim()
+
+    def pin(self, shelf_path):
+        """Never evict this shelf. The shelf need not be open yet."""
+
+        self.pinned.add(shelf_path)
+
+    def unpin(self, shelf_path):
+        """Allow this shelf to be evicted again."""
+
+        self.pinned.discard(shelf_path)
+        self._trim()
+
+    def most_accessed(self, count=10):
+        """The shelf paths looked up most often, with their access counts,
+        in decreasing order. Useful for choosing which shelves to pin."""
+
+        pairs = list(self.access_counts.items())
+        pairs.sort(key=lambda x: -x[1])
+        return pairs[:count]
+
+    def stats(self):
+        """Dictionary of cache statistics."""
+
+        return {
+            'shelves'   : len(self.shelves),
+            'pinned'    : len(self.pinned),
+            'bytes'     : self.total_bytes,
+            'max_bytes' : self.max_bytes,
+            'hits'      : self.hits,
+            'misses'    : self.misses,
+            'evictions' : self.evictions,
+        }
+
+################################################################################
+# Shelf store shared by all processes on a host
+################################################################################
+
+class SharedShelfStore(object):
+    """A directory of sorted shelf files converted from pickle shelves, shared
+    by every process on the host.
+
+    The first process to need a pickle shelf converts it into the store; every
+    other process memory-maps the same file, so the operating system holds a
+    single copy of its pages. Each stored file is tagged with the modification
+    time and size of its pickle file, so a rewritten pickle file is converted
+    again and shelves opened from the old version become stale.
+    """
+
+    LOCK_TIMEOUT = 300          # seconds before an abandoned lock is ignored
+
+    def __init__(self, store_dir=None, check_interval=10., logger=None):
+        """Constructor.
+
+        Input:
+            store_dir       directory for the stored shelf files. Default is
+                            "pdsshelf" inside /dev/shm if it is available;
+                            otherwise inside the temporary directory.
+            check_interval  minimum number of seconds between checks of a
+                            pickle file's modification time.
+            logger          PdsLogger to use, optional.
+        """
+
+        if store_dir is None:
+            if os.path.isdir('/dev/shm'):
+                store_dir = '/dev/shm/pdsshelf'
+            else:
+                store_dir = os.path.join(tempfile.gettempdir(), 'pdsshelf')
+
+        self.store_dir = store_dir
+        self.check_interval = check_interval
+        self.logger = logger
+
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def _store_prefix(self, pickle_path):
+        """Path prefix shared by every version of a pickle file's stored
+        shelf."""
+
+        basename = os.path.basename(pickle_path).rpartition('.')[0]
+        digest = hashlib.md5(pickle_path.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.store_dir, basename + '_' + digest)
+
+    def store_path(self, pickle_path, stat=None):
+        """Path of the stored shelf file for the current version of a pickle
+        file."""
+
+        stat = stat or os.stat(pickle_path)
+        return (self._store_prefix(pickle_path) +
+                '_%d_%d' % (stat.st_mtime_ns, stat.st_size) + SHELF_EXT)
+
+    def open_shelf(self, pickle_path):
+        """Open the shelf associated with this pickle path, converting it into
+        the store first if necessary. A sorted shelf file beside the pickle file
+        takes precedence over the store unless the pickle file is newer.
+
+        Raise IOError if the shelf does not exist or is unreadable.
+        """
+
+        source_path = current_shelf_path(pickle_path)
+        if source_path is None:
+            source_path = pickle_path
+            shelf_path = shelf_path_for_pickle(pickle_path)
+            if self.logger and os.path.exists(shelf_path):
+                self.logger.warn('Sorted shelf file is older than pickle file',
+                                 shelf_path)
+
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            raise IOError('Pickle file not found: %s' % pickle_path)
+
+        if source_path != pickle_path:
+            shelf = ShelfFile(source_path)
+
+        else:
+            store_path = self.store_path(pickle_path, stat)
+            try:
+                shelf = ShelfFile(store_path)
+            except OSError:
+                shelf = self._populate(pickle_path, store_path)
+
+        shelf.source_path = source_path
+        shelf.source_mtime_ns = stat.st_mtime_ns
+        shelf.source_checked = time.time()
+        return shelf
+
+    def _populate(self, pickle_path, store_path):
+        """Convert a pickle file into the store and return the opened shelf.
+        If another process is converting the same file, just load the pickle
+        file locally."""
+
+        lock_path = store_path + '.lock'
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                lock_age = time.time() - os.path.getmtime(lock_path)
+            except OSError:         # lock was just released
+                lock_age = 0.
+
+            if lock_age > SharedShelfStore.LOCK_TIMEOUT:
+                os.remove(lock_path)
+                return self._populate(pickle_path, store_path)
+
+            if os.path.exists(store_path):
+                return ShelfFile(store_path)
+
+            return open_shelf(pickle_path)
+
+        try:
+            os.close(fd)
+            if self.logger:
+                self.logger.debug('Converting pickle file to shared shelf',
+                                  pickle_path)
+
+            try:
+                with open(pickle_path, 'rb') as f:
+                    shelf_dict = pickle.load(f)
+            except Exception as e:
+                raise IOError('Unable to open pickle file: %s' % pickle_path)
+
+            write_shelf(store_path, shelf_dict, is_info_shelf(pickle_path))
+
+            # Remove stored versions of older pickle files
+            for path in glob.glob(glob.escape(self._store_prefix(pickle_path))
+                                  + '_*' + SHELF_EXT):
+                if path != store_path:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+        finally:
+            os.remove(lock_path)
+
+        return ShelfFile(store_path)
+
+    def is_current(self, shelf):
+        """False if the file from which this shelf was opened has changed.
+        The file is checked at most once per check_interval."""
+
+        source_path = getattr(shelf, 'source_path', None)
+        if source_path is None:
+            return True
+
+        now = time.time()
+        if now - shelf.source_checked < self.check_interval:
+            return True
+
+        shelf.source_checked = now
+        try:
+            if os.stat(source_path).st_mtime_ns != shelf.source_mtime_ns:
+                return False
+        except OSError:
+            return False
+
+        # A sorted shelf file is superseded once its pickle file is rewritten
+        if source_path.endswith(SHELF_EXT):
+            return (current_shelf_path(pickle_path_for_shelf(source_path))
+                    is not None)
+
+        return True
+
+    def clear(self):
+        """Remove every stored shelf file."""
+
+        for path in glob.glob(os.path.join(self.store_dir, '*' + SHELF_EXT)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+################################################################################
+# Main program converts pickle files to sorted shelf files
+################################################################################
+
+if __name__ == '__main__':
+
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description='pdsshelf: Convert pickle shelf files to sorted, ' +
+                    'memory-mapped shelf files.')
+
+    parser.add_argument('pickle', nargs='+', type=str,
+                        help='Paths to pickle shelf files, or directories ' +
+                             'to search for pickle shelf files.')
+
+    args = parser.parse_args()
+
+    paths = []
+    for path in args.pickle:
+        if os.path.isdir(path):
+            for (root, dirs, files) in os.walk(path):
+                paths += [os.path.join(root, f) for f in files
+                          if f.endswith(PICKLE_EXT)]
+        else:
+            paths.append(path)
+
+    paths.sort()
+    for path in paths:
+        print(convert_pickle(path))
+
+    sys.exit(0)
@@ -0,0 +1,172 @@
+################################################################################
+# pdsstartup.py: Start-up time profile of pdsfile and the rules package.
+#
+# Usage:
+#   python pdsstartup.py [--module pdsfile] [--all] [--compile]
+#
+# Reports the import time of each module in rules/, measured in a fresh Python
+# interpreter with "python -X importtime". With --compile, it also reports the
+# time needed to compile each subclass's translators, which is deferred until
+# a translator is first used.
+################################################################################
+
+import os
+import subprocess
+import sys
+import time
+
+import translator
+
+################################################################################
+# Import times
+################################################################################
+
+def import_times(module='pdsfile', python=None):
+    """Import the given module in a new interpreter and return a list of tuples
+    (module name, self seconds, cumulative seconds) in import order."""
+
+    python = python or sys.executable
+    directory = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([python, '-X', 'importtime', '-c',
+                             'import ' + module],
+                            cwd=directory, capture_output=True, text=True)
+    if result.returncode:
+        raise IOError('Import of %s failed:\n%s' % (module, result.stderr))
+
+    times = []
+    for line in result.stderr.split('\n'):
+        if not line.startswith('import time:'):
+            continue
+
+        parts = line[len('import time:'):].split('|')
+        try:
+            self_us = int(parts[0])
+            cumulative_us = int(parts[1])
+        except ValueError:          # the header line
+            continue
+
+        times.append((parts[2].strip(), self_us * 1.e-6, cumulative_us * 1.e-6))
+
+    return times
+
+################################################################################
+# Compile times
+################################################################################
+
+def _translators(value):
+    """Generator over every TranslatorByRegex within a class attribute."""
+
+    if isinstance(value, translator.TranslatorByRegex):
+        yield value
+    elif isinstance(value, translator.TranslatorBySequence):
+        for item in value.sequence:
+            yield from _translators(item)
+    elif isinstance(value, translator.MemoTranslator):
+        yield from _translators(value.translator)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _translators(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _translators(item)
+
+def compile_times():
+    """Compile every translator of every PdsFile subclass and return a list of
+    tuples (subclass name, seconds, number of rules compiled).
+
+    Rules shared by several subclasses, such as those inherited from PdsFile,
+    are only compiled once and are charged to the first subclass that uses
+    them. The default class is always first.
+    """
+
+    import pdsfile
+
+    names = sorted(pdsfile.PdsFile.SUBCLASSES)
+    names.remove('default')
+    names = ['default'] + names
+
+    done = set()
+    times = []
+    for name in names:
+        cls = pdsfile.PdsFile.SUBCLASSES[name]
+        start = time.time()
+        count = 0
+        for attr in dir(cls):
+            if not attr.isupper():
+                continue
+
+            for trans in _translators(getattr(cls, attr)):
+                _ = trans._dispatch()
+                for rule in trans.rules:
+                    if id(rule) not in done:
+                        done.add(id(rule))
+                        _ = rule.literal
+                        _ = rule.templates
+                        count += 1
+
+        times.append((name, time.time() - start, count))
+
+    return times
+
+################################################################################
+# Main program
+################################################################################
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='pdsstartup: Report the start-up time of pdsfile and of ' +
+                    'each module in the rules package.')
+
+    parser.add_argument('--module', type=str, default='pdsfile',
+                        help='Module to import; default "pdsfile".')
+
+    parser.add_argument('--all', action='store_true',
+                        help='List the ten slowest imports outside the rules ' +
+                             'package too.')
+
+    parser.add_argument('--compile', action='store_true',
+                        help='Also report the time to compile the ' +
+                             'translators of each subclass.')
+
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    total = [t for t in times if t[0] == args.module][-1][2]
+    rules = [t for t in times if t[0].startswith('rules.')]
+    rules.sort(key=lambda t: -t[1])
+
+    print('%-32s %10s %10s' % ('rules module', 'self (ms)', 'cumul (ms)'))
+    for (name, self_sec, cumulative_sec) in rules:
+        print('%-32s %10.1f %10.1f' % (name, 1000 * self_sec,
+                                       1000 * cumulative_sec))
+
+    print('%-32s %10.1f' % ('rules modules, self', 1000 * sum([t[1] for t
+                                                              in rules])))
+
+    if args.all:
+        others = [t for t in times if not t[0].startswith('rules')
+                                  and t[0] != args.module]
+        others.sort(key=lambda t: -t[2])
+        print()
+        print('%-32s %10s %10s' % ('other module', 'self (ms)', 'cumul (ms)'))
+        for (name, self_sec, cumulative_sec) in others[:10]:
+            print('%-32s %10.1f %10.1f' % (name, 1000 * self_sec,
+                                           1000 * cumulative_sec))
+
+    print()
+    print('%-32s %10.1f' % ('import ' + args.module + ', total', 1000 * total))
+
+    if args.compile:
+        print()
+        print('%-32s %10s %10s' % ('subclass', 'rules', 'compile (ms)'))
+        compiled = compile_times()
+        for (name, seconds, count) in compiled:
+            print('%-32s %10d %10.1f' % (name, count, 1000 * seconds))
+
+        print('%-32s %10d %10.1f' % ('total', sum([t[2] for t in compiled]),
+                                     1000 * sum([t[1] for t in compiled])))
+
+    sys.exit(0)
@@ -3,7 +3,6 @@
 ################################################################################
 
 import os
-from PIL import Image
 
 import pdslogger
 
@@ -446,6 +445,8 @@ def load_icons(path, url, color='blue', logger=None):
     unused.
     """
 
+    from PIL import Image     # only needed here
+
     icon_path_ = path.rstrip('/') + '/'
     icon_url_  = url.rstrip('/') + '/'
 
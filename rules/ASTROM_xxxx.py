@@ -20,6 +20,8 @@ filespec_to_volset = translator.TranslatorByRegex([
 
 class ASTROM_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('ASTROM_xxxx', re.I, 'ASTROM_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
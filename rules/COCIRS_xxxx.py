@@ -722,6 +722,8 @@ data_set_id = translator.TranslatorByRegex([
 
 class COCIRS_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('COCIRS_[0156x]xxx', re.I, 'COCIRS_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -374,6 +374,8 @@ opus_id_to_primary_logical_path = translator.TranslatorByRegex([
 
 class COISS_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('COISS_[0123x]xxx', re.I, 'COISS_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -451,6 +451,8 @@ opus_id_to_primary_logical_path = translator.TranslatorByRegex([
 
 class CORSS_8xxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('CORSS_8xxx', re.I, 'CORSS_8xxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -37,6 +37,8 @@ info_file_basenames = translator.TranslatorByRegex([
 
 class COSP_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('COSP_xxxx', re.I, 'COSP_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
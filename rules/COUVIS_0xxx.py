@@ -229,6 +229,8 @@ opus_id_to_primary_logical_path = translator.TranslatorByRegex([
 
 class COUVIS_0xxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('COUVIS_0xxx', re.I, 'COUVIS_0xxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -209,6 +209,8 @@ opus_id_to_primary_logical_path = translator.TranslatorByRegex([
 
 class COUVIS_8xxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('COUVIS_8xxx', re.I, 'COUVIS_8xxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
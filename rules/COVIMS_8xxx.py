@@ -253,6 +253,8 @@ opus_id_to_primary_logical_path = translator.TranslatorByRegex([
 
 class COVIMS_8xxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('COVIMS_8xxx', re.I, 'COVIMS_8xxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -203,6 +203,8 @@ filespec_to_volset = translator.TranslatorByRegex([
 
 class EBROCC_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('EBROCC_xxxx', re.I, 'EBROCC_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
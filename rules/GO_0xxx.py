@@ -693,6 +693,8 @@ opus_id_to_primary_logical_path = translator.TranslatorByRegex([
 
 class GO_0xxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('GO_0xxx', re.I, 'GO_0xxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -184,6 +184,8 @@ filespec_to_volset = translator.TranslatorByRegex([
 
 class HSTxx_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('HST.x_xxxx', re.I, 'HSTxx_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -161,6 +161,8 @@ split_rules = translator.TranslatorByRegex([
 
 class JNOJIR_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('JNOJIR_xxxx', re.I, 'JNOJIR_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
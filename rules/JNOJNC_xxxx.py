@@ -104,6 +104,8 @@ neighbors = translator.TranslatorByRegex([
 
 class JNOJNC_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('JNOJNC_0xxx', re.I, 'JNOJNC_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
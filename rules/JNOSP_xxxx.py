@@ -37,6 +37,8 @@ info_file_basenames = translator.TranslatorByRegex([
 
 class JNOSP_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('JNOSP_xxxx', re.I, 'JNOSP_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
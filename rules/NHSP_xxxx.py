@@ -37,6 +37,8 @@ info_file_basenames = translator.TranslatorByRegex([
 
 class NHSP_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('NHSP_xxxx.*', re.I, 'NHSP_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
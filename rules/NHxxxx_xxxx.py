@@ -457,6 +457,8 @@ filespec_to_volset = translator.TranslatorByRegex([
 
 class NHxxxx_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('NHxx.._xxxx', re.I, 'NHxxxx_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -12,6 +12,8 @@ import re
 
 class RES_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('RES_xxxx', re.I, 'RES_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -203,6 +203,8 @@ neighbors = translator.TranslatorByRegex([
 
 class RPX_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('RPX_xxxx', re.I, 'RPX_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -38,6 +38,8 @@ filespec_to_volset = translator.TranslatorByRegex([
 
 class VGIRIS_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('VGIRIS_xxxx', re.I, 'VGIRIS_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
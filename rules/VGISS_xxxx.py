@@ -581,6 +581,8 @@ opus_id_to_primary_logical_path = translator.TranslatorByRegex([
 
 class VGISS_xxxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('VGISS_[5678x]xxx', re.I, 'VGISS_xxxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
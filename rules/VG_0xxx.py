@@ -150,6 +150,8 @@ opus_id = translator.TranslatorByRegex([
 
 class VG_0xxx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('VG_0xxx', re.I, 'VG_0xxx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -38,6 +38,8 @@ filespec_to_volset = translator.TranslatorByRegex([
 
 class VG_20xx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('VG_20xx', re.I, 'VG_20xx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -839,6 +839,8 @@ opus_id_to_primary_logical_path = translator.TranslatorByRegex([
 
 class VG_28xx(pdsfile.PdsFile):
 
+    __slots__ = ()
+
     pdsfile.PdsFile.VOLSET_TRANSLATOR = translator.TranslatorByRegex([('VG_28xx', re.I, 'VG_28xx')]) + \
                                         pdsfile.PdsFile.VOLSET_TRANSLATOR
 
@@ -0,0 +1,200 @@
+import gzip
+import os
+import sys
+import tarfile
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                os.path.abspath(__file__))), 'validation'))
+import pdsarchives
+import pdscache
+import pdschecksums
+import pdsfile
+import pdslogger
+
+################################################################################
+# Tests for ParallelGzipFile
+################################################################################
+
+# Compressible data that is not just a repeated pattern
+DATA = b''.join(b'%08d %s\n' % (k, str(k * k).encode() * (k % 7))
+                for k in range(40000))
+
+class TestParallelGzipFile:
+    def write(self, path, data, pieces=1, **kwargs):
+        gzfile = pdsarchives.ParallelGzipFile(str(path), **kwargs)
+        step = max(1, len(data) // pieces)
+        for k in range(0, len(data), step):
+            gzfile.write(data[k:k+step])
+
+        assert gzfile.tell() == len(data)
+        gzfile.close()
+        with open(path, 'rb') as f:
+            return f.read()
+
+    @pytest.mark.parametrize('data', [b'', b'x', DATA])
+    @pytest.mark.parametrize('blocksize', [1000, 65536, 1 << 20])
+    def test_round_trip(self, tmp_path, data, blocksize):
+        path = tmp_path / 'test.gz'
+        compressed = self.write(path, data, pieces=7, blocksize=blocksize,
+                                workers=3)
+        assert gzip.decompress(compressed) == data
+        with gzip.open(path, 'rb') as f:
+            assert f.read() == data
+
+        # The blocks form a single deflate stream
+        assert zlib.decompress(compressed[10:], -zlib.MAX_WBITS) == data
+
+    @pytest.mark.parametrize('blocksize', [1000, 65536])
+    def test_same_bytes_for_any_workers(self, tmp_path, blocksize):
+        results = []
+        for workers in (1, 3, 8):
+            path = tmp_path / ('test%d.gz' % workers)
+            results.append(self.write(path, DATA, pieces=13,
+                                      blocksize=blocksize, workers=workers))
+
+        assert results[0] == results[1] == results[2]
+
+        # Writes of a different size give the same bytes too
+        path = tmp_path / 'other.gz'
+        assert self.write(path, DATA, pieces=1, blocksize=blocksize,
+                          workers=8) == results[0]
+
+    def test_abort(self, tmp_path):
+        path = tmp_path / 'test.gz'
+        gzfile = pdsarchives.ParallelGzipFile(str(path), blocksize=1000,
+                                              workers=2)
+        gzfile.write(DATA)
+        gzfile.abort()
+        assert gzfile.closed
+
+        # No trailer, so the file is incomplete
+        with pytest.raises(EOFError):
+            gzip.decompress(path.read_bytes())
+
+        gzfile.close()      # does nothing after abort()
+
+################################################################################
+# Tests for validate_archive
+################################################################################
+
+FILES = ['aareadme.txt', 'data/c1.img', 'data/c1.lbl', 'data/sub/c2.img',
+         'index/index.tab']
+
+def get_logger(logname):
+    """The PdsLogger of the given name, created on first use."""
+
+    try:
+        return pdslogger.PdsLogger.get_logger(logname)
+    except KeyError:
+        return pdslogger.PdsLogger(logname)
+
+@pytest.fixture
+def pdsdir(tmp_path, monkeypatch):
+    """A small volume inside a temporary holdings tree, with its archive and
+    checksum files."""
+
+    # PdsFiles are cached by logical path, so each tree needs a new cache
+    monkeypatch.setattr(pdsfile, 'CACHE', pdscache.DictionaryCache())
+    get_logger(pdschecksums.LOGNAME)
+
+    top = tmp_path / 'holdings' / 'volumes' / 'COISS_2xxx' / 'COISS_2001'
+    for (k, path) in enumerate(FILES):
+        (top / path).parent.mkdir(parents=True, exist_ok=True)
+        (top / path).write_bytes(b'%d:%s\n' % (k, path.encode()) * (k + 1))
+
+    pdsdir = pdsfile.PdsFile.from_abspath(str(top))
+    pdsarchives.write_archive(pdsdir, logger=get_logger(pdsarchives.LOGNAME))
+    assert pdschecksums.initialize(pdsdir)
+    return pdsdir
+
+@pytest.fixture
+def errors(monkeypatch):
+    """List of (message, abspath) of the errors logged by pdsarchives."""
+
+    logger = get_logger(pdsarchives.LOGNAME)
+    errors = []
+    log = logger.log
+    def log_and_save(status, message, abspath='', force=False):
+        if status == 'error':
+            errors.append((message, abspath))
+        return log(status, message, abspath, force)
+
+    monkeypatch.setattr(logger, 'log', log_and_save)
+    return errors
+
+class TestValidateArchive:
+    def test_match(self, pdsdir, errors, monkeypatch):
+
+        # Record the number of members held after each one is read
+        held = []
+        next_member = tarfile.TarFile.next
+        def next_and_count(self):
+            member = next_member(self)
+            held.append(len(self.members))
+            return member
+
+        monkeypatch.setattr(tarfile.TarFile, 'next', next_and_count)
+        assert pdsarchives.validate_archive(pdsdir)
+        assert pdsarchives.validate_archive(pdsdir, checksums=True)
+        assert errors == []
+
+        # Members are discarded as soon as they are checked
+        assert len(held) > 2 * len(FILES)
+        assert max(held) <= 1
+
+    def test_missing_from_directory(self, pdsdir, errors):
+        abspath = os.path.join(pdsdir.abspath, 'data', 'c1.lbl')
+        os.remove(abspath)
+        assert not pdsarchives.validate_archive(pdsdir)
+        assert errors == [('Missing from directory', abspath)]
+
+    def test_missing_from_tar_file(self, pdsdir, errors):
+        abspath = os.path.join(pdsdir.abspath, 'data', 'sub', 'new.img')
+        with open(abspath, 'wb') as f:
+            f.write(b'new')
+
+        assert not pdsarchives.validate_archive(pdsdir)
+        assert errors == [('Missing from tar file', abspath)]
+
+    def test_size_mismatch(self, pdsdir, errors):
+        abspath = os.path.join(pdsdir.abspath, 'index', 'index.tab')
+        st = os.stat(abspath)
+        with open(abspath, 'ab') as f:
+            f.write(b'appended\n')
+        os.utime(abspath, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        assert not pdsarchives.validate_archive(pdsdir)
+        assert len(errors) == 1
+        assert errors[0][0].startswith('Byte count mismatch')
+        assert errors[0][1] == abspath
+
+    def test_mtime_mismatch(self, pdsdir, errors):
+        abspath = os.path.join(pdsdir.abspath, 'data', 'c1.img')
+        st = os.stat(abspath)
+        os.utime(abspath, (st.st_atime, st.st_mtime + 100))
+
+        assert not pdsarchives.validate_archive(pdsdir)
+        assert len(errors) == 1
+        assert errors[0][0].startswith('Modification time mismatch')
+        assert errors[0][1] == abspath
+
+    def test_checksums(self, pdsdir, errors):
+
+        # Alter the contents but not the size or time, and update checksums
+        abspath = os.path.join(pdsdir.abspath, 'data', 'sub', 'c2.img')
+        st = os.stat(abspath)
+        with open(abspath, 'r+b') as f:
+            data = f.read()
+            f.seek(0)
+            f.write(data.upper())
+        os.utime(abspath, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert pdschecksums.reinitialize(pdsdir)
+
+        assert pdsarchives.validate_archive(pdsdir)
+        assert errors == []
+
+        assert not pdsarchives.validate_archive(pdsdir, checksums=True)
+        assert errors == [('Checksum mismatch in tarfile', abspath)]
@@ -0,0 +1,261 @@
+import pytest
+import time
+import types
+
+import pdscache
+
+################################################################################
+# Test for the LRU and lifetime handling of DictionaryCache
+################################################################################
+
+class TestDictionaryCache:
+    def test_lru_eviction(self):
+        cache = pdscache.DictionaryCache(limit=3)
+        for key in 'abc':
+            cache.set(key, key.upper())
+
+        assert cache.get('a') == 'A'        # 'b' is now the oldest
+        cache.set('d', 'D')
+        assert 'b' not in cache
+        assert list(cache.lru.keys()) == ['c', 'a', 'd']
+
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['evictions'] == 1
+        assert stats['size'] == 3
+
+    def test_permanent_values_are_kept(self):
+        cache = pdscache.DictionaryCache(limit=2)
+        cache.set('p', 'P', lifetime=0)
+        for key in 'abcd':
+            cache.set(key, key.upper())
+
+        assert cache.get('p') == 'P'
+        assert len(cache) == 3
+        assert cache.stats()['permanent'] == 1
+        assert cache.permanent_values == {'p': 'P'}
+
+        # A permanent value can become temporary and vice versa
+        cache.set('p', 'P', lifetime=100)
+        cache.set('d', 'D', lifetime=0)
+        assert 'c' not in cache
+        assert list(cache.lru.keys()) == ['p']
+        assert cache.get('d') == 'D'
+
+    def test_expiration(self, monkeypatch):
+        now = [1000.]
+        monkeypatch.setattr(time, 'time', lambda: now[0])
+
+        cache = pdscache.DictionaryCache(lifetime=10, limit=100)
+        cache.set('a', 1)
+        cache.set('b', 2, lifetime=30)
+        cache.set('c', 3, lifetime=0)
+
+        now[0] = 1020.
+        assert cache.get('a') is None
+        assert cache.get('b') == 2
+        assert cache.stats()['expirations'] == 1
+
+        now[0] = 1040.
+        cache.set('d', 4)
+        assert 'b' not in cache
+        assert cache.get_multi(['a', 'b', 'c', 'd']) == {'c': 3, 'd': 4}
+        assert cache.stats()['misses'] == 3
+
+    def test_pause_defers_trimming(self):
+        cache = pdscache.DictionaryCache(limit=2)
+        cache.pause()
+        cache.set_multi({'a': 1, 'b': 2, 'c': 3}, lifetime=None)
+        assert len(cache) == 3
+
+        cache.resume()
+        assert len(cache) == 2
+        assert 'a' not in cache
+
+    def test_heap_stays_bounded(self):
+        cache = pdscache.DictionaryCache(limit=10)
+        for k in range(1000):
+            cache.set('key', k)
+            cache.set(str(k % 20), k)
+
+        assert len(cache) == 10
+        assert len(cache.heap) <= 2 * len(cache.lru) + cache.slop + 1
+
+        assert cache.delete('key')
+        assert not cache.delete('key')
+        with pytest.raises(KeyError):
+            del cache['key']
+
+################################################################################
+# Tests for the memcache round trips of MemcachedCache, using a fake client
+################################################################################
+
+class TooBig(Exception): pass
+
+class FakeClient(object):
+    """Stand-in for pylibmc.Client. Values are held in a dictionary shared by
+    every client, and each call to get() and get_multi() is recorded."""
+
+    store = {}
+
+    def __init__(self, servers, binary=False):
+        self.calls = []
+
+    def __contains__(self, key):
+        return key in self.store
+
+    def __getitem__(self, key):
+        return self.store[key]
+
+    def __setitem__(self, key, value):
+        self.store[key] = value
+
+    def __delitem__(self, key):
+        del self.store[key]
+
+    def get(self, key):
+        self.calls.append(('get', key))
+        return self.store.get(key)
+
+    def get_multi(self, keys):
+        self.calls.append(('get_multi', list(keys)))
+        return {k:self.store[k] for k in keys if k in self.store}
+
+    def set(self, key, value, time=0):
+        self.store[key] = value
+
+    def set_multi(self, mydict, time=0):
+        self.store.update(mydict)
+        return []
+
+    def delete(self, key):
+        return self.store.pop(key, None) is not None
+
+    def del_multi(self, keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    def flush_all(self):
+        self.store.clear()
+
+    def get_stats(self):
+        return [('fake', {'curr_items': str(len(self.store))})]
+
+@pytest.fixture
+def fake_mc(monkeypatch):
+    """Replace pylibmc with the fake client and freeze time.time(). Return the
+    list holding the current time."""
+
+    FakeClient.store = {}
+    fake_pylibmc = types.SimpleNamespace(Client=FakeClient, TooBig=TooBig,
+                                         Error=Exception)
+    monkeypatch.setattr(pdscache, 'pylibmc', fake_pylibmc, raising=False)
+
+    now = [1000.]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+class TestMemcachedCache:
+    KEYS = ['key%03d' % k for k in range(250)]
+
+    def filled_cache(self, **kwargs):
+        cache = pdscache.MemcachedCache(**kwargs)
+        cache.set_multi({k:k.upper() for k in self.KEYS}, lifetime=100)
+        cache.mc.calls.clear()
+        cache.reset_round_trips()
+        return cache
+
+    def test_get_multi_one_key_at_a_time(self, fake_mc):
+        cache = self.filled_cache()
+        assert cache.get_multi(self.KEYS + ['missing']) == \
+               {k:k.upper() for k in self.KEYS}
+
+        # By default, memcache get_multi is never used
+        ops = {call[0] for call in cache.mc.calls}
+        assert ops == {'get'}
+        assert cache.round_trip_stats()['get_multi'] == 251
+
+    @pytest.mark.parametrize('chunk', [1, 100, 250, 1000])
+    def test_get_multi_in_chunks(self, fake_mc, chunk):
+        cache = self.filled_cache(get_multi_chunk=chunk)
+        assert cache.get_multi(self.KEYS) == {k:k.upper() for k in self.KEYS}
+
+        sizes = [len(call[1]) for call in cache.mc.calls
+                 if call[0] == 'get_multi' and '$OK_PID' not in call[1]]
+        assert max(sizes) <= chunk
+        assert sum(sizes) == len(self.KEYS)
+        assert len(sizes) == cache.round_trip_stats()['get_multi']
+
+    def test_reads_trust_controls_within_interval(self, fake_mc):
+        cache = self.filled_cache(control_interval=0.5)
+        assert cache.get('key000') == 'KEY000'
+        controls = cache.round_trip_stats().get('control', 0)
+
+        # A block by another process is not seen by reads within the interval
+        FakeClient.store['$OK_PID'] = cache.pid + 1
+        fake_mc[0] += 0.4
+        assert cache.get('key001') == 'KEY001'
+        assert cache.round_trip_stats().get('control', 0) == controls
+
+        fake_mc[0] += 0.2
+        FakeClient.store['$OK_PID'] = 0
+        assert cache.get('key002') == 'KEY002'
+        assert cache.round_trip_stats().get('control', 0) > controls
+
+    @pytest.mark.parametrize('op', ['delete', 'delete_multi', 'flush'])
+    def test_writes_always_read_controls(self, fake_mc, monkeypatch, op):
+        cache = self.filled_cache(control_interval=60)
+        assert cache.get('key000') == 'KEY000'
+
+        # Another process blocks; release the block once this one waits
+        sleeps = []
+        def sleep(seconds):
+            sleeps.append(seconds)
+            FakeClient.store['$OK_PID'] = 0
+
+        monkeypatch.setattr(time, 'sleep', sleep)
+        FakeClient.store['$OK_PID'] = cache.pid + 1
+
+        if op == 'delete':
+            cache.delete('key000')
+        elif op == 'delete_multi':
+            cache.delete_multi(['key000'])
+        else:
+            cache.pause()
+            cache.set('key000', 'new')
+            cache.resume()
+
+        assert sleeps
+        assert FakeClient.store.get('key000') in (None, ('new', 100))
+
+    def test_flush_replicates_fresh_clear(self, fake_mc):
+        cache = self.filled_cache(control_interval=60)
+        assert cache.get('key000') == 'KEY000'
+
+        # Another process clears the cache; a write must notice at once
+        FakeClient.store.clear()
+        FakeClient.store.update({'$OK_PID': 0, '$CLEAR_COUNT': 1})
+        cache.pause()
+        cache.set('key000', 'stale')
+        cache.resume()
+
+        assert cache.clear_count == 1
+        assert 'key000' not in FakeClient.store
+
+    def test_prefetch_expires(self, fake_mc):
+        cache = self.filled_cache(control_interval=0.5)
+        assert cache.prefetch(['key000', 'key001', 'missing']) == 2
+        cache.mc.calls.clear()
+
+        # Within the interval, get() needs no trip to memcache
+        FakeClient.store['key000'] = ('changed', 100)
+        fake_mc[0] += 0.4
+        assert cache.get('key000') == 'KEY000'
+        assert cache.get('missing') is None
+        assert cache.mc.calls == []
+
+        # Afterward, prefetched values are discarded
+        fake_mc[0] += 0.1
+        assert cache.get('key000') == 'changed'
+        assert not cache.prefetched
+        assert ('get', 'key000') in cache.mc.calls
@@ -0,0 +1,270 @@
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                os.path.abspath(__file__))), 'validation'))
+import pdscache
+import pdsfile
+import pdslogger
+import pdschecksums
+import pdsmanifest
+
+################################################################################
+# Fixtures
+################################################################################
+
+FILES = ['aareadme.txt', 'data/c1.img', 'data/c1.lbl', 'data/c2.img',
+         'data/c2.lbl', 'data/sub/c3.img', 'index/index.tab']
+
+@pytest.fixture
+def logger():
+    """The PdsLogger of pdschecksums, created on first use."""
+
+    try:
+        return pdslogger.PdsLogger.get_logger(pdschecksums.LOGNAME)
+    except KeyError:
+        return pdslogger.PdsLogger(pdschecksums.LOGNAME)
+
+@pytest.fixture
+def pdsdir(tmp_path, monkeypatch, logger):
+    """A small volume inside a temporary holdings tree."""
+
+    # PdsFiles are cached by logical path, so each tree needs a new cache
+    monkeypatch.setattr(pdsfile, 'CACHE', pdscache.DictionaryCache())
+
+    top = tmp_path / 'holdings' / 'volumes' / 'COISS_2xxx' / 'COISS_2001'
+    for (k, path) in enumerate(FILES):
+        (top / path).parent.mkdir(parents=True, exist_ok=True)
+        (top / path).write_bytes(b'%d:%s\n' % (k, path.encode()) * (k + 1))
+
+    return pdsfile.PdsFile.from_abspath(str(top))
+
+@pytest.fixture
+def messages(logger, monkeypatch):
+    """List of (status, message, abspath) logged by pdschecksums."""
+
+    messages = []
+    log = logger.log
+    def log_and_save(status, message, abspath='', force=False):
+        messages.append((status, message, abspath))
+        return log(status, message, abspath, force)
+
+    monkeypatch.setattr(logger, 'log', log_and_save)
+    return messages
+
+def md5_pairs(dirpath):
+    """(abspath, checksum) pairs for every file, in os.walk() order."""
+
+    pairs = []
+    for (root, _, files) in os.walk(dirpath):
+        for file in files:
+            abspath = os.path.join(root, file)
+            with open(abspath, 'rb') as f:
+                pairs.append((abspath, hashlib.md5(f.read()).hexdigest()))
+
+    return pairs
+
+################################################################################
+# Tests of generate_checksums() with parallel hashing
+################################################################################
+
+class TestGenerateChecksums:
+    OPTIONS = [dict(workers=4), dict(workers=4, processes=True)]
+
+    def generate(self, pdsdir, monkeypatch, **kwargs):
+        """Pairs from generate_checksums() sequentially and with each option,
+        checking that they are the same."""
+
+        # Without a manifest cache, every call hashes the files again
+        monkeypatch.setattr(pdsmanifest, 'CACHE', None)
+
+        (baseline, _) = pdschecksums.generate_checksums(pdsdir, workers=1,
+                                                        **kwargs)
+        for options in self.OPTIONS:
+            (pairs, _) = pdschecksums.generate_checksums(pdsdir, **options,
+                                                         **kwargs)
+            assert pairs == baseline, options
+
+        return baseline
+
+    def test_full_tree(self, pdsdir, monkeypatch):
+        pairs = self.generate(pdsdir, monkeypatch)
+        assert pairs == md5_pairs(pdsdir.abspath)
+
+    def test_oldpairs(self, pdsdir, monkeypatch):
+        expected = md5_pairs(pdsdir.abspath)
+
+        # Old keys first, in their order, then new keys in os.walk() order
+        oldpairs = expected[5:] + expected[2:3]
+        pairs = self.generate(pdsdir, monkeypatch, oldpairs=oldpairs,
+                              regardless=False)
+        assert pairs == oldpairs + expected[:2] + expected[3:5]
+
+        # Old checksums are copied, not recalculated
+        oldpairs = [(abspath, 32 * 'f') for (abspath, _) in expected]
+        pairs = self.generate(pdsdir, monkeypatch, oldpairs=oldpairs,
+                              regardless=False)
+        assert pairs == oldpairs
+
+    def test_selection(self, pdsdir, monkeypatch):
+        expected = md5_pairs(pdsdir.abspath)
+        abspath = os.path.join(pdsdir.abspath, 'data', 'c2.img')
+        k = expected.index((abspath, dict(expected)[abspath]))
+
+        # A selection is recalculated regardless of its old checksum
+        oldpairs = list(expected)
+        oldpairs[k] = (abspath, 32 * 'f')
+        pairs = self.generate(pdsdir, monkeypatch, selection='c2.img',
+                              oldpairs=oldpairs, regardless=True)
+        assert pairs == expected
+
+        # ...but not otherwise
+        pairs = self.generate(pdsdir, monkeypatch, selection='c2.img',
+                              oldpairs=oldpairs, regardless=False)
+        assert pairs == oldpairs
+
+        # A new selection goes at the end
+        oldpairs = expected[:k] + expected[k+1:]
+        pairs = self.generate(pdsdir, monkeypatch, selection='c2.img',
+                              oldpairs=oldpairs, regardless=False)
+        assert pairs == oldpairs + [expected[k]]
+
+        pairs = self.generate(pdsdir, monkeypatch, selection='c2.img')
+        assert pairs == [expected[k]]
+
+    def test_write_checksums_order(self, pdsdir, monkeypatch):
+        check_path = pdsdir.checksum_path_and_lskip()[0]
+        monkeypatch.setattr(pdsmanifest, 'CACHE', None)
+
+        contents = []
+        for workers in (1, 2, 4, 8):
+            (pairs, _) = pdschecksums.generate_checksums(pdsdir,
+                                                         workers=workers)
+            pdschecksums.write_checksums(check_path, pairs)
+            with open(check_path) as f:
+                contents.append(f.read())
+
+        assert contents == len(contents) * [contents[0]]
+        assert (pdschecksums.read_checksums(check_path) ==
+                md5_pairs(pdsdir.abspath))
+
+################################################################################
+# Tests of the stat file
+################################################################################
+
+class TestStatFile:
+    def test_update_rehashes_edited_file(self, pdsdir, messages):
+        check_path = pdsdir.checksum_path_and_lskip()[0]
+        assert pdschecksums.initialize(pdsdir)
+        assert len(pdschecksums.read_stats(check_path)) == len(FILES)
+
+        # Same name, new size
+        edited = os.path.join(pdsdir.abspath, 'data', 'c2.img')
+        with open(edited, 'ab') as f:
+            f.write(b'appended\n')
+
+        # Same name and size, new modification time
+        touched = os.path.join(pdsdir.abspath, 'data', 'c1.lbl')
+        with open(touched, 'r+b') as f:
+            data = f.read()
+            f.seek(0)
+            f.write(data.upper())
+        st = os.stat(touched)
+        os.utime(touched, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+        del messages[:]
+        assert pdschecksums.update(pdsdir)
+        rehashed = [m[2] for m in messages
+                    if m[1].startswith('Modified file MD5=')]
+        assert sorted(rehashed) == [touched, edited]
+
+        pairs = pdschecksums.read_checksums(check_path)
+        assert sorted(pairs) == sorted(md5_pairs(pdsdir.abspath))
+        assert pdschecksums.validate(pdsdir)
+
+        stats = pdschecksums.read_stats(check_path)
+        assert stats[edited][:2] == (os.path.getsize(edited),
+                                     os.stat(edited).st_mtime_ns)
+        assert stats[touched][1] == os.stat(touched).st_mtime_ns
+
+    def test_trust_stat(self, pdsdir, messages):
+        assert pdschecksums.initialize(pdsdir)
+
+        del messages[:]
+        assert pdschecksums.validate(pdsdir, trust_stat=True)
+        assert not [m for m in messages if m[1].startswith('MD5=')]
+        assert ('Trusted-stat files: %d of %d' % (len(FILES), len(FILES))
+                in [m[1] for m in messages])
+
+        # Only the file with a new modification time is read
+        abspath = os.path.join(pdsdir.abspath, 'index', 'index.tab')
+        st = os.stat(abspath)
+        os.utime(abspath, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+        del messages[:]
+        assert pdschecksums.validate(pdsdir, trust_stat=True)
+        assert [m[2] for m in messages if m[1].startswith('MD5=')] == [abspath]
+        assert ('Trusted-stat files: %d of %d' % (len(FILES)-1, len(FILES))
+                in [m[1] for m in messages])
+
+    def test_stat_disagreeing_with_checksums(self, pdsdir, messages):
+        check_path = pdsdir.checksum_path_and_lskip()[0]
+        assert pdschecksums.initialize(pdsdir)
+
+        # Corrupt one MD5 in the stat file
+        abspath = os.path.join(pdsdir.abspath, 'data', 'c1.img')
+        stats = pdschecksums.read_stats(check_path)
+        stats[abspath] = stats[abspath][:3] + ('0' * 32,)
+        pdschecksums.write_stats(check_path, stats)
+
+        pairs = pdschecksums.read_checksums(check_path)
+        assert abspath not in pdschecksums.read_stats(check_path, pairs)
+        assert len(pdschecksums.read_stats(check_path, pairs)) == len(FILES)-1
+
+        # The entry is ignored, so the file is read and validates
+        del messages[:]
+        assert pdschecksums.validate(pdsdir, trust_stat=True)
+        assert [m[2] for m in messages if m[1].startswith('MD5=')] == [abspath]
+        assert not [m for m in messages if m[1] == 'Checksum mismatch']
+
+    def test_stat_file_written_after_checksums(self, pdsdir, monkeypatch):
+        check_path = pdsdir.checksum_path_and_lskip()[0]
+        assert pdschecksums.initialize(pdsdir)
+        abspath = os.path.join(pdsdir.abspath, 'data', 'c2.img')
+        with open(abspath, 'ab') as f:
+            f.write(b'appended\n')
+
+        # The stat file is written after the checksum file
+        calls = []
+        write_checksums = pdschecksums.write_checksums
+        write_stats = pdschecksums.write_stats
+        def record_checksums(*args, **kwargs):
+            calls.append('checksums')
+            return write_checksums(*args, **kwargs)
+        def record_stats(*args, **kwargs):
+            calls.append('stats')
+            return write_stats(*args, **kwargs)
+
+        monkeypatch.setattr(pdschecksums, 'write_checksums', record_checksums)
+        monkeypatch.setattr(pdschecksums, 'write_stats', record_stats)
+        assert pdschecksums.repair(pdsdir)
+        assert calls == ['checksums', 'stats']
+
+        # If writing the checksum file fails, the stat file is unchanged
+        with open(abspath, 'ab') as f:
+            f.write(b'appended again\n')
+        with open(pdschecksums.stat_path(check_path)) as f:
+            old_stats = f.read()
+
+        def fail(*args, **kwargs):
+            raise IOError('disk full')
+
+        monkeypatch.setattr(pdschecksums, 'write_checksums', fail)
+        with pytest.raises(IOError):
+            pdschecksums.update(pdsdir)
+
+        with open(pdschecksums.stat_path(check_path)) as f:
+            assert f.read() == old_stats
@@ -3,6 +3,7 @@ import os
 import pdsfile
 import pdsgroup
 import pdsgrouptable
+import pdsopusimport
 import pdsviewable
 import rules
 import pytest
@@ -1109,6 +1110,34 @@ class TestPdsFileBlackBox:
         assert isinstance(res, pdsfile.PdsFile)
         assert res.abspath == expected
 
+    @pytest.mark.parametrize(
+        'input_path',
+        [
+            'volumes/EBROCC_xxxx/EBROCC_0001/DATA/IRTF',
+            'volumes/COISS_1xxx/COISS_1001/data/1294561143_1295221348',
+        ]
+    )
+    def test_iter_opus_products(self, input_path):
+        def abspaths(products):
+            return {key: [[pdsf.abspath for pdsf in sublist]
+                          for sublist in value]
+                    for (key, value) in products.items()}
+
+        target_pdsfile = instantiate_target_pdsfile(input_path)
+        primaries = target_pdsfile.opus_primary_pdsfiles()
+        importer = pdsopusimport.OpusImporter(processes=0, batch_size=3)
+        records = list(importer.iter_products(target_pdsfile.logical_path))
+
+        assert len(primaries) > 0
+        assert len(records) == len(primaries)
+        for (pdsf, (opus_id, products)) in zip(primaries, records):
+            assert opus_id == pdsf.opus_id
+            assert abspaths(products) == abspaths(pdsf.opus_products())
+
+        stats = importer.throughput[target_pdsfile.logical_path]
+        assert stats['products'] == len(primaries)
+        assert 'error' not in stats
+
 
     ############################################################################
     # Test for associated volumes and volsets
@@ -1,5 +1,7 @@
 import os
+import pdscache
 import pdsfile
+import pickle
 import pdsviewable
 import pytest
 import re
@@ -882,6 +884,114 @@ class TestPdsFileWhiteBox:
         assert isinstance(res, pdsfile.PdsFile)
         assert res.abspath == expected
 
+    @pytest.mark.parametrize(
+        'opus_id,expected',
+        [
+            ('co-iss-n1454725799',
+             ['volumes/COISS_2xxx/COISS_2001/data/1454725799_1455008789/N1454725799_1.IMG']),
+            # Indexed, but the file no longer exists
+            ('co-iss-n1454725800', []),
+            ('co-iss-n1454725801', []),
+        ]
+    )
+    def test__opus_index_lookup(self, tmp_path, opus_id, expected):
+        holdings = str(tmp_path / 'holdings')
+        shelf_dir = os.path.join(holdings, '_infoshelf-volumes', 'COISS_2xxx')
+        os.makedirs(shelf_dir)
+        opus_path = os.path.join(shelf_dir, 'COISS_2001_opus.pickle')
+        opusdict = {'co-iss-n1454725799':
+                    ('data/1454725799_1455008789/N1454725799_1.IMG',),
+                    'co-iss-n1454725800':
+                    ('data/1454725799_1455008789/N1454725800_1.IMG',)}
+        with open(opus_path, 'wb') as f:
+            pickle.dump(opusdict, f)
+
+        # COISS_2001 is indexed; COISS_2002 is not
+        data_dir = os.path.join(holdings, 'volumes', 'COISS_2xxx', 'COISS_2001',
+                                'data', '1454725799_1455008789')
+        os.makedirs(data_dir)
+        open(os.path.join(data_dir, 'N1454725799_1.IMG'), 'w').close()
+        os.makedirs(os.path.join(holdings, 'volumes', 'COISS_2xxx',
+                                 'COISS_2002'))
+
+        pattern = (holdings + '/volumes/COISS_2xxx/COISS_2*/data/*/' +
+                   'N1454725799_*.IMG')
+        (res, unindexed) = pdsfile.PdsFile._opus_index_lookup(opus_id,
+                                                              [pattern])
+        assert res == [holdings + '/' + p for p in expected]
+        assert unindexed == [holdings + '/volumes/COISS_2xxx/COISS_2002/' +
+                             'data/*/N1454725799_*.IMG']
+
+    @pytest.mark.parametrize(
+        'input_path',
+        [
+            'volumes',
+            'volumes/COISS_2xxx/COISS_2001',
+            'volumes/COISS_2xxx/COISS_2001/data/1454725799_1455008789/N1454725799_1.IMG',
+            'previews/COISS_2xxx/COISS_2001/data/1454725799_1455008789/N1454725799_1_thumb.jpg',
+        ]
+    )
+    def test_compact_pickle(self, input_path):
+        target_pdsfile = instantiate_target_pdsfile(input_path,
+                                                    is_abspath=False)
+        _ = target_pdsfile.childnames_lc
+        res = pickle.loads(pickle.dumps(target_pdsfile))
+        assert type(res) == type(target_pdsfile)
+        assert res._attribute_dict() == target_pdsfile._attribute_dict()
+
+    @pytest.mark.parametrize('subclass', sorted(pdsfile.PdsFile.SUBCLASSES))
+    def test_slots(self, subclass):
+        cls = pdsfile.PdsFile.SUBCLASSES[subclass]
+        this = pdsfile.PdsFile().new_pdsfile(key=subclass)
+        assert type(this) == cls
+        assert not hasattr(this, '__dict__')
+        assert this._extras is None
+
+        this._lid_filled = 'urn:nasa:pds:x'
+        assert this._extras == {'_lid_filled': 'urn:nasa:pds:x'}
+        this._lid_filled = None
+        assert this._lid_filled is None
+
+    def test_split_for_cache(self, monkeypatch):
+        target_pdsfile = instantiate_target_pdsfile(
+                            'volumes/COISS_2xxx/COISS_2001/data/' +
+                            '1454725799_1455008789', is_abspath=False)
+        childnames = target_pdsfile.childnames
+        monkeypatch.setattr(pdsfile, 'CHILDNAMES_PER_CHUNK', 2)
+
+        (stub, chunks) = target_pdsfile.split_for_cache()
+        assert stub._childnames_filled is None
+        assert len(chunks) == (len(childnames) + 1) // 2
+        assert stub.join_from_cache(chunks).childnames == childnames
+
+    @pytest.mark.parametrize(
+        'key,expected',
+        [
+            ('COISS_2xxx', 'COISS_xxxx'),
+            ('VGISS_5xxx', 'VGISS_xxxx'),
+            ('XYZ_1xxx', 'PdsFile'),
+        ]
+    )
+    def test_subclass_for_key(self, key, expected):
+        cls = pdsfile.PdsFile.subclass_for_key(key)
+        assert cls.__name__ == expected
+        assert pdsfile.PdsFile._SUBCLASS_BY_KEY[0][key] is cls
+        assert pdsfile.PdsFile.subclass_for_key(key) is cls
+
+    @pytest.mark.parametrize(
+        'category,expected',
+        [
+            ('checksums-volumes', ['COISS_2001_md5.txt']),
+            ('volumes', ['COISS_2001_md5.txt', 'COISS_2001_md5_stat.txt']),
+        ]
+    )
+    def test__filter_childnames(self, category, expected):
+        abspath = PDS_HOLDINGS_DIR + '/' + category + '/COISS_2xxx'
+        childnames = ['.DS_Store', 'COISS_2001_md5.txt', '._COISS_2001_md5.txt',
+                      'COISS_2001_md5_stat.txt']
+        res = pdsfile._filter_childnames(abspath, childnames)
+        assert res == expected
+
 
 ################################################################################
 # Whitebox test for functions & properties in PdsGroup class
@@ -899,3 +1009,252 @@ class TestPdsGroupWhiteBox:
         target_pdsgroup = pdsgroup.PdsGroup(pdsfiles=pdsfiles)
         res = target_pdsgroup.parent_logical_path
         assert res == expected
+
+################################################################################
+# Whitebox test for the preload functions, using temporary holdings trees
+################################################################################
+OLD_MTIME = 1.5e9       # a fixed modification time in the past
+
+def make_holdings(holdings, volumes, categories=('volumes', 'metadata')):
+    """Create a minimal holdings tree containing the given volumes, e.g.,
+    "COISS_2xxx/COISS_2001", in each category, plus their volume info. Every
+    category and volume set directory is given the same old modification time.
+    """
+
+    os.makedirs(os.path.join(holdings, '_volinfo'), exist_ok=True)
+    volsets = sorted(set(v.split('/')[0] for v in volumes))
+    with open(os.path.join(holdings, '_volinfo', 'test.txt'), 'w') as f:
+        for key in volsets + list(volumes):
+            f.write(key + ' | Test ' + key + ' | - | 2010-01-01 | - | ' +
+                    'CO-S-ISSNA/ISSWA-2-EDR-V1.0\n')
+
+    for category in categories:
+        for volume in volumes:
+            os.makedirs(os.path.join(holdings, category, volume, 'data'),
+                        exist_ok=True)
+
+    set_old_mtimes(holdings)
+
+def set_old_mtimes(holdings):
+    """Give every category and volume set directory the old modification
+    time."""
+
+    for category in pdsfile.CATEGORY_LIST:
+        category_abspath = os.path.join(holdings, category)
+        if not os.path.isdir(category_abspath):
+            continue
+
+        for volset in os.listdir(category_abspath):
+            os.utime(os.path.join(category_abspath, volset),
+                     (OLD_MTIME, OLD_MTIME))
+
+        os.utime(category_abspath, (OLD_MTIME, OLD_MTIME))
+
+@pytest.fixture
+def preload_sandbox(monkeypatch):
+    """Let preload() run against a new local cache, without shelf files. The
+    global state of pdsfile is restored afterward."""
+
+    for name in ('DEFAULT_CACHING', 'FS_IS_CASE_INSENSITIVE'):
+        monkeypatch.setattr(pdsfile, name, getattr(pdsfile, name))
+
+    cache = pdscache.DictionaryCache(limit=pdsfile.DICTIONARY_CACHE_LIMIT)
+    monkeypatch.setattr(pdsfile, 'CACHE', cache)
+    monkeypatch.setattr(pdsfile, 'LOCAL_PRELOADED', [])
+    monkeypatch.setattr(pdsfile, 'MEMCACHE_PORT', 0)
+    monkeypatch.setattr(pdsfile, 'SHELVES_ONLY', False)
+
+class TestPreloadWhiteBox:
+    def test__scan_category(self, tmp_path, monkeypatch):
+        holdings = str(tmp_path / 'holdings')
+        make_holdings(holdings, ['COISS_2xxx/COISS_2001',
+                                 'COISS_2xxx/COISS_2002'])
+        category_abspath = holdings + '/volumes'
+        volset_abspath = category_abspath + '/COISS_2xxx'
+        for basename in ('.DS_Store', '._COISS_2001', 'AAREADME.txt'):
+            open(volset_abspath + '/' + basename, 'w').close()
+        os.utime(volset_abspath, (OLD_MTIME, OLD_MTIME))
+
+        monkeypatch.setattr(pdsfile, 'SHELVES_ONLY', False)
+        (mtimes, listings) = pdsfile._scan_category(category_abspath)
+        assert mtimes == {category_abspath: OLD_MTIME,
+                          volset_abspath: OLD_MTIME}
+        assert listings[category_abspath] == ['COISS_2xxx']
+        assert sorted(listings[volset_abspath]) == ['AAREADME.txt',
+                                                    'COISS_2001', 'COISS_2002']
+        assert listings[volset_abspath + '/COISS_2001'] is True
+        assert listings[volset_abspath + '/AAREADME.txt'] is None
+        assert volset_abspath + '/COISS_2001/data' not in listings
+
+        # Under SHELVES_ONLY, directory listings come from the shelf files
+        monkeypatch.setattr(pdsfile, 'SHELVES_ONLY', True)
+        assert pdsfile._scan_category(category_abspath) == (mtimes, {})
+
+        # A missing category is skipped
+        assert pdsfile._scan_category(holdings + '/previews') == ({}, {})
+        scans = pdsfile._scan_holdings([holdings], threads=4)
+        assert sorted(scans) == [holdings + '/metadata', holdings + '/volumes']
+
+    def test__stale_categories(self, tmp_path):
+        holdings = str(tmp_path / 'holdings')
+        make_holdings(holdings, ['COISS_2xxx/COISS_2001'])
+        scans = pdsfile._scan_holdings([holdings], threads=1)
+        cached_mtimes = {k:v[0] for (k,v) in scans.items()}
+        assert pdsfile._stale_categories(scans, cached_mtimes) == []
+
+        # Nothing cached yet
+        assert sorted(pdsfile._stale_categories(scans, {})) == \
+               [holdings + '/metadata', holdings + '/volumes']
+
+        # A new volume changes the volume set directory only
+        os.makedirs(holdings + '/volumes/COISS_2xxx/COISS_2002')
+        scans = pdsfile._scan_holdings([holdings], threads=1)
+        assert pdsfile._stale_categories(scans, cached_mtimes) == \
+               [holdings + '/volumes']
+
+        # A new volume set changes the category directory
+        os.makedirs(holdings + '/metadata/COISS_1xxx')
+        scans = pdsfile._scan_holdings([holdings], threads=1)
+        assert sorted(pdsfile._stale_categories(scans, cached_mtimes)) == \
+               [holdings + '/metadata', holdings + '/volumes']
+
+    def test_incremental_preload(self, tmp_path, preload_sandbox):
+        holdings = str(tmp_path / 'holdings')
+        make_holdings(holdings, ['COISS_2xxx/COISS_2001'])
+        pdsfile.preload(holdings, threads=2)
+
+        cache = pdsfile.CACHE
+        mtimes = cache['$PRELOAD_MTIMES']
+        assert sorted(mtimes) == [holdings + '/metadata', holdings + '/volumes']
+        assert mtimes[holdings + '/volumes'] == {
+                holdings + '/volumes': OLD_MTIME,
+                holdings + '/volumes/COISS_2xxx': OLD_MTIME}
+
+        volumes_dir = cache['volumes']
+        metadata_dir = cache['metadata']
+        assert cache['volumes/coiss_2xxx'].childnames == ['COISS_2001']
+
+        # Without a change, nothing is re-loaded
+        pdsfile.preload(holdings, incremental=True)
+        assert cache['volumes'] is volumes_dir
+
+        # Only the category with a new volume is re-loaded
+        os.makedirs(holdings + '/volumes/COISS_2xxx/COISS_2002/data')
+        pdsfile.preload(holdings, incremental=True)
+        assert cache['volumes'] is not volumes_dir
+        assert cache['metadata'] is metadata_dir
+        assert cache['volumes/coiss_2xxx'].childnames == ['COISS_2001',
+                                                          'COISS_2002']
+        assert 'volumes/coiss_2xxx/coiss_2002' in cache
+        assert cache['metadata/coiss_2xxx'].childnames == ['COISS_2001']
+
+        new_mtime = os.stat(holdings + '/volumes/COISS_2xxx').st_mtime
+        mtimes = cache['$PRELOAD_MTIMES']
+        assert mtimes[holdings + '/volumes'][holdings + '/volumes/COISS_2xxx'] \
+               == new_mtime
+        assert mtimes[holdings + '/metadata'][holdings +
+                                              '/metadata/COISS_2xxx'] \
+               == OLD_MTIME
+
+    def test_incremental_preload_extra_holdings(self, tmp_path,
+                                                preload_sandbox):
+        holdings1 = str(tmp_path / 'disk1' / 'holdings')
+        holdings2 = str(tmp_path / 'disk2' / 'holdings')
+        make_holdings(holdings1, ['COISS_2xxx/COISS_2001'])
+        make_holdings(holdings2, ['COISS_1xxx/COISS_1001'])
+        pdsfile.preload([holdings1, holdings2])
+
+        cache = pdsfile.CACHE
+        assert sorted(cache['volumes'].childnames) == ['COISS_1xxx',
+                                                       'COISS_2xxx']
+
+        # Re-loading a category of holdings1 must rebuild the merged directory
+        # from holdings2 too, although holdings2 was not requested
+        os.makedirs(holdings1 + '/volumes/COISS_2xxx/COISS_2002/data')
+        pdsfile.preload(holdings1, incremental=True)
+        assert sorted(cache['volumes'].childnames) == ['COISS_1xxx',
+                                                       'COISS_2xxx']
+        assert cache['volumes/coiss_1xxx'].childnames == ['COISS_1001']
+        assert cache['volumes/coiss_2xxx'].childnames == ['COISS_2001',
+                                                          'COISS_2002']
+        assert cache['$PRELOADED'] == [holdings1, holdings2]
+
+        # The modification times of holdings2 are kept
+        assert sorted(cache['$PRELOAD_MTIMES']) == [
+                holdings1 + '/metadata', holdings1 + '/volumes',
+                holdings2 + '/metadata', holdings2 + '/volumes']
+
+    def snapshot_mtimes(self, holdings):
+        scans = pdsfile._scan_holdings([holdings], threads=1)
+        return {abspath:mtimes for (abspath, (mtimes, _)) in scans.items()}
+
+    def test_snapshot_round_trip(self, tmp_path, monkeypatch, preload_sandbox):
+        holdings = str(tmp_path / 'holdings')
+        make_holdings(holdings, ['COISS_2xxx/COISS_2001',
+                                 'COISS_2xxx/COISS_2002'])
+        snapshot = str(tmp_path / 'snapshot.pickle')
+        pdsfile.preload(holdings, snapshot=snapshot)
+
+        with open(snapshot, 'rb') as f:
+            header = pickle.load(f)
+        mtimes = self.snapshot_mtimes(holdings)
+        assert header == pdsfile._snapshot_header([holdings], 'blue', mtimes)
+        assert not os.path.exists(snapshot + '.tmp')
+
+        # A new process fills its cache from the snapshot, without reading
+        # the volume info or building the directories again
+        def fail(*args, **kwargs):
+            raise AssertionError('holdings were read')
+
+        monkeypatch.setattr(pdsfile, '_read_volume_info', fail)
+        monkeypatch.setattr(pdsfile.PdsFile, 'new_merged_dir', fail)
+        cache = pdscache.DictionaryCache(limit=pdsfile.DICTIONARY_CACHE_LIMIT)
+        monkeypatch.setattr(pdsfile, 'CACHE', cache)
+        monkeypatch.setattr(pdsfile, 'LOCAL_PRELOADED', [])
+
+        pdsfile.preload(holdings, snapshot=snapshot)
+        assert pdsfile.LOCAL_PRELOADED == [holdings]
+        assert cache['$PRELOADED'] == [holdings]
+        assert cache['volumes'].childnames == ['COISS_2xxx']
+        assert cache['volumes/coiss_2xxx'].childnames == ['COISS_2001',
+                                                          'COISS_2002']
+        logical_path = 'volumes/COISS_2xxx/COISS_2002'
+        pdsf = pdsfile.PdsFile.from_logical_path(logical_path)
+        assert pdsf.abspath == holdings + '/volumes/COISS_2xxx/COISS_2002'
+
+    @pytest.mark.parametrize('change', ['version', 'holdings', 'icon_color',
+                                        'mtimes', 'truncated', 'missing'])
+    def test_stale_snapshot(self, tmp_path, monkeypatch, preload_sandbox,
+                            change):
+        holdings = str(tmp_path / 'holdings')
+        make_holdings(holdings, ['COISS_2xxx/COISS_2001'])
+        snapshot = str(tmp_path / 'snapshot.pickle')
+        pdsfile.preload(holdings, snapshot=snapshot)
+
+        holdings_list = [holdings]
+        icon_color = 'blue'
+        mtimes = self.snapshot_mtimes(holdings)
+        assert pdsfile._load_snapshot(snapshot, holdings_list, icon_color,
+                                      mtimes)
+
+        if change == 'version':
+            monkeypatch.setattr(pdsfile, '_SNAPSHOT_VERSION',
+                                pdsfile._SNAPSHOT_VERSION + 1)
+        elif change == 'holdings':
+            holdings_list = [holdings, str(tmp_path / 'other' / 'holdings')]
+        elif change == 'icon_color':
+            icon_color = 'red'
+        elif change == 'mtimes':
+            os.makedirs(holdings + '/metadata/COISS_2xxx/COISS_2002')
+            mtimes = self.snapshot_mtimes(holdings)
+        elif change == 'truncated':
+            with open(snapshot, 'r+b') as f:
+                f.truncate(os.path.getsize(snapshot) // 2)
+        else:
+            os.remove(snapshot)
+
+        cache = pdscache.DictionaryCache(limit=pdsfile.DICTIONARY_CACHE_LIMIT)
+        monkeypatch.setattr(pdsfile, 'CACHE', cache)
+        assert not pdsfile._load_snapshot(snapshot, holdings_list, icon_color,
+                                          mtimes)
+        assert len(cache) == 0
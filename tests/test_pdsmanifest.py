@@ -0,0 +1,90 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                os.path.abspath(__file__))), 'validation'))
+import pdsmanifest
+
+################################################################################
+# Tests of Manifest against os.walk() and os.listdir()
+################################################################################
+
+@pytest.fixture
+def tree(tmp_path):
+    """A volume directory with nested directories, links to directories inside
+    and outside of the tree, a link to a file, and broken links."""
+
+    outside = tmp_path / 'outside'
+    (outside / 'sub').mkdir(parents=True)
+    (outside / 'sub' / 'x.txt').write_text('x')
+
+    top = tmp_path / 'VOLUME_0001'
+    for subdir in ('data/a/b', 'data/c', 'index', 'empty'):
+        (top / subdir).mkdir(parents=True)
+
+    for (k, path) in enumerate(['aareadme.txt', 'data/a/one.img',
+                                'data/a/b/two.img', 'data/a/b/three.lbl',
+                                'data/c/four.img', 'index/index.tab',
+                                'index/.hidden']):
+        (top / path).write_bytes(b'z' * k)
+
+    os.symlink(str(outside), str(top / 'linked_outside'))
+    os.symlink('../a', str(top / 'data' / 'c' / 'linked_a'))
+    os.symlink('one.img', str(top / 'data' / 'a' / 'linked.img'))
+    os.symlink('nowhere', str(top / 'data' / 'broken'))
+    os.symlink('missing_dir/', str(top / 'index' / 'broken_dir'))
+    return str(top)
+
+class TestManifest:
+    def test_walk(self, tree):
+        manifest = pdsmanifest.Manifest(tree)
+        assert list(manifest.walk()) == list(os.walk(tree))
+
+        subdir = os.path.join(tree, 'data')
+        assert list(manifest.walk(subdir)) == list(os.walk(subdir))
+
+    def test_files(self, tree):
+        manifest = pdsmanifest.Manifest(tree)
+        expected = [os.path.join(root, f) for (root, _, files) in os.walk(tree)
+                                          for f in files]
+        assert manifest.files() == expected
+        assert os.path.join(tree, 'data', 'broken') in expected
+        assert os.path.join(tree, 'data', 'a', 'linked.img') in expected
+
+    def test_listdir_and_isdir(self, tree):
+        manifest = pdsmanifest.Manifest(tree)
+
+        # Include the contents of linked directories, which are not scanned
+        dirpaths = [tree, os.path.join(tree, 'linked_outside'),
+                          os.path.join(tree, 'data', 'c', 'linked_a')]
+        dirpaths += [os.path.join(root, d) for (root, dirs, _) in os.walk(tree)
+                                           for d in dirs]
+
+        count = 0
+        for dirpath in dirpaths:
+            assert manifest.listdir(dirpath) == os.listdir(dirpath)
+            assert manifest.isdir(dirpath)
+
+            for name in os.listdir(dirpath):
+                path = os.path.join(dirpath, name)
+                assert manifest.isdir(path) == os.path.isdir(path), path
+                count += 1
+
+        assert count > 20
+
+        # Broken links are files to os.walk(), but stat() fails
+        for path in (os.path.join(tree, 'data', 'broken'),
+                     os.path.join(tree, 'index', 'broken_dir')):
+            assert not manifest.isdir(path)
+            assert path not in manifest
+            with pytest.raises(OSError):
+                manifest.stat(path)
+
+    def test_stats(self, tree):
+        manifest = pdsmanifest.Manifest(tree)
+        for path in manifest.files():
+            if os.path.exists(path):
+                assert manifest.getsize(path) == os.path.getsize(path)
+                assert manifest.getmtime(path) == os.path.getmtime(path)
@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+
+import pdsfile
+import pdsopusimport
+
+################################################################################
+# Stand-in for volume PdsFiles over a small tree
+################################################################################
+
+class TreeVolume(object):
+    """Stands in for a volume PdsFile, with one OPUS product for each file in
+    the volume directory, in alphabetical order."""
+
+    def __init__(self, abspath):
+        self.abspath = abspath
+
+    def iter_opus_products(self, batch_size):
+        for basename in sorted(os.listdir(self.abspath)):
+            abspath = os.path.join(self.abspath, basename)
+            products = {('Raw Data', 10, 'raw', 'Raw Data', True): [[abspath]]}
+            opus_id = (os.path.basename(self.abspath).lower() + '-' +
+                       basename.partition('.')[0].lower())
+            yield (opus_id, products)
+
+def tree_volume_getter(holdings):
+    def from_logical_path(logical_path):
+        return TreeVolume(os.path.join(holdings, logical_path))
+
+    return from_logical_path
+
+def use_tree_volumes(holdings):
+    """Initializer for the worker processes."""
+
+    pdsfile.PdsFile.from_logical_path = staticmethod(
+                                            tree_volume_getter(holdings))
+
+@pytest.fixture
+def holdings(tmp_path, monkeypatch):
+    """A holdings tree of small volumes, used by this process and by any
+    worker process started with use_tree_volumes as its initializer."""
+
+    holdings = str(tmp_path / 'holdings')
+    for (volume, count) in [('TEST_0001', 5), ('TEST_0002', 7),
+                            ('TEST_0003', 0), ('TEST_0004', 200)]:
+        dirpath = os.path.join(holdings, 'volumes', 'TEST_0xxx', volume)
+        os.makedirs(dirpath)
+        for k in range(count):
+            with open(os.path.join(dirpath, 'F%04d.IMG' % k), 'w') as f:
+                f.write(volume)
+
+    monkeypatch.setattr(pdsfile.PdsFile, 'from_logical_path',
+                        staticmethod(tree_volume_getter(holdings)))
+    return holdings
+
+VOLUMES = ['volumes/TEST_0xxx/TEST_0001', 'volumes/TEST_0xxx/TEST_0002',
+           'volumes/TEST_0xxx/TEST_0003', 'volumes/TEST_0xxx/TEST_9999']
+
+################################################################################
+# Tests for OpusImporter
+################################################################################
+
+class TestOpusImporter:
+    def test_parallel_matches_serial(self, holdings):
+        serial = pdsopusimport.OpusImporter(processes=0)
+        expected = list(serial.iter_products(VOLUMES))
+        assert len(expected) == 12
+
+        importer = pdsopusimport.OpusImporter(processes=2, queue_size=3,
+                                              initializer=use_tree_volumes,
+                                              initargs=(holdings,))
+        records = list(importer.iter_products(VOLUMES))
+
+        # Interleaved across volumes, but in order within each volume
+        assert len(records) == len(expected)
+        for volume in VOLUMES:
+            prefix = os.path.basename(volume).lower() + '-'
+            assert ([r for r in records if r[0].startswith(prefix)] ==
+                    [r for r in expected if r[0].startswith(prefix)])
+
+        # Throughput is recorded for every volume, including failures
+        assert sorted(importer.throughput) == sorted(VOLUMES)
+        for (volume, count) in zip(VOLUMES, [5, 7, 0, 0]):
+            stats = importer.throughput[volume]
+            assert stats['products'] == count
+            assert stats['seconds'] >= 0.
+            assert ('error' in stats) == (volume == VOLUMES[3])
+            assert ('error' in stats) == ('error' in serial.throughput[volume])
+
+        assert importer.summary()[:2] == (4, 12)
+
+    def test_early_stop_terminates_workers(self, holdings):
+        importer = pdsopusimport.OpusImporter(processes=2, queue_size=2,
+                                              initializer=use_tree_volumes,
+                                              initargs=(holdings,))
+        volumes = ['volumes/TEST_0xxx/TEST_0004', 'volumes/TEST_0xxx/TEST_0001']
+        records = importer.iter_products(volumes)
+        for k in range(3):
+            _ = next(records)
+
+        # The workers are blocked on the full queue until the consumer stops
+        time.sleep(0.5)
+        assert len(multiprocessing.active_children()) == 2
+
+        records.close()
+        assert multiprocessing.active_children() == []
+        assert 'volumes/TEST_0xxx/TEST_0004' not in importer.throughput
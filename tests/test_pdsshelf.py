@@ -0,0 +1,235 @@
+import fnmatch
+import os
+import pickle
+import pytest
+
+import pdsshelf
+
+################################################################################
+# Test for sorted, memory-mapped shelf files
+################################################################################
+
+SHELF_DICT = {
+    '': (1234, 2, '2020-01-01 00:00:00.000000', '', (0,0)),
+    'DATA': (1234, 2, '2020-01-01 00:00:00.000000', '', (0,0)),
+    'DATA/C1234567_RAW.IMG': (1000, 0, '2020-01-01 00:00:00.000000',
+                              'd41d8cd98f00b204e9800998ecf8427e', (0,0)),
+    'DATA/C1234567_RAW.LBL': (234, 0, '2020-01-01 00:00:00.000000',
+                              'd41d8cd98f00b204e9800998ecf8427e', (0,0)),
+    'INDEX/INDEX.TAB': [(1, 'C1234567_RAW.IMG', 'DATA/C1234567_RAW.IMG')],
+}
+
+@pytest.fixture
+def pickle_path(tmp_path):
+    path = str(tmp_path / 'TEST_0001_info.pickle')
+    with open(path, 'wb') as f:
+        pickle.dump(SHELF_DICT, f)
+    return path
+
+class TestPdsShelf:
+    def test_fallback_to_pickle(self, pickle_path):
+        shelf = pdsshelf.open_shelf(pickle_path)
+        assert isinstance(shelf, pdsshelf.DictShelf)
+        assert list(shelf.keys()) == sorted(SHELF_DICT.keys())
+
+    def test_convert_and_lookup(self, pickle_path):
+        shelf_path = pdsshelf.convert_pickle(pickle_path)
+        assert shelf_path.endswith('_info.shelf')
+
+        shelf = pdsshelf.open_shelf(pickle_path)
+        assert isinstance(shelf, pdsshelf.ShelfFile)
+        assert len(shelf) == len(SHELF_DICT)
+        assert list(shelf.keys()) == sorted(SHELF_DICT.keys())
+        for (key, value) in SHELF_DICT.items():
+            assert key in shelf
+            assert shelf[key] == value
+
+        assert 'DATA/C7654321_RAW.IMG' not in shelf
+        with pytest.raises(KeyError):
+            _ = shelf['DATA/C7654321_RAW.IMG']
+
+    def test_pickle_newer_than_shelf(self, pickle_path):
+        shelf_path = pdsshelf.convert_pickle(pickle_path)
+        os.utime(shelf_path, ns=(0, 10000000000))
+
+        # Rewriting the pickle file supersedes the sorted shelf file
+        new_dict = {'': SHELF_DICT['']}
+        with open(pickle_path, 'wb') as f:
+            pickle.dump(new_dict, f)
+        os.utime(pickle_path, ns=(0, 20000000000))
+
+        assert pdsshelf.current_shelf_path(pickle_path) is None
+        shelf = pdsshelf.open_shelf(pickle_path)
+        assert isinstance(shelf, pdsshelf.DictShelf)
+        assert list(shelf.keys()) == ['']
+
+        # Converting again makes the sorted shelf file current
+        pdsshelf.convert_pickle(pickle_path)
+        assert pdsshelf.current_shelf_path(pickle_path) == shelf_path
+        shelf = pdsshelf.open_shelf(pickle_path)
+        assert isinstance(shelf, pdsshelf.ShelfFile)
+        assert list(shelf.keys()) == ['']
+
+    @pytest.mark.parametrize(
+        'prefix,expected',
+        [
+            ('DATA/', ['DATA/C1234567_RAW.IMG', 'DATA/C1234567_RAW.LBL']),
+            ('INDEX/', ['INDEX/INDEX.TAB']),
+            ('XXX/', []),
+        ]
+    )
+    def test_keys_with_prefix(self, pickle_path, prefix, expected):
+        pdsshelf.convert_pickle(pickle_path)
+        shelf = pdsshelf.open_shelf(pickle_path)
+        dict_shelf = pdsshelf.DictShelf(SHELF_DICT)
+        assert list(shelf.keys_with_prefix(prefix)) == expected
+        assert list(dict_shelf.keys_with_prefix(prefix)) == expected
+
+################################################################################
+# Test for the byte-budgeted LRU cache of open shelves
+################################################################################
+
+class TestShelfCache:
+    def test_lru_eviction(self):
+        cache = pdsshelf.ShelfCache(max_bytes=300)
+        cache.set('a', {}, nbytes=100)
+        cache.set('b', {}, nbytes=100)
+        cache.set('c', {}, nbytes=100)
+        assert cache.get('a') is not None       # 'b' is now the oldest
+        cache.set('d', {}, nbytes=100)
+        assert 'b' not in cache
+        assert cache.keys() == ['c', 'a', 'd']
+        assert cache.total_bytes == 300
+
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['evictions'] == 1
+
+    def test_pinned_shelves_are_kept(self):
+        cache = pdsshelf.ShelfCache(max_bytes=200)
+        cache.pin('a')
+        cache.set('a', {}, nbytes=100)
+        cache.set('b', {}, nbytes=100)
+        cache.set('c', {}, nbytes=100)
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert cache.get('x') is None
+        assert cache.stats()['misses'] == 1
+
+        cache.set_max_bytes(100)
+        assert cache.keys() == ['a']
+        cache.unpin('a')
+        cache.set_max_bytes(0)
+        assert len(cache) == 0
+
+################################################################################
+# Test for the shelf store shared across processes
+################################################################################
+
+class TestSharedShelfStore:
+    def test_populate_and_invalidate(self, pickle_path, tmp_path):
+        store = pdsshelf.SharedShelfStore(str(tmp_path / 'store'),
+                                          check_interval=0.)
+        shelf = store.open_shelf(pickle_path)
+        assert isinstance(shelf, pdsshelf.ShelfFile)
+        assert shelf.path.startswith(store.store_dir)
+        assert shelf['DATA'] == SHELF_DICT['DATA']
+        assert store.is_current(shelf)
+
+        # A second process finds the converted file already in the store
+        shelf2 = store.open_shelf(pickle_path)
+        assert shelf2.path == shelf.path
+
+        # Rewriting the pickle file invalidates the stored version
+        new_dict = {'': SHELF_DICT['']}
+        with open(pickle_path, 'wb') as f:
+            pickle.dump(new_dict, f)
+        os.utime(pickle_path, ns=(0, 12345678900))
+
+        assert not store.is_current(shelf)
+        shelf3 = store.open_shelf(pickle_path)
+        assert shelf3.path != shelf.path
+        assert list(shelf3.keys()) == ['']
+        assert not os.path.exists(shelf.path)
+
+    def test_pickle_newer_than_sorted_shelf(self, pickle_path, tmp_path):
+        store = pdsshelf.SharedShelfStore(str(tmp_path / 'store'),
+                                          check_interval=0.)
+        shelf_path = pdsshelf.convert_pickle(pickle_path)
+        os.utime(shelf_path, ns=(0, 10000000000))
+        os.utime(pickle_path, ns=(0, 10000000000))
+
+        shelf = store.open_shelf(pickle_path)
+        assert shelf.path == shelf_path
+        assert store.is_current(shelf)
+
+        # Rewriting the pickle file invalidates the sorted shelf file
+        new_dict = {'': SHELF_DICT['']}
+        with open(pickle_path, 'wb') as f:
+            pickle.dump(new_dict, f)
+        os.utime(pickle_path, ns=(0, 20000000000))
+
+        assert not store.is_current(shelf)
+        shelf2 = store.open_shelf(pickle_path)
+        assert shelf2.path.startswith(store.store_dir)
+        assert list(shelf2.keys()) == ['']
+
+################################################################################
+# Test for the directory table of info shelves
+################################################################################
+
+class TestShelfChildren:
+    @pytest.mark.parametrize(
+        'key,expected',
+        [
+            ('', ['DATA']),
+            ('DATA', ['C1234567_RAW.IMG', 'C1234567_RAW.LBL']),
+            ('DATA/C1234567_RAW.IMG', []),
+            ('MISSING', []),
+        ]
+    )
+    def test_children(self, pickle_path, key, expected):
+        assert pdsshelf.DictShelf(SHELF_DICT).children(key) == expected
+
+        shelf_path = pdsshelf.convert_pickle(pickle_path)
+        shelf = pdsshelf.ShelfFile(shelf_path)
+        assert shelf.dir_count == 3     # '', 'DATA' and 'INDEX'
+        assert shelf.children(key) == expected
+
+        pdsshelf.write_shelf(shelf_path, SHELF_DICT, directories=False)
+        shelf = pdsshelf.ShelfFile(shelf_path)
+        assert shelf.dir_count == 0
+        assert shelf.children(key) == expected
+
+################################################################################
+# Test for glob matching over sorted keys
+################################################################################
+
+class TestGlobKeys:
+    @pytest.mark.parametrize(
+        'pattern,expected',
+        [
+            ('DATA/*', ['DATA/C1234567_RAW.IMG', 'DATA/C1234567_RAW.LBL']),
+            ('DATA/*.LBL', ['DATA/C1234567_RAW.LBL']),
+            ('D*', ['DATA']),                   # no match across slashes
+            ('*/*.TAB', ['INDEX/INDEX.TAB']),
+            ('DATA/C[0-9]*_RAW.IM?', ['DATA/C1234567_RAW.IMG']),
+            ('INDEX/INDEX.TAB', ['INDEX/INDEX.TAB']),
+            ('INDEX/MISSING.TAB', []),
+        ]
+    )
+    def test_glob_keys(self, pickle_path, pattern, expected):
+        shelf = pdsshelf.open_shelf(pdsshelf.convert_pickle(pickle_path))
+        assert pdsshelf.glob_keys(shelf, [pattern]) == {pattern: expected}
+
+    def test_glob_keys_batch(self, pickle_path):
+        shelf = pdsshelf.open_shelf(pickle_path)
+        patterns = ['DATA/*.IMG', 'DATA/*', 'D*', '*', '*/*.TAB', 'X*']
+        results = pdsshelf.glob_keys(shelf, patterns)
+        for pattern in patterns:
+            assert results[pattern] == pdsshelf.glob_keys(shelf,
+                                                          [pattern])[pattern]
+            expected = [k for k in sorted(SHELF_DICT)
+                        if fnmatch.fnmatchcase(k, pattern) and
+                           k.count('/') == pattern.count('/')]
+            assert results[pattern] == expected
@@ -0,0 +1,163 @@
+import pickle
+import pytest
+import re
+
+import translator
+
+################################################################################
+# Test for the dispatch table of TranslatorByRegex
+################################################################################
+
+TUPLES = [
+    (r'volumes/COISS_2xxx/.*\.IMG',         0,    'coiss2_img'),
+    (r'.*/COISS_.*/data/.*',                0,    'coiss_data'),
+    (r'volumes/(CO|GO)VIMS_.*',             0,    'vims'),
+    (r'.*\.lbl',                            re.I, 'label'),
+    (r'(volumes|previews)/COISS_2xxx/.*',   0,    'coiss2'),
+    (r'.*',                                 0,    'anything'),
+]
+
+class TestTranslatorByRegex:
+    @pytest.mark.parametrize(
+        'pattern,expected',
+        [
+            (r'volumes/.*/data/.*/N[0-9_]+\.IMG', 'volumes/'),
+            (r'.*/(COISS_[12]xxx.*/COISS_....)/extras', '/COISS_'),
+            (r'documents/COISS_0xxx.*', 'documents/COISS_0xxx'),
+            (r'(volumes|previews)/COISS_2xxx', '/COISS_2xxx'),
+            (r'(?i:volumes)/.*', '/'),
+            (r'.*', ''),
+        ]
+    )
+    def test_required_literal(self, pattern, expected):
+        regex = re.compile('^' + pattern + '$')
+        assert translator.TranslatorByRegex._required_literal(regex) == expected
+
+    @pytest.mark.parametrize(
+        'path',
+        [
+            'volumes/COISS_2xxx/COISS_2001/data/1454725799_1455008789/N1454725799_1.IMG',
+            'volumes/COISS_2xxx/COISS_2001/data/1454725799_1455008789/N1454725799_1.LBL',
+            'previews/COISS_2xxx/COISS_2001/data/1454725799_1455008789',
+            'volumes/COVIMS_0xxx/COVIMS_0001/data/v1294638283_1.lbl',
+            'VOLUMES/COVIMS_0XXX/COVIMS_0001/DATA/V1294638283_1.LBL',
+            'metadata/GO_0xxx',
+        ]
+    )
+    def test_priority(self, path):
+        def matches(strings):
+            values = []
+            for (pattern, flags, value) in TUPLES:
+                for string in strings:
+                    if (re.match('^' + pattern + '$', string, flags=flags) and
+                        value not in values):
+                        values.append(value)
+            return values
+
+        trans = translator.TranslatorByRegex(TUPLES)
+        expected = matches([path])
+        assert trans.all(path) == expected
+        assert trans.first(path) == expected[0]
+
+        strings = ['metadata/GO_0xxx/GO_0999/GO_0999_index.lbl', path]
+        assert trans.all(strings) == matches(strings)
+        assert trans.first(strings) == matches(strings)[0]
+
+################################################################################
+# Test for MemoTranslator
+################################################################################
+
+class TestMemoTranslator:
+    def test_hits_and_eviction(self):
+        memo = translator.MemoTranslator(translator.TranslatorByRegex(TUPLES),
+                                         maxsize=2)
+        assert memo.first('volumes/GOVIMS_0xxx') == 'vims'
+        assert memo.first('volumes/GOVIMS_0xxx') == 'vims'
+        assert memo.all('a.LBL') == ['label', 'anything']
+
+        results = memo.all('a.LBL')
+        results.append('modified')
+        assert memo.all('a.LBL') == ['label', 'anything']
+
+        stats = memo.stats()
+        assert stats['hits'] == 3
+        assert stats['misses'] == 2
+
+        memo.first('x')
+        memo.first('y')
+        assert memo.stats()['evictions'] == 1
+        assert memo.first('volumes/GOVIMS_0xxx') == 'vims'
+        assert memo.stats()['misses'] == 5
+
+    def test_new_rules_are_not_cached(self):
+        memo = translator.MemoTranslator(translator.TranslatorByRegex(TUPLES))
+        assert memo.first('metadata/GO_0xxx') == 'anything'
+
+        extra = translator.TranslatorByRegex([(r'metadata/.*', 0, 'meta')])
+        for combined in (memo.prepend(extra), extra + memo):
+            assert combined.first('metadata/GO_0xxx') == 'meta'
+
+        combined = memo + extra
+        assert isinstance(combined, translator.MemoTranslator)
+        assert combined.stats()['size'] == 0
+        assert combined.first('metadata/GO_0xxx') == 'anything'
+
+################################################################################
+# Test for compiled replacement templates
+################################################################################
+
+class TestReplacementTemplate:
+    @pytest.mark.parametrize(
+        'template,path,expected',
+        [
+            (r'\1/\g<2>_x', 'volumes/COISS_2001', 'volumes/COISS_2001_x'),
+            (r'co-iss-#LOWER#\2', 'volumes/N1454725799', 'co-iss-n1454725799'),
+            (r'#UPPER#\1#MIXED#/\2', 'volumes/abc', 'VOLUMES/abc'),
+            (r'a#b\1', 'x/y', 'a#bx'),
+            (r'ring {"A": "alpha", "B": "beta"}["\2"]', 'x/B', 'ring beta'),
+            (r'#LOWER#{"A": "alpha", "B": "beta"}["\2"]', 'x/B', 'beta'),
+            (r'{1: "one", 2: "two"}[\2] km', 'x/2', 'two km'),
+            (r'#\1#\2', 'UPPER/abc', 'ABC'),          # directive from a group
+            (r'\1-\2', 'a#b/{c}', 'a#b-{c}'),         # special characters
+        ]
+    )
+    def test_expand(self, template, path, expected):
+        regex = re.compile(r'^(.*)/(.*)$')
+        compiled = translator.ReplacementTemplate(template, regex)
+        assert compiled.program is not None
+        assert compiled.expand(regex.match(path)) == expected
+
+    def test_invalid_template(self):
+        regex = re.compile(r'^(.*)/(.*)$')
+        compiled = translator.ReplacementTemplate(r'\3', regex)
+        assert compiled.program is None
+        with pytest.raises(re.error):
+            compiled.expand(regex.match('a/b'))
+
+################################################################################
+# Test for deferred compilation of TranslatorByRegex rules
+################################################################################
+
+class TestDeferredCompilation:
+    def test_rules_are_shared(self):
+        first = translator.TranslatorByRegex(TUPLES[:3])
+        second = translator.TranslatorByRegex(TUPLES[3:])
+        for rule in first.rules + second.rules:
+            assert rule._regex is None
+            assert rule._templates is None
+
+        combined = first + second
+        assert combined.rules == first.rules + second.rules
+
+        assert combined.first('volumes/COISS_2xxx/a.IMG') == 'coiss2_img'
+        assert first.rules[0]._templates is not None
+        assert first.first('volumes/COISS_2xxx/a.IMG') == 'coiss2_img'
+
+    def test_pickle(self):
+        trans = translator.TranslatorByRegex([(r'a(.*)', 0, r'b\1'),
+                                              (r'x', 'y')])
+        assert trans.first('abc') == 'bbc'
+
+        copied = pickle.loads(pickle.dumps(trans))
+        assert copied.first('abc') == 'bbc'
+        assert copied.all('x') == ['y']
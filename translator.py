@@ -6,9 +6,16 @@
 # dictionaries and regular expression/substitution pairs.
 ################################################################################
 
+import ast
+import collections
 import os
 import re
 
+try:
+    import re._parser as sre_parse          # Python 3.11 and later
+except ImportError:                         # pragma: no cover
+    import sre_parse
+
 class Translator(object):
     """Abstract class to define translators from a set of strings (such as file
     paths) to associated information.
@@ -310,24 +317,27 @@ class TranslatorByRegex(Translator):
     applied to a value and the modified value is returned.
 
     The value can be a string, a list of strings, or a tuple of strings.
+
+    Regular expressions and replacement strings are compiled on first use.
+    Translators combined by prepend() or append() share the compiled entries
+    of the originals.
     """
 
     TAG = 'REGEX'
 
     def __init__(self, tuples):
 
-        # Compile regular expressions (if not already compiled)
-        compiled_tuples = []
-        for items in tuples:
-            if len(items) == 2:
-                if isinstance(items[0], str):
-                    items = (re.compile('^' + items[0] + '$'), items[1])
-                compiled_tuples.append(items)
-            else:
-                regex = re.compile('^' + items[0] + '$', flags=items[1])
-                compiled_tuples.append((regex, items[2]))
+        self.rules = [items if isinstance(items, _RegexRule)
+                      else _RegexRule(*items) for items in tuples]
+
+        # The dispatch table is built on first use; see _dispatch()
+        self._dispatch_table = None
 
-        self.tuples = compiled_tuples
+    @property
+    def tuples(self):
+        """The list of (compiled regular expression, value) tuples."""
+
+        return [(rule.regex, rule.value) for rule in self.rules]
 
     def all(self, strings, strings_first=False):
         """Apply a translator to one or more strings, returning every unique
@@ -343,21 +353,18 @@ class TranslatorByRegex(Translator):
         # Two options for priority...
         if strings_first:                       # Try each string in order
             for string in strings:
-                for (regex, replacement) in self.tuples:
-                    expanded = TranslatorByRegex.expand(regex, string,
-                                                               replacement)
+                for k in self._candidates(string):
+                    expanded = self._expand(k, string)
                     for item in expanded:
                         if item not in results:
                             results.append(item)
 
         else:                                   # Try each regex in order
-            for (regex, replacement) in self.tuples:
-                for string in strings:
-                    expanded = TranslatorByRegex.expand(regex, string,
-                                                               replacement)
-                    for item in expanded:
-                        if item not in results:
-                            results.append(item)
+            for (k, string) in self._candidates_by_regex(strings):
+                expanded = self._expand(k, string)
+                for item in expanded:
+                    if item not in results:
+                        results.append(item)
 
         return results
 
@@ -373,64 +380,153 @@ class TranslatorByRegex(Translator):
 
         if strings_first:                       # Try each string in order
             for string in strings:
-                for (regex, replacement) in self.tuples:
-                    expanded = TranslatorByRegex.expand(regex, string,
-                                                               replacement)
+                for k in self._candidates(string):
+                    expanded = self._expand(k, string)
                     if expanded:
                         return expanded[0]
 
         else:                                   # Try each regex in order
-            for (regex, replacement) in self.tuples:
-                for string in strings:
-                    expanded = TranslatorByRegex.expand(regex, string,
-                                                               replacement)
-                    if expanded:
-                        return expanded[0]
+            for (k, string) in self._candidates_by_regex(strings):
+                expanded = self._expand(k, string)
+                if expanded:
+                    return expanded[0]
 
         return None
 
-    @staticmethod
-    def expand(regex, string, replacements):
-        """Handle substitutions in the cases where the replacement is a list, a
-        string, or a tuple containing strings."""
+    ############################################################################
+    # Dispatch table
+    #
+    # Most regular expressions in a rule table can only match strings that
+    # contain a particular literal substring, such as a volume set ID or a
+    # directory name. Each regex is filed under the longest literal that every
+    # match must contain; a string is only tested against the regexes whose
+    # literal it contains, plus the regexes with no required literal. Candidates
+    # are returned in their original order, so priority is unchanged.
+    ############################################################################
+
+    def _dispatch(self):
+        """The dispatch table, a tuple (always, keyed), where always is a bit
+        mask of the regexes that must always be tested, and keyed is a list of
+        tuples (literal, ignorecase, bit mask of regexes)."""
+
+        # Translators unpickled from an older version lack the attribute
+        dispatch_table = getattr(self, '_dispatch_table', None)
+        if dispatch_table is not None:
+            return dispatch_table
+
+        always = 0
+        masks = {}
+        for (k, rule) in enumerate(self.rules):
+            literal = rule.literal
+            if not literal:
+                always |= 1 << k
+                continue
+
+            # Non-ASCII literals can match ASCII text when ignoring case
+            ignorecase = bool(rule.regex.flags & re.IGNORECASE)
+            if ignorecase:
+                if not literal.isascii():
+                    always |= 1 << k
+                    continue
+
+                literal = literal.lower()
+
+            key = (literal, ignorecase)
+            masks[key] = masks.get(key, 0) | (1 << k)
+
+        keyed = [(literal, ignorecase, mask)
+                 for ((literal, ignorecase), mask) in masks.items()]
+
+        self._dispatch_table = (always, keyed)
+        return self._dispatch_table
+
+    def _candidate_mask(self, string):
+        """Bit mask of the regexes that could match this string."""
+
+        (mask, keyed) = self._dispatch()
+
+        # Case-insensitive literals are only reliable for ASCII strings, because
+        # some non-ASCII characters match ASCII letters when ignoring case
+        lower = string.lower() if string.isascii() else None
+
+        for (literal, ignorecase, regex_mask) in keyed:
+            if ignorecase:
+                if lower is None or literal in lower:
+                    mask |= regex_mask
+            elif literal in string:
+                mask |= regex_mask
+
+        return mask
+
+    def _candidates(self, string):
+        """Generator over the indices of the regexes that could match this
+        string, in order."""
+
+        mask = self._candidate_mask(string)
+        while mask:
+            low_bit = mask & -mask
+            yield low_bit.bit_length() - 1
+            mask ^= low_bit
+
+    def _candidates_by_regex(self, strings):
+        """Generator over (index, string) for every regex that could match one
+        of these strings, in order of regex and then of string."""
+
+        if len(strings) == 1:
+            string = strings[0]
+            for k in self._candidates(string):
+                yield (k, string)
+            return
+
+        string_masks = [(self._candidate_mask(s), s) for s in strings]
+        mask = 0
+        for (string_mask, _) in string_masks:
+            mask |= string_mask
+
+        while mask:
+            low_bit = mask & -mask
+            k = low_bit.bit_length() - 1
+            for (string_mask, string) in string_masks:
+                if string_mask & low_bit:
+                    yield (k, string)
+            mask ^= low_bit
 
-        def _fix_case(string):
-            # Change text following "#UPPER#" to upper case
-            # Change text following "#LOWER#" to lower case
-            # Stop changing case of text following "#MIXED#"
+    @staticmethod
+    def _required_literal(regex):
+        """The longest literal substring that every match of this compiled
+        regular expression must contain; an empty string if there is none."""
 
-            parts = string.split('#')
+        try:
+            parsed = sre_parse.parse(regex.pattern, regex.flags)
+        except Exception:           # pragma: no cover
+            return ''
 
-            newparts = []
-            change = 'MIXED'
-            literal_hash = False
-            for part in parts:
-                if part in ('LOWER', 'UPPER', 'MIXED'):
-                    change = part
-                    literal_hash = False
-                else:
-                    if change == 'UPPER':
-                        part = part.upper()
-                    elif change == 'LOWER':
-                        part = part.lower()
+        runs = []
+        current = []
 
-                    if literal_hash:
-                        newparts.append('#')
+        def _walk(items):
+            for (op, av) in items:
+                if op is sre_parse.LITERAL:
+                    current.append(chr(av))
 
-                    newparts.append(part)
-                    literal_hash = True
+                # A group without local flags is matched exactly once
+                elif op is sre_parse.SUBPATTERN and not any(av[1:-1]):
+                    _walk(av[-1])
 
-            return ''.join(newparts)
+                # Anything else ends the current run of literals
+                else:
+                    runs.append(''.join(current))
+                    del current[:]
 
-        def _evaluate_dict(string):
-            # Evaluate an in-line dictionary expression
+        _walk(parsed)
+        runs.append(''.join(current))
 
-            dicts = re.findall(r'{.*?}\[.*?\]', string)
-            for d in dicts:
-                value = eval(d)
-                string = string.replace(d, value)
+        return max(runs, key=len)
 
-            return string
+    @staticmethod
+    def expand(regex, string, replacements):
+        """Handle substitutions in the cases where the replacement is a list, a
+        string, or a tuple containing strings."""
 
         matchobj = regex.match(string)
         if matchobj is None: return []
@@ -443,20 +539,15 @@ class TranslatorByRegex(Translator):
 
             # If replacement is a string, apply substitution
             if isinstance(replacement, str):
-                result = matchobj.expand(replacement)
-                result = _fix_case(result)
-                result = _evaluate_dict(result)
-                results.append(result)
+                results.append(_expand_template(matchobj, replacement))
 
             # Deal with a tuple
             elif isinstance(replacement, tuple):
                 items = []
                 for item in replacement:
                     if isinstance(item, str):
-                        result = matchobj.expand(item)
-                        result = _fix_case(result)
-                        result = _evaluate_dict(result)
-                        items.append(matchobj.expand(result))
+                        items.append(_expand_template(matchobj, item,
+                                                      twice=True))
                     else:
                         items.append(item)
 
@@ -468,15 +559,36 @@ class TranslatorByRegex(Translator):
 
         return results
 
+    def _expand(self, k, string):
+        """Apply the k-th regex to a string and return the list of expanded
+        replacements, using the templates compiled for that regex."""
+
+        rule = self.rules[k]
+        matchobj = rule.regex.match(string)
+        if matchobj is None: return []
+
+        results = []
+        for (kind, replacement) in rule.templates:
+            if kind is _STRING:
+                results.append(replacement.expand(matchobj))
+            elif kind is _TUPLE:
+                results.append(tuple([item.expand(matchobj)
+                                      if isinstance(item, ReplacementTemplate)
+                                      else item for item in replacement]))
+            else:
+                results.append(replacement)
+
+        return results
+
     def keys(self):
         """Return all of the keys."""
 
-        return [t[0] for t in self.tuples]
+        return [rule.regex for rule in self.rules]
 
     def values(self):
         """Return all of the values in the same order as keys()."""
 
-        return [t[1] for t in self.tuples]
+        return [rule.value for rule in self.rules]
 
     def prepend(self, translator):
         """Return a new translator with the given translator in front of this
@@ -485,7 +597,7 @@ class TranslatorByRegex(Translator):
         if translator.TAG == 'NULL': return translator
 
         if translator.TAG == self.TAG:
-            return TranslatorByRegex(translator.tuples + self.tuples)
+            return TranslatorByRegex(translator.rules + self.rules)
 
         if translator.TAG == 'SEQUENCE':
             return translator.append(self)
@@ -498,13 +610,602 @@ class TranslatorByRegex(Translator):
         if translator.TAG == 'NULL': return translator
 
         if translator.TAG == self.TAG:
-            return TranslatorByRegex(self.tuples + translator.tuples)
+            return TranslatorByRegex(self.rules + translator.rules)
 
         if translator.TAG == 'SEQUENCE':
             return translator.prepend(self)
 
         return TranslatorBySequence([self, translator])
 
+class _RegexRule(object):
+    """One entry of a TranslatorByRegex. The regular expression, the required
+    literal used by the dispatch table, and the replacement templates are each
+    computed on first use."""
+
+    __slots__ = ('pattern', 'flags', 'value', '_regex', '_literal',
+                 '_templates')
+
+    def __init__(self, *items):
+        """Constructor.
+
+        Input:
+            items       (regular expression, value) or (regular expression,
+                        flags, value). The regular expression is a string or
+                        a compiled pattern; a string must match the entire
+                        string being translated.
+        """
+
+        if len(items) == 2:
+            (pattern, value) = items
+            flags = 0
+        else:
+            (pattern, flags, value) = items
+
+        self.pattern = pattern
+        self.flags = flags
+        self.value = value
+
+        self._regex = None if isinstance(pattern, str) else pattern
+        self._literal = None
+        self._templates = None
+
+    def __getstate__(self):
+        """Pickle only the definition; everything else is rebuilt on use."""
+
+        return (self.pattern, self.flags, self.value)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @property
+    def regex(self):
+        """The compiled regular expression."""
+
+        if self._regex is None:
+            self._regex = re.compile('^' + self.pattern + '$', flags=self.flags)
+
+        return self._regex
+
+    @property
+    def literal(self):
+        """The longest literal substring that every match must contain."""
+
+        if self._literal is None:
+            self._literal = TranslatorByRegex._required_literal(self.regex)
+
+        return self._literal
+
+    @property
+    def templates(self):
+        """The list of (kind, compiled replacement) pairs for this value."""
+
+        if self._templates is not None:
+            return self._templates
+
+        replacements = self.value
+        if not isinstance(replacements, list):
+            replacements = [replacements]
+
+        regex = self.regex
+        templates = []
+        for replacement in replacements:
+            if isinstance(replacement, str):
+                templates.append((_STRING,
+                                  ReplacementTemplate(replacement, regex)))
+            elif isinstance(replacement, tuple):
+                items = []
+                for item in replacement:
+                    if isinstance(item, str):
+                        item = ReplacementTemplate(item, regex, twice=True)
+                    items.append(item)
+                templates.append((_TUPLE, items))
+            else:
+                templates.append((_OTHER, replacement))
+
+        self._templates = templates
+        return templates
+
+################################################################################
+# Replacement templates
+################################################################################
+
+# Kinds of compiled replacement, used by TranslatorByRegex._expand()
+_STRING = 'STRING'
+_TUPLE  = 'TUPLE'
+_OTHER  = 'OTHER'
+
+CASE_DIRECTIVES = ('LOWER', 'UPPER', 'MIXED')
+
+# Inline dictionary expressions, e.g., '{"A": "alpha", "B": "beta"}["\1"]'
+_DICT_REGEX = re.compile(r'{.*?}\[.*?\]')
+
+# Characters in substituted text that could change how a template is parsed
+_SPECIAL_CHARS = re.compile('[#{}\\[\\]\\\\\'"\n]')
+
+def _fix_case(string):
+    """Change text following "#UPPER#" to upper case, text following "#LOWER#"
+    to lower case, and stop changing the case of text following "#MIXED#"."""
+
+    parts = string.split('#')
+
+    newparts = []
+    change = 'MIXED'
+    literal_hash = False
+    for part in parts:
+        if part in CASE_DIRECTIVES:
+            change = part
+            literal_hash = False
+        else:
+            if change == 'UPPER':
+                part = part.upper()
+            elif change == 'LOWER':
+                part = part.lower()
+
+            if literal_hash:
+                newparts.append('#')
+
+            newparts.append(part)
+            literal_hash = True
+
+    return ''.join(newparts)
+
+def _evaluate_dict_expr(expression):
+    """Evaluate an in-line dictionary expression "{...}[...]" containing only
+    literals."""
+
+    (dict_text, _, key_text) = expression[:-1].partition('}[')
+    return ast.literal_eval(dict_text + '}')[ast.literal_eval(key_text)]
+
+def _evaluate_dicts(string):
+    """Replace every in-line dictionary expression by its value."""
+
+    for expression in _DICT_REGEX.findall(string):
+        string = string.replace(expression, _evaluate_dict_expr(expression))
+
+    return string
+
+def _expand_template(matchobj, template, twice=False):
+    """Expand a replacement string for a match by substituting groups, then
+    changing case, then evaluating in-line dictionaries. If twice is True,
+    groups are substituted again at the end."""
+
+    result = matchobj.expand(template)
+    result = _fix_case(result)
+    result = _evaluate_dicts(result)
+    if twice:
+        result = matchobj.expand(result)
+
+    return result
+
+def _change_case(string, mode):
+    if mode == 'UPPER':
+        return string.upper()
+    if mode == 'LOWER':
+        return string.lower()
+    return string
+
+class _NotCompiled(Exception):
+    pass
+
+class ReplacementTemplate(object):
+    """A replacement string for a TranslatorByRegex, compiled once for repeated
+    use.
+
+    Group references, case directives ("#UPPER#", "#LOWER#" and "#MIXED#") and
+    in-line dictionary expressions such as '{"A": "alpha"}["\1"]' are resolved
+    when the template is compiled, so expand() only needs to join the literal
+    text with the matched groups and look up dictionary keys.
+
+    A template that cannot be compiled, or a match whose groups contain text
+    that would change how the template is interpreted (such as "#" or "{"),
+    falls back on expanding the string step by step. The result is the same
+    either way.
+    """
+
+    def __init__(self, template, regex, twice=False):
+        """Constructor.
+
+        Input:
+            template    the replacement string.
+            regex       the compiled regular expression it is used with.
+            twice       True to repeat the group substitution at the end, as
+                        is done for the strings inside a tuple.
+        """
+
+        self.template = template
+        self.twice = twice
+
+        self.program = None         # List of str, (group, mode), or _DictLookup
+        self.groups = []            # Group indices used in the program
+        self.checks = []            # (literal length, [group, ...]) for tokens
+                                    # that must not become case directives
+        try:
+            self._compile(regex)
+        except _NotCompiled:
+            self.program = None
+
+    def expand(self, matchobj):
+        """The expanded replacement string for this match."""
+
+        if self.program is None:
+            return _expand_template(matchobj, self.template, self.twice)
+
+        values = {}
+        for group in self.groups:
+            value = matchobj.group(group)
+            values[group] = '' if value is None else value
+
+        # Make sure the substituted text doesn't alter the template
+        if values:
+            joined = ''.join(values.values())
+            if not joined.isascii() or _SPECIAL_CHARS.search(joined):
+                return _expand_template(matchobj, self.template, self.twice)
+
+            for (lcount, token_groups) in self.checks:
+                if lcount + sum([len(values[g]) for g in token_groups]) == 5:
+                    return _expand_template(matchobj, self.template, self.twice)
+
+        parts = []
+        for item in self.program:
+            if type(item) == str:
+                parts.append(item)
+            elif type(item) == tuple:
+                parts.append(_change_case(values[item[0]], item[1]))
+            else:
+                parts.append(item.lookup(values))
+
+        return ''.join(parts)
+
+    ############################################################################
+    # Compiler
+    ############################################################################
+
+    def _compile(self, regex):
+        """Fill in the program, or raise _NotCompiled."""
+
+        segments = ReplacementTemplate._parse(self.template, regex)
+
+        # Split into tokens at each "#"
+        tokens = [[]]
+        for segment in segments:
+            if isinstance(segment, str):
+                pieces = segment.split('#')
+                if pieces[0]:
+                    tokens[-1].append(pieces[0])
+                for piece in pieces[1:]:
+                    tokens.append([piece] if piece else [])
+            else:
+                tokens[-1].append(segment)
+
+        # Interpret the case directives; the result is a list of atoms, each a
+        # single character or a tuple (group, mode)
+        atoms = []
+        mode = 'MIXED'
+        literal_hash = False
+        for token in tokens:
+            token_groups = [s for s in token if not isinstance(s, str)]
+            if not token_groups:
+                text = ''.join(token)
+                if text in CASE_DIRECTIVES:
+                    mode = text
+                    literal_hash = False
+                    continue
+
+            # A token containing groups could turn out to be a case directive,
+            # in which case expand() falls back on the step-by-step expansion.
+            # This is only possible if the token is five characters long.
+            else:
+                lcount = sum([len(s) for s in token if isinstance(s, str)])
+                self.checks.append((lcount, token_groups))
+
+            if literal_hash:
+                atoms.append('#')
+
+            for segment in token:
+                if isinstance(segment, str):
+                    if mode != 'MIXED' and not segment.isascii():
+                        raise _NotCompiled()
+                    atoms += list(_change_case(segment, mode))
+                else:
+                    atoms.append((segment, mode))
+
+            literal_hash = True
+
+        # Locate the in-line dictionaries using a string in which each group is
+        # replaced by a placeholder. Groups never contain braces, brackets or
+        # newlines, so the matches are the same as for the expanded string.
+        shape = ''.join([a if isinstance(a, str) else '\0' for a in atoms])
+        if '\0' in self.template:
+            raise _NotCompiled()
+
+        program_atoms = []
+        start = 0
+        for match in _DICT_REGEX.finditer(shape):
+            program_atoms += atoms[start:match.start()]
+            program_atoms.append(_DictLookup(shape[match.start():match.end()],
+                                             atoms[match.start():match.end()]))
+            start = match.end()
+
+        program_atoms += atoms[start:]
+
+        # Merge the characters into strings
+        program = []
+        for atom in program_atoms:
+            if isinstance(atom, str) and program and \
+               isinstance(program[-1], str):
+                program[-1] += atom
+            else:
+                program.append(atom)
+
+        self.program = program
+        self.groups = sorted(set([s for s in segments
+                                    if not isinstance(s, str)]))
+        self.checks = [c for c in self.checks if c[0] <= 5]
+
+        # Note that a second substitution, if requested, has no effect because
+        # the result cannot contain a backslash
+
+    @staticmethod
+    def _parse(template, regex):
+        """Split a template into a list of literal strings and group indices.
+        Raise _NotCompiled for anything other than group references, such as a
+        character escape."""
+
+        segments = []
+        literal = []
+        i = 0
+        n = len(template)
+        while i < n:
+            c = template[i]
+            if c != '\\':
+                literal.append(c)
+                i += 1
+                continue
+
+            following = template[i+1:i+2]
+            if following == 'g':
+                end = template.find('>', i)
+                if template[i+2:i+3] != '<' or end < 0:
+                    raise _NotCompiled()
+
+                name = template[i+3:end]
+                if name.isdecimal() and name.isascii():
+                    group = int(name)
+                elif name in regex.groupindex:
+                    group = regex.groupindex[name]
+                else:
+                    raise _NotCompiled()
+
+                i = end + 1
+
+            elif following and following in '123456789':
+                digits = template[i+1:i+4]
+                if len(digits) == 3 and all([d in '01234567' for d in digits]):
+                    raise _NotCompiled()    # octal escape
+
+                if template[i+2:i+3] and template[i+2] in '0123456789':
+                    group = int(template[i+1:i+3])
+                    i += 3
+                else:
+                    group = int(following)
+                    i += 2
+
+            else:
+                raise _NotCompiled()
+
+            if group > regex.groups:
+                raise _NotCompiled()
+
+            if literal:
+                segments.append(''.join(literal))
+                literal = []
+
+            segments.append(group)
+
+        if literal:
+            segments.append(''.join(literal))
+
+        return segments
+
+class _DictLookup(object):
+    """An in-line dictionary expression within a ReplacementTemplate."""
+
+    def __init__(self, shape, atoms):
+
+        # Separate the dictionary from the key; the dictionary must be constant
+        split = shape.index('}[') + 1
+        dict_atoms = atoms[:split]
+        key_atoms = atoms[split+1:-1]
+
+        if not all([isinstance(a, str) for a in dict_atoms]):
+            raise _NotCompiled()
+
+        dict_text = ''.join(dict_atoms)
+        try:
+            self.dict = ast.literal_eval(dict_text)
+        except (ValueError, SyntaxError):
+            raise _NotCompiled()
+
+        if not isinstance(self.dict, dict):
+            raise _NotCompiled()
+
+        for value in self.dict.values():
+            if not isinstance(value, str) or '\\' in value:
+                raise _NotCompiled()
+
+        # A key that is a quoted string of groups and literals becomes a plain
+        # concatenation; anything else is evaluated as a literal
+        self.quoted = (len(key_atoms) >= 2 and
+                       key_atoms[0] == key_atoms[-1] and
+                       key_atoms[0] in ('"', "'"))
+        if self.quoted:
+            key_atoms = key_atoms[1:-1]
+            if any([a in ('"', "'", '\\') for a in key_atoms]):
+                raise _NotCompiled()
+
+        self.key_atoms = []
+        for atom in key_atoms:
+            if isinstance(atom, str) and self.key_atoms and \
+               isinstance(self.key_atoms[-1], str):
+                self.key_atoms[-1] += atom
+            else:
+                self.key_atoms.append(atom)
+
+        # A constant key is looked up now
+        self.value = None
+        if all([isinstance(a, str) for a in self.key_atoms]):
+            try:
+                self.value = self.dict[self._key({})]
+            except (KeyError, ValueError, SyntaxError):
+                raise _NotCompiled()
+
+    def _key(self, values):
+        parts = []
+        for atom in self.key_atoms:
+            if isinstance(atom, str):
+                parts.append(atom)
+            else:
+                parts.append(_change_case(values[atom[0]], atom[1]))
+
+        key = ''.join(parts)
+        if self.quoted:
+            return key
+
+        if key.isdecimal() and (len(key) == 1 or key[0] != '0'):
+            return int(key)
+
+        return ast.literal_eval(key)
+
+    def lookup(self, values):
+        """The value of this dictionary expression given the group values."""
+
+        if self.value is not None:
+            return self.value
+
+        return self.dict[self._key(values)]
+
+################################################################################
+################################################################################
+
+class MemoTranslator(Translator):
+    """Translator that remembers the results of another translator.
+
+    The results of first() and all() are saved in least-recently-used caches of
+    up to maxsize entries each, keyed by the strings and the strings_first
+    option. Because a translator never changes after construction, the cache
+    never needs to be cleared; prepend(), append() and "+" return a new
+    MemoTranslator with an empty cache around the new translator.
+    """
+
+    TAG = 'MEMO'
+
+    def __init__(self, translator, maxsize=1000):
+
+        assert isinstance(translator, Translator)
+
+        # Don't stack caches
+        if isinstance(translator, MemoTranslator):
+            translator = translator.translator
+
+        self.translator = translator
+        self.maxsize = maxsize
+
+        self.first_cache = collections.OrderedDict()
+        self.all_cache = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, cache, method, strings, strings_first):
+        """Internal method to return a cached result or else to evaluate it."""
+
+        key = (strings if isinstance(strings, str) else tuple(strings),
+               strings_first)
+
+        try:
+            result = cache[key]
+            cache.move_to_end(key)
+            self.hits += 1
+            return result
+        except KeyError:
+            pass
+
+        self.misses += 1
+        result = method(strings, strings_first)
+
+        cache[key] = result
+        while len(cache) > self.maxsize:
+            cache.popitem(last=False)
+            self.evictions += 1
+
+        return result
+
+    def all(self, strings, strings_first=False):
+        """Apply a translator to one or more strings, returning every unique
+        result in priority order."""
+
+        # Return a copy so the caller cannot modify the cached list
+        return list(self._lookup(self.all_cache, self.translator.all,
+                                 strings, strings_first))
+
+    def first(self, strings, strings_first=False):
+        """Apply a translator to one or more strings, returning the first
+        result. Return None if no translation is found."""
+
+        return self._lookup(self.first_cache, self.translator.first,
+                            strings, strings_first)
+
+    def keys(self):
+        """Return all of the keys."""
+
+        return self.translator.keys()
+
+    def values(self):
+        """Return all of the values in the same order as keys()."""
+
+        return self.translator.values()
+
+    def prepend(self, translator):
+        """Return a new translator with the given translator in front of this
+        one."""
+
+        if isinstance(translator, MemoTranslator):
+            translator = translator.translator
+
+        return MemoTranslator(self.translator.prepend(translator), self.maxsize)
+
+    def append(self, translator):
+        """Return a new translator with the given translator after this one.
+        """
+
+        if isinstance(translator, MemoTranslator):
+            translator = translator.translator
+
+        return MemoTranslator(self.translator.append(translator), self.maxsize)
+
+    def clear(self):
+        """Empty the cache and reset the statistics."""
+
+        self.first_cache.clear()
+        self.all_cache.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """Dictionary of cache statistics."""
+
+        requests = self.hits + self.misses
+        return {
+            'hits'     : self.hits,
+            'misses'   : self.misses,
+            'evictions': self.evictions,
+            'hit_rate' : self.hits / requests if requests else 0.,
+            'size'     : len(self.first_cache) + len(self.all_cache),
+            'maxsize'  : self.maxsize,
+        }
+
 ################################################################################
 ################################################################################
 
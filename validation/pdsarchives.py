@@ -10,16 +10,132 @@
 
 import sys
 import os
+import collections
+import concurrent.futures
+import struct
 import tarfile
+import time
 import zlib
 import argparse
 
 import pdslogger
 import pdsfile
+import pdschecksums
+import pdsmanifest
 
 LOGNAME = 'pds.validation.archives'
 LOGROOT_ENV = 'PDS_LOG_ROOT'
 
+# Number of blocks compressed at once, the uncompressed size of each block,
+# and the compression level used by write_archive()
+WORKERS = min(8, os.cpu_count() or 1)
+GZIP_BLOCKSIZE = 1024 * 1024
+GZIP_LEVEL = 9
+
+################################################################################
+# Parallel gzip writer
+################################################################################
+
+def _deflate_block(block, level, zdict, last):
+    """Compress one block as part of a raw deflate stream. The preceding 32 KiB
+    of data, if any, are used as the dictionary, so the compression ratio is
+    nearly the same as for a single stream."""
+
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                      zlib.DEF_MEM_LEVEL,
+                                      zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    # A sync flush ends the block on a byte boundary without ending the stream,
+    # so the next block can simply be appended
+    mode = zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+    return compressor.compress(block) + compressor.flush(mode)
+
+class ParallelGzipFile(object):
+    """A write-only file object that writes a standard gzip file. The data is
+    compressed in independent blocks by a pool of threads. The output only
+    depends on the data written, the level and the block size, so identical
+    inputs give identical files.
+    """
+
+    def __init__(self, path, level=GZIP_LEVEL, blocksize=GZIP_BLOCKSIZE,
+                       workers=None):
+
+        self.level = level
+        self.blocksize = blocksize
+        self.workers = workers or WORKERS
+
+        self.fileobj = open(path, 'wb')
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.workers)
+        self.pending = collections.deque()  # futures for compressed blocks
+        self.buffer = bytearray()
+        self.zdict = b''
+        self.crc = 0
+        self.size = 0       # uncompressed bytes written
+        self.closed = False
+
+        # Header with no file name and a zero timestamp, for reproducibility
+        self.fileobj.write(struct.pack('<BBBBIBB', 0x1f, 0x8b, 8, 0, 0,
+                                       2 if level == 9 else 0, 255))
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self.buffer += data
+
+        while len(self.buffer) >= self.blocksize:
+            block = bytes(self.buffer[:self.blocksize])
+            del self.buffer[:self.blocksize]
+            self._submit(block, last=False)
+
+        return len(data)
+
+    def tell(self):
+        return self.size
+
+    def _submit(self, block, last):
+        self.pending.append(self.executor.submit(_deflate_block, block,
+                                                 self.level, self.zdict, last))
+        self.zdict = block[-32768:]
+
+        # Limit the number of blocks held in memory
+        while len(self.pending) > 2 * self.workers:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            self._submit(bytes(self.buffer), last=True)
+            self.buffer = bytearray()
+            while self.pending:
+                self.fileobj.write(self.pending.popleft().result())
+
+            self.fileobj.write(struct.pack('<II', self.crc & 0xffffffff,
+                                                  self.size & 0xffffffff))
+        finally:
+            self.executor.shutdown()
+            self.fileobj.close()
+            self.closed = True
+
+    def abort(self):
+        """Close the file after an error, without writing the rest of the data
+        or the gzip trailer. The file left behind is incomplete."""
+
+        if self.closed:
+            return
+
+        for future in self.pending:
+            future.cancel()
+
+        self.pending.clear()
+        self.executor.shutdown()
+        self.fileobj.close()
+        self.closed = True
+
 ################################################################################
 # General tarfile functions
 ################################################################################
@@ -39,7 +155,8 @@ def load_directory_info(pdsdir, limits={'normal':100}, logger=None):
         (tarpath, lskip) = pdsdir.archive_path_and_lskip()
 
         tuples = [(dirpath, dirpath[lskip:], 0, 0)]
-        for (path, dirs, files) in os.walk(dirpath):
+        manifest = pdsmanifest.get_manifest(dirpath)
+        for (path, dirs, files) in manifest.walk():
 
             # Load files
             for file in files:
@@ -56,8 +173,9 @@ def load_directory_info(pdsdir, limits={'normal':100}, logger=None):
                 if '/.' in abspath:             # flag invisible files
                     logger.invisible('Invisible file', abspath)
 
-                nbytes = os.path.getsize(abspath)
-                modtime = os.path.getmtime(abspath)
+                st = manifest.stat(abspath)
+                nbytes = st.st_size
+                modtime = st.st_mtime
                 logger.normal('File info generated', abspath)
 
                 tuples.append((abspath, abspath[lskip:], nbytes, modtime))
@@ -138,8 +256,13 @@ def read_archive_info(tarpath, limits={'normal':100}, logger=None):
 ################################################################################
 
 def write_archive(pdsdir, clobber=True, archive_invisibles=True,
-                           limits={'normal':-1, 'dot_':100}, logger=None):
-    """Write an archive file containing all the files in the directory."""
+                           limits={'normal':-1, 'dot_':100}, logger=None,
+                           workers=None):
+    """Write an archive file containing all the files in the directory.
+
+    The file is compressed by a ParallelGzipFile using the given number of
+    workers.
+    """
 
     def archive_filter(member):
         """Internal function to filter filenames"""
@@ -190,11 +313,31 @@ def write_archive(pdsdir, clobber=True, archive_invisibles=True,
             logger.error('Archive file already exists', tarpath)
             return
 
-        f = tarfile.open(tarpath, mode='w:gz')
-        f.add(dirpath, arcname=dirpath[lskip:], recursive=True,
-                      filter=archive_filter)
+        # Write to a temporary file; replace the archive only on success
+        start = time.time()
+        temp_path = tarpath + '.tmp%d' % os.getpid()
+        gzfile = ParallelGzipFile(temp_path, workers=workers)
+        try:
+            f = tarfile.open(fileobj=gzfile, mode='w')
+            f.add(dirpath, arcname=dirpath[lskip:], recursive=True,
+                          filter=archive_filter)
+            f.close()
+            gzfile.close()
+            os.replace(temp_path, tarpath)
+
+        finally:
+            gzfile.abort()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
         logger.normal('Written', tarpath)
-        f.close()
+
+        seconds = max(time.time() - start, 1.e-6)
+        logger.info('Archive throughput: %.1f MB/s ' %
+                    (gzfile.size / seconds / 1.e6) +
+                    '(%d bytes compressed to %d in %.1f s, %d workers)' %
+                    (gzfile.size, os.path.getsize(tarpath), seconds,
+                     gzfile.workers), tarpath, force=True)
 
     except (Exception, KeyboardInterrupt) as e:
         logger.exception(e)
@@ -205,6 +348,30 @@ def write_archive(pdsdir, clobber=True, archive_invisibles=True,
 
 ################################################################################
 
+def compare_info(abspath, dir_info, tar_info, logger):
+    """Compare the tuple (dirpath, nbytes, modtime) of one file in the
+    directory with that of the same file in the tarfile. Return True if they
+    agree."""
+
+    if dir_info == tar_info:
+        logger.normal('Validated', dir_info[0])
+        return True
+
+    valid = True
+    if dir_info[1] != tar_info[1]:
+        logger.error('Byte count mismatch: ' +
+                     '%d (filesystem) vs. %d (tarfile)' %
+                     (dir_info[1], tar_info[1]), abspath)
+        valid = False
+
+    if abs(dir_info[2] - tar_info[2]) > 1:
+        logger.error('Modification time mismatch: ' +
+                     '%s (filesystem) vs. %s (tarfile)' %
+                     (dir_info[2], tar_info[2]), abspath)
+        valid = False
+
+    return valid
+
 def validate_tuples(dir_tuples, tar_tuples, limits={'normal':100}, logger=None):
     """Validate the directory list of tuples against the list from the tarfile.
     """
@@ -223,24 +390,9 @@ def validate_tuples(dir_tuples, tar_tuples, limits={'normal':100}, logger=None):
                 logger.error('Missing from tar file', abspath)
                 valid = False
 
-            elif (dirpath, nbytes, modtime) != tardict[abspath]:
-
-                if nbytes != tardict[abspath][1]:
-                    logger.error('Byte count mismatch: ' +
-                                 '%d (filesystem) vs. %d (tarfile)' %
-                                 (nbytes, tardict[abspath][1]), abspath)
-                    valid = False
-
-                if abs(modtime - tardict[abspath][2]) > 1:
-                    logger.error('Modification time mismatch: ' +
-                                 '%s (filesystem) vs. %s (tarfile)' %
-                                 (modtime, tardict[abspath][2]), abspath)
-                    valid = False
-
-                del tardict[abspath]
-
             else:
-                logger.normal('Validated', dirpath)
+                valid &= compare_info(abspath, (dirpath, nbytes, modtime),
+                                      tardict[abspath], logger)
                 del tardict[abspath]
 
         keys = list(tardict.keys())
@@ -256,34 +408,119 @@ def validate_tuples(dir_tuples, tar_tuples, limits={'normal':100}, logger=None):
     finally:
         logger.close()
 
-################################################################################
-# Simplified functions to perform tasks
-################################################################################
+    return valid
 
-def initialize(pdsdir, logger=None):
-    write_archive(pdsdir, clobber=False, logger=logger)
-    return True
+def validate_archive(pdsdir, checksums=False, limits={'normal':100},
+                     logger=None):
+    """Validate a directory against its .tar.gz archive in a single pass
+    through the archive.
 
-def reinitialize(pdsdir, logger=None):
-    write_archive(pdsdir, clobber=True, logger=logger)
-    return True
+    Each member is compared with an index of the directory as soon as it is
+    read and is then discarded, so the archive's member list is never held in
+    memory. The directory index still holds an entry for every file, so memory
+    use grows with the number of files, not with the size of the archive.
 
-def validate(pdsdir, logger=None):
+    If checksums is True, the contents of each archived file are also compared
+    with the checksum file of the directory, during the same pass.
+    """
+
+    dirpath = pdsdir.abspath
+
+    logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+    logger.replace_root(pdsdir.root_)
 
     dir_tuples = load_directory_info(pdsdir, logger=logger)
+    dirdict = {}
+    for (abspath, dirpath_, nbytes, modtime) in dir_tuples:
+        dirdict[abspath] = (dirpath_, nbytes, modtime)
+    del dir_tuples
+
+    if checksums:
+        checkdict = pdschecksums.checksum_dict(dirpath, logger=logger)
 
     tarpath = pdsdir.archive_path_and_lskip()[0]
-    tar_tuples = read_archive_info(tarpath, logger=logger)
+    pdstar = pdsfile.PdsFile.from_abspath(tarpath)
+    prefix = pdstar.dirpath_and_prefix_for_archive()[1]
+
+    logger.open('Validating archive file', tarpath, limits=limits)
+
+    valid = True
+    try:
+        # Stream mode reads the archive once, front to back
+        with tarfile.open(tarpath, 'r|gz') as f:
+            for member in f:
+                abspath = os.path.join(prefix, member.name)
+
+                if abspath.endswith('/.DS_Store'):  # skip .DS_Store files
+                    logger.error('.DS_Store in tarfile', abspath)
+
+                if '/._' in abspath:                # skip dot-underscore files
+                    logger.error('._* file in tarfile', abspath)
 
-    return validate_tuples(dir_tuples, tar_tuples, logger=logger)
+                if '/.' in abspath:                 # flag invisible files
+                    logger.invisible('Invisible file found', abspath)
 
-def repair(pdsdir, logger=None):
+                if member.isdir():
+                    tar_info = (member.name, 0, 0)
+                else:
+                    tar_info = (member.name, member.size, member.mtime)
+
+                if abspath not in dirdict:
+                    logger.error('Missing from directory', abspath)
+                    valid = False
+                else:
+                    valid &= compare_info(abspath, dirdict[abspath], tar_info,
+                                          logger)
+                    del dirdict[abspath]
+
+                if checksums and member.isreg():
+                    md5 = pdschecksums.hashstream(f.extractfile(member))
+                    if abspath not in checkdict:
+                        logger.error('Missing entry in checksum file',
+                                     abspath)
+                        valid = False
+                    elif md5 != checkdict[abspath]:
+                        logger.error('Checksum mismatch in tarfile', abspath)
+                        valid = False
+
+                # Members already checked are not needed again
+                f.members = []
+
+        for abspath in sorted(dirdict.keys()):
+            logger.error('Missing from tar file', abspath)
+            valid = False
+
+    except (zlib.error, Exception, KeyboardInterrupt) as e:
+        logger.exception(e)
+        raise
+
+    finally:
+        _ = logger.close()
+
+    return valid
+
+################################################################################
+# Simplified functions to perform tasks
+################################################################################
+
+def initialize(pdsdir, logger=None, workers=None):
+    write_archive(pdsdir, clobber=False, logger=logger, workers=workers)
+    return True
+
+def reinitialize(pdsdir, logger=None, workers=None):
+    write_archive(pdsdir, clobber=True, logger=logger, workers=workers)
+    return True
+
+def validate(pdsdir, logger=None, checksums=False):
+    return validate_archive(pdsdir, checksums=checksums, logger=logger)
+
+def repair(pdsdir, logger=None, workers=None):
 
     tarpath = pdsdir.archive_path_and_lskip()[0]
     if not os.path.exists(tarpath):
         logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
         logger.warn('Archive file does not exist; initializing', tarpath)
-        initialize(pdsdir, logger=logger)
+        initialize(pdsdir, logger=logger, workers=workers)
         return True
 
     tar_tuples = read_archive_info(tarpath, logger=logger)
@@ -301,10 +538,10 @@ def repair(pdsdir, logger=None):
     # Overwrite tar file if necessary
     logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
     logger.info('Discrepancies found; writing new file', tarpath)
-    write_archive(pdsdir, clobber=True, logger=logger)
+    write_archive(pdsdir, clobber=True, logger=logger, workers=workers)
     return True
 
-def update(pdsdir, logger=None):
+def update(pdsdir, logger=None, workers=None):
 
     tarpath = pdsdir.archive_path_and_lskip()[0]
 
@@ -314,7 +551,7 @@ def update(pdsdir, logger=None):
         return False
 
     # Write tar file if necessary
-    write_archive(pdsdir, clobber=True, logger=logger)
+    write_archive(pdsdir, clobber=True, logger=logger, workers=workers)
     return True
 
 ################################################################################
@@ -344,7 +581,7 @@ if __name__ == '__main__':
                              'contents of its .tar.gz archive. Files match '   +
                              'if they have identical byte counts and '         +
                              'modification dates; file contents are not '      +
-                             'compared.')
+                             'compared unless --checksums is specified.')
 
     parser.add_argument('--repair', const='repair',
                         default='', action='store_const', dest='task',
@@ -378,6 +615,15 @@ if __name__ == '__main__':
     parser.add_argument('--quiet', '-q', action='store_true',
                         help='Do not also log to the terminal.')
 
+    parser.add_argument('--workers', '-w', type=int, default=WORKERS,
+                        help='Number of threads used to compress an archive; ' +
+                             'default %d.' % WORKERS)
+
+    parser.add_argument('--checksums', '-c', action='store_true',
+                        help='With --validate, also compare the contents of '  +
+                             'each archived file with its MD5 checksum in the '+
+                             'checksum file of the volume.')
+
     # Parse and validate the command line
     args = parser.parse_args()
 
@@ -473,19 +719,19 @@ if __name__ == '__main__':
                     logger.info('Log file', logfile)
 
                 if args.task == 'initialize':
-                    proceed = initialize(pdsdir)
+                    proceed = initialize(pdsdir, workers=args.workers)
 
                 elif args.task == 'reinitialize':
-                    proceed = reinitialize(pdsdir)
+                    proceed = reinitialize(pdsdir, workers=args.workers)
 
                 elif args.task == 'validate':
-                    proceed = validate(pdsdir)
+                    proceed = validate(pdsdir, checksums=args.checksums)
 
                 elif args.task == 'repair':
-                    proceed = repair(pdsdir)
+                    proceed = repair(pdsdir, workers=args.workers)
 
                 else:       # update
-                    proceed = update(pdsdir)
+                    proceed = update(pdsdir, workers=args.workers)
 
             except (Exception, KeyboardInterrupt) as e:
                 logger.exception(e)
@@ -9,6 +9,7 @@
 ################################################################################
 
 import argparse
+import concurrent.futures
 import datetime
 import glob
 import hashlib
@@ -18,6 +19,7 @@ import sys
 
 import pdslogger
 import pdsfile
+import pdsmanifest
 
 # Holds log file directories temporarily, used by move_old_checksums()
 LOGDIRS = []
@@ -25,24 +27,64 @@ LOGDIRS = []
 LOGNAME = 'pds.validation.checksums'
 LOGROOT_ENV = 'PDS_LOG_ROOT'
 
+# Default number of files hashed at once, and the size of each read. hashlib
+# releases the GIL while it digests a large buffer, so threads are enough to
+# keep several cores busy.
+WORKERS = min(8, os.cpu_count() or 1)
+BLOCKSIZE = 4 * 1024 * 1024
+
 ################################################################################
 
 # From http://stackoverflow.com/questions/3431825/-
 #       generating-an-md5-checksum-of-a-file
 
-def hashfile(fname, blocksize=65536):
-    f = open(fname, 'rb')
+def hashfile(fname, blocksize=BLOCKSIZE):
+    with open(fname, 'rb', buffering=0) as f:
+        return hashstream(f, blocksize)
+
+def hashstream(f, blocksize=BLOCKSIZE):
+    """MD5 checksum of the rest of an open binary file, e.g., a member of a
+    tar file."""
+
     hasher = hashlib.md5()
-    buf = f.read(blocksize)
-    while len(buf) > 0:
-        hasher.update(buf)
-        buf = f.read(blocksize)
+    buf = bytearray(blocksize)
+    view = memoryview(buf)
+    while True:
+        count = f.readinto(buf)
+        if not count:
+            break
+        hasher.update(view[:count])
+
     return hasher.hexdigest()
 
+def hash_files(abspaths, workers=None, processes=False, blocksize=BLOCKSIZE):
+    """Generator over the MD5 checksums of the given files, in the same order.
+
+    Up to `workers` files are hashed at once, in threads or, if processes is
+    True, in separate processes. With workers=1, files are hashed one at a
+    time in this thread.
+    """
+
+    workers = workers or WORKERS
+    if workers == 1 or len(abspaths) <= 1:
+        for abspath in abspaths:
+            yield hashfile(abspath, blocksize)
+        return
+
+    if processes:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(workers)
+
+    with executor:
+        blocksizes = len(abspaths) * [blocksize]
+        yield from executor.map(hashfile, abspaths, blocksizes)
+
 ################################################################################
 
 def generate_checksums(pdsdir, selection=None, oldpairs=[], regardless=True,
-                       limits={'normal':-1}, logger=None):
+                       limits={'normal':-1}, logger=None, workers=None,
+                       processes=False, stats=None):
     """Generate a list of tuples (abspath, checksum) recursively from the given
     directory tree.
 
@@ -57,6 +99,18 @@ def generate_checksums(pdsdir, selection=None, oldpairs=[], regardless=True,
     If regardless is True, then the checksum of a selection is calculated
     regardless of whether it is already in abspairs.
 
+    The tree is listed by pdsmanifest.get_manifest(). New checksums are
+    calculated by hash_files(), using the given number of workers and,
+    optionally, processes instead of threads, and are saved in the manifest.
+    The order of the returned pairs does not depend on these options.
+
+    The optional stats is a dictionary returned by read_stats(). If a file's
+    size, modification time and inode are unchanged, the checksum in this
+    dictionary is trusted and the file is not read. When stats are given, a
+    checksum in oldpairs is only copied if it is trusted this way; otherwise
+    the file is hashed again. On return, the dictionary contains the stat of
+    every file checked and its checksum.
+
     Also return the latest modification date among all the files checked.
     """
 
@@ -73,10 +127,15 @@ def generate_checksums(pdsdir, selection=None, oldpairs=[], regardless=True,
             md5_dict[abspath] = hex
 
         newtuples = []
-        for (path, dirs, files) in os.walk(dirpath):
+        to_hash = []        # (index in newtuples, message prefix)
+        file_stats = {}     # (size, mtime_ns, inode) keyed by abspath
+        trusted = 0
+        manifest = pdsmanifest.get_manifest(dirpath)
+        for (path, dirs, files) in manifest.walk():
             for file in files:
                 abspath = os.path.join(path, file)
-                latest_mtime = max(latest_mtime, os.path.getmtime(abspath))
+                st = manifest.stat(abspath)
+                latest_mtime = max(latest_mtime, st.st_mtime)
 
                 if selection and file != selection:
                     continue
@@ -92,19 +151,43 @@ def generate_checksums(pdsdir, selection=None, oldpairs=[], regardless=True,
                 if '/.' in abspath:             # flag invisible files
                     logger.invisible('Invisible file', abspath)
 
+                file_stats[abspath] = (st.st_size, st.st_mtime_ns, st.st_ino)
+
                 if regardless and selection:
-                    md5 = hashfile(abspath)
-                    newtuples.append((abspath, md5, file))
-                    logger.normal('Selected MD5=%s' % md5, abspath)
+                    to_hash.append((len(newtuples), 'Selected MD5='))
+                    newtuples.append((abspath, None, file))
+
+                elif (stats is not None and abspath in stats and
+                      stats[abspath][:3] == file_stats[abspath]):
+                    newtuples.append((abspath, stats[abspath][3], file))
+                    logger.debug('MD5 trusted; stat unchanged', abspath)
+                    trusted += 1
+
+                elif stats is not None and abspath in md5_dict:
+                    to_hash.append((len(newtuples), 'Modified file MD5='))
+                    newtuples.append((abspath, None, file))
 
                 elif abspath in md5_dict:
                     newtuples.append((abspath, md5_dict[abspath], file))
                     logger.debug('MD5 copied', abspath)
 
                 else:
-                    md5 = hashfile(abspath)
-                    newtuples.append((abspath, md5, file))
-                    logger.normal('MD5=%s' % md5, abspath)
+                    to_hash.append((len(newtuples), 'MD5='))
+                    newtuples.append((abspath, None, file))
+
+        # Calculate the new checksums, unless the manifest already has them
+        abspaths = [newtuples[k][0] for (k, _) in to_hash]
+        manifest.hash_files(abspaths, workers=workers, processes=processes)
+        for (k, message) in to_hash:
+            (abspath, _, file) = newtuples[k]
+            md5 = manifest.checksums[abspath]
+            newtuples[k] = (abspath, md5, file)
+            logger.normal(message + md5, abspath)
+
+        if stats is not None:
+            logger.info('Trusted-stat files: %d of %d' % (trusted,
+                                                          len(newtuples)),
+                        dirpath, force=True)
 
         if selection:
             if len(newtuples) == 0:
@@ -120,6 +203,14 @@ def generate_checksums(pdsdir, selection=None, oldpairs=[], regardless=True,
         for (abspath, md5, _) in newtuples:
             md5_dict[abspath] = md5
 
+        # Save the stat of every file checked; forget files that are gone
+        if stats is not None:
+            if not selection:
+                stats.clear()
+
+            for (abspath, md5, _) in newtuples:
+                stats[abspath] = file_stats[abspath] + (md5,)
+
         # Restore original order, old keys then new
         old_keys = [p[0] for p in oldpairs]
 
@@ -283,6 +374,67 @@ def write_checksums(check_path, abspairs,
 
 ################################################################################
 
+def stat_path(check_path):
+    """The path to the stat file that goes with a checksum file."""
+
+    return check_path.rpartition('_md5.txt')[0] + '_md5_stat.txt'
+
+def read_stats(check_path, abspairs=None, logger=None):
+    """Return a dictionary of tuples (size, mtime_ns, inode, checksum) keyed
+    by abspath from the stat file that goes with a checksum file.
+
+    If abspairs is given, only entries that agree with these (abspath,
+    checksum) pairs are returned. The dictionary is empty if the stat file does
+    not exist.
+    """
+
+    check_path = os.path.abspath(check_path)
+    path = stat_path(check_path)
+    if not os.path.exists(path):
+        return {}
+
+    pdscheck = pdsfile.PdsFile.from_abspath(check_path)
+    prefix_ = pdscheck.dirpath_and_prefix_for_checksum()[1]
+
+    logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+    logger.info('Reading stat file', path)
+
+    stats = {}
+    with open(path, 'r') as f:
+        for rec in f:
+            hexval = rec[:32]
+            (fields, _, filepath) = rec[33:].rstrip('\n').partition('  ')
+            (size, mtime_ns, inode) = [int(k) for k in fields.split()]
+            stats[prefix_ + filepath] = (size, mtime_ns, inode, hexval)
+
+    if abspairs is not None:
+        md5_dict = dict(abspairs)
+        stats = {k:v for (k,v) in stats.items() if md5_dict.get(k) == v[3]}
+
+    return stats
+
+def write_stats(check_path, stats, logger=None):
+    """Write the stat file that goes with a checksum file, given a dictionary
+    of tuples (size, mtime_ns, inode, checksum) keyed by abspath."""
+
+    check_path = os.path.abspath(check_path)
+    path = stat_path(check_path)
+    pdscheck = pdsfile.PdsFile.from_abspath(check_path)
+    lskip = len(pdscheck.dirpath_and_prefix_for_checksum()[1])
+
+    logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+    logger.info('Writing stat file', path)
+
+    with open(path + '.tmp', 'w') as f:
+        for abspath in sorted(stats):
+            (size, mtime_ns, inode, hex) = stats[abspath]
+            f.write('%s %d %d %d  %s\n' % (hex, size, mtime_ns, inode,
+                                           abspath[lskip:]))
+
+    os.replace(path + '.tmp', path)
+
+################################################################################
+
 def validate_pairs(pairs1, pairs2, selection=None, limits={}, logger=None):
     """Validate the first checksum list against the second.
 
@@ -367,7 +519,8 @@ def move_old_checksums(check_path, logger=None):
 # Simplified functions to perform tasks
 ################################################################################
 
-def initialize(pdsdir, selection=None, logger=None):
+def initialize(pdsdir, selection=None, logger=None, workers=None,
+               processes=False):
 
     check_path = pdsdir.checksum_path_and_lskip()[0]
 
@@ -383,15 +536,19 @@ def initialize(pdsdir, selection=None, logger=None):
                          '"initialize": ' + selection)
 
     # Generate checksums
-    (pairs, _) = generate_checksums(pdsdir, logger=logger)
+    stats = {}
+    (pairs, _) = generate_checksums(pdsdir, logger=logger, workers=workers,
+                                    processes=processes, stats=stats)
     if not pairs:
         return False
 
     # Write new checksum file
     write_checksums(check_path, pairs, logger=logger)
+    write_stats(check_path, stats, logger=logger)
     return True
 
-def reinitialize(pdsdir, selection=None, logger=None):
+def reinitialize(pdsdir, selection=None, logger=None, workers=None,
+                 processes=False):
 
     check_path = pdsdir.checksum_path_and_lskip()[0]
 
@@ -403,28 +560,42 @@ def reinitialize(pdsdir, selection=None, logger=None):
             return False
         else:
             logger.warn('Checksum file does not exist; initializing', check_path)
-            return initialize(pdsdir, selection=selection, logger=logger)
+            return initialize(pdsdir, selection=selection, logger=logger,
+                              workers=workers, processes=processes)
 
     # Re-initialize just the selection; preserve others
     if selection:
         oldpairs = read_checksums(check_path, logger=logger)
         if not oldpairs:
             return False
+        stats = read_stats(check_path, oldpairs, logger=logger)
     else:
         oldpairs = []
+        stats = {}
 
     # Generate new checksums
     (pairs, _) = generate_checksums(pdsdir, selection, oldpairs,
-                                    regardless=True, logger=logger)
+                                    regardless=True, logger=logger,
+                                    workers=workers, processes=processes,
+                                    stats=stats)
     if not pairs:
         return False
 
     # Write new checksum file
     move_old_checksums(check_path, logger=logger)
     write_checksums(check_path, pairs, logger=logger)
+    write_stats(check_path, stats, logger=logger)
     return True
 
-def validate(pdsdir, selection=None, logger=None):
+def validate(pdsdir, selection=None, logger=None, workers=None,
+             processes=False, trust_stat=False):
+    """Validate a directory against its checksum file.
+
+    If trust_stat is True, files whose size, modification time and inode match
+    the stat file are not read; their checksums are trusted. The number of
+    such files is reported as "Trusted-stat files". Without a stat file, every
+    file is read.
+    """
 
     check_path = pdsdir.checksum_path_and_lskip()[0]
 
@@ -439,15 +610,28 @@ def validate(pdsdir, selection=None, logger=None):
     if not md5pairs:
         return False
 
+    # Read the stat file if necessary
+    stats = None
+    if trust_stat:
+        logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+        if os.path.exists(stat_path(check_path)):
+            stats = read_stats(check_path, md5pairs, logger=logger)
+        else:
+            logger.warn('Stat file does not exist; every file is checked',
+                        stat_path(check_path))
+
     # Generate checksums
-    (dirpairs, _) = generate_checksums(pdsdir, selection, logger=logger)
+    (dirpairs, _) = generate_checksums(pdsdir, selection, logger=logger,
+                                       workers=workers, processes=processes,
+                                       stats=stats)
     if not dirpairs:
         return False
 
     # Validate
     return validate_pairs(dirpairs, md5pairs, selection, logger=logger)
 
-def repair(pdsdir, selection=None, logger=None):
+def repair(pdsdir, selection=None, logger=None, workers=None,
+           processes=False):
 
     check_path = pdsdir.checksum_path_and_lskip()[0]
 
@@ -459,7 +643,8 @@ def repair(pdsdir, selection=None, logger=None):
             return False
         else:
             logger.warn('Checksum file does not exist; initializing', check_path)
-            return initialize(pdsdir, selection=selection, logger=logger)
+            return initialize(pdsdir, selection=selection, logger=logger,
+                              workers=workers, processes=processes)
 
     # Read checksums file
     md5pairs = read_checksums(check_path, logger=logger)
@@ -468,12 +653,18 @@ def repair(pdsdir, selection=None, logger=None):
 
     # Generate new checksums
     if selection:
+        stats = read_stats(check_path, md5pairs, logger=logger)
         (dirpairs,
          latest_mtime) = generate_checksums(pdsdir, selection, md5pairs,
-                                            regardless=True, logger=logger)
+                                            regardless=True, logger=logger,
+                                            workers=workers,
+                                            processes=processes, stats=stats)
     else:
+        stats = {}
         (dirpairs,
-         latest_mtime) = generate_checksums(pdsdir, logger=logger)
+         latest_mtime) = generate_checksums(pdsdir, logger=logger,
+                                            workers=workers,
+                                            processes=processes, stats=stats)
 
     if not dirpairs:
         return False
@@ -515,14 +706,18 @@ def repair(pdsdir, selection=None, logger=None):
         else:
             logger.info('!!! Checksum file is up to date; repair canceled',
                         check_path, force=True)
+
+        write_stats(check_path, stats, logger=logger)
         return True
 
     # Write checksum file
     move_old_checksums(check_path, logger=logger)
     write_checksums(check_path, dirpairs, logger=logger)
+    write_stats(check_path, stats, logger=logger)
     return True
 
-def update(pdsdir, selection=None, logger=None):
+def update(pdsdir, selection=None, logger=None, workers=None,
+           processes=False):
 
     check_path = pdsdir.checksum_path_and_lskip()[0]
 
@@ -534,17 +729,26 @@ def update(pdsdir, selection=None, logger=None):
             return False
         else:
             logger.warn('Checksum file does not exist; initializing', check_path)
-            return initialize(pdsdir, selection=selection, logger=logger)
+            return initialize(pdsdir, selection=selection, logger=logger,
+                              workers=workers, processes=processes)
 
     # Read checksums file
     md5pairs = read_checksums(check_path, logger=logger)
     if not md5pairs:
         return False
 
+    # With a stat file, also re-check files whose stat has changed
+    if os.path.exists(stat_path(check_path)):
+        stats = read_stats(check_path, md5pairs, logger=logger)
+    else:
+        stats = None
+
     # Generate new checksums if necessary
     (dirpairs,
      latest_mtime) = generate_checksums(pdsdir, selection, md5pairs,
-                                        regardless=False, logger=logger)
+                                        regardless=False, logger=logger,
+                                        workers=workers, processes=processes,
+                                        stats=stats)
     if not dirpairs:
         return False
 
@@ -556,11 +760,15 @@ def update(pdsdir, selection=None, logger=None):
         logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
         logger.info('!!! Checksum file content is complete; update canceled',
                     check_path)
+        if stats is not None:
+            write_stats(check_path, stats, logger=logger)
         return True
 
     # Write checksum file
     move_old_checksums(check_path, logger=logger)
     write_checksums(check_path, dirpairs, logger=logger)
+    if stats is not None:
+        write_stats(check_path, stats, logger=logger)
     return True
 
 ################################################################################
@@ -612,7 +820,9 @@ if __name__ == '__main__':
                         default='', action='store_const', dest='task',
                         help='Search a directory for any new files and add '   +
                              'their MD5 checksums to the checksum file. '      +
-                             'Checksums of pre-existing files are not checked.')
+                             'Pre-existing files are only checked again if '   +
+                             'their size, modification time or inode has '     +
+                             'changed since their checksums were calculated.')
 
     parser.add_argument('volume', nargs='+', type=str,
                         help='The path to the root directory of a volume or '  +
@@ -644,6 +854,22 @@ if __name__ == '__main__':
                         help='After a successful run, also execute the '       +
                              'equivalent pdsinfoshelf command.')
 
+    parser.add_argument('--workers', '-w', type=int, default=WORKERS,
+                        help='Number of files to checksum at once; default '   +
+                             '%d. Use 1 to checksum one file ' % WORKERS       +
+                             'at a time.')
+
+    parser.add_argument('--processes', default=False, action='store_true',
+                        help='Checksum files in separate processes rather '    +
+                             'than threads.')
+
+    parser.add_argument('--trust-stat', dest='trust_stat', default=False,
+                        action='store_true',
+                        help='For --validate, do not read files whose size, '  +
+                             'modification time and inode are unchanged since '+
+                             'their checksums were last calculated. Their '    +
+                             'number is reported as "Trusted-stat files".')
+
 
     # Parse and validate the command line
     args = parser.parse_args()
@@ -652,6 +878,10 @@ if __name__ == '__main__':
         print('pdschecksums error: Missing task')
         sys.exit(1)
 
+    if args.workers < 1:
+        print('pdschecksums error: --workers must be at least 1')
+        sys.exit(1)
+
     # Define the logging directory
     if args.log == '':
         try:
@@ -812,23 +1042,27 @@ if __name__ == '__main__':
                 for logfile in logfiles:
                     logger.info('Log file', logfile)
 
+                options = {'workers': args.workers,
+                           'processes': args.processes}
+
                 if args.task == 'initialize':
-                    proceed = initialize(pdsdir, selection)
+                    proceed = initialize(pdsdir, selection, **options)
 
                 elif args.task == 'reinitialize':
                     if selection:           # don't erase everything else!
-                        proceed = update(pdsdir, selection)
+                        proceed = update(pdsdir, selection, **options)
                     else:
-                        proceed = reinitialize(pdsdir, selection)
+                        proceed = reinitialize(pdsdir, selection, **options)
 
                 elif args.task == 'validate':
-                    proceed = validate(pdsdir, selection)
+                    proceed = validate(pdsdir, selection, **options,
+                                       trust_stat=args.trust_stat)
 
                 elif args.task == 'repair':
-                    proceed = repair(pdsdir, selection)
+                    proceed = repair(pdsdir, selection, **options)
 
                 else:   # update
-                   proceed = update(pdsdir, selection)
+                   proceed = update(pdsdir, selection, **options)
 
             except (Exception, KeyboardInterrupt) as e:
                 logger.exception(e)
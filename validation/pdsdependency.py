@@ -16,6 +16,7 @@ import argparse
 
 import pdslogger
 import pdsfile
+import pdsmanifest
 import translator
 
 LOGNAME = 'pds.validation.dependencies'
@@ -98,7 +99,7 @@ class PdsDependency(object):
     MODTIME_DICT = {}
 
     def __init__(self, title, glob_pattern, regex, sublist, suite=None,
-                       newer=True, exceptions=[]):
+                       newer=True, exceptions=[], optional=False):
         """Constructor for a PdsDependency.
 
         Inputs:
@@ -114,6 +115,8 @@ class PdsDependency(object):
             exceptions      a list of zero or more regular expressions. If a
                             file path matches one of these patterns, then it
                             will not trigger a test.
+            optional        True if the required files need not exist; if they
+                            do, they are still checked.
         """
 
         self.glob_pattern = glob_pattern
@@ -133,6 +136,7 @@ class PdsDependency(object):
         self.title = title
         self.suite = suite
         self.newer = newer
+        self.optional = optional
 
         if suite is not None:
             if suite not in PdsDependency.DEPENDENCY_SUITES:
@@ -149,16 +153,25 @@ class PdsDependency(object):
     @staticmethod
     def get_modtime(abspath, logger):
         """Return the Unix-style modification time for a file, recursively for
-        a directory. Cache results for directories."""
+        a directory. Cache results for directories. Use the cached manifest of
+        the enclosing volume if there is one."""
 
-        if os.path.isfile(abspath):
+        manifest = pdsmanifest.find_manifest(abspath)
+        if manifest:
+            if not manifest.isdir(abspath):
+                return manifest.getmtime(abspath)
+
+        elif os.path.isfile(abspath):
             return os.path.getmtime(abspath)
 
         if abspath in PdsDependency.MODTIME_DICT:
             return PdsDependency.MODTIME_DICT[abspath]
 
         modtime = -1.e99
-        files = os.listdir(abspath)
+        if manifest:
+            files = manifest.listdir(abspath)
+        else:
+            files = os.listdir(abspath)
         for file in files:
             absfile = os.path.join(abspath, file)
 
@@ -231,7 +244,10 @@ class PdsDependency(object):
                             continue
 
                         if not os.path.exists(absreq):
-                            logger.error('Missing file', absreq)
+                            if self.optional:
+                                logger.normal('Optional file absent', absreq)
+                            else:
+                                logger.error('Missing file', absreq)
                             continue
 
                         if self.newer and check_newer:
@@ -345,6 +361,23 @@ for thing in ['volumes', 'metadata', 'calibrated']:
         suite='general', newer=True,
     )
 
+################################################################################
+# OPUS ID index tests
+#
+# The OPUS ID index of a volume is optional; PdsFile.from_opus_id() falls back
+# to the rules without it. If there is one, it must be newer than the volume.
+# Its contents are checked by pdsopusindex.py --validate.
+################################################################################
+
+_ = PdsDependency(
+    'Newer OPUS ID index shelf files for volumes',
+    'volumes/$/$',
+    r'volumes/(.*?)/(.*)',
+    [r'_infoshelf-volumes/\1/\2_opus.pickle',
+     r'_infoshelf-volumes/\1/\2_opus.py'],
+    suite='general', newer=True, optional=True,
+)
+
 ################################################################################
 # Metadata tests
 ################################################################################
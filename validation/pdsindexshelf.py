@@ -17,6 +17,7 @@ import sys
 
 import pdslogger
 import pdsfile
+import pdsshelf
 import pdstable
 
 LOGNAME = 'pds.validation.indexshelf'
@@ -84,6 +85,12 @@ def write_indexdict(pdsf, index_dict, logger=None):
         with open(shelf_path, 'wb') as f:
             pickle.dump(index_dict, f)
 
+        # Write the sorted shelf file
+        sorted_path = pdsshelf.shelf_path_for_pickle(shelf_path)
+        logger.info('Writing sorted shelf file', sorted_path)
+        pdsshelf.write_shelf(sorted_path, index_dict,
+                             directories=False)
+
         # Write the Python file
         python_path = shelf_path.rpartition('.')[0] + '.py'
         logger.info('Writing Python file', python_path)
@@ -110,7 +117,7 @@ def write_indexdict(pdsf, index_dict, logger=None):
 
             f.write('}\n\n')
 
-        logger.info('Two files written')
+        logger.info('Three files written')
 
     except (Exception, KeyboardInterrupt) as e:
         logger.exception(e)
@@ -20,6 +20,8 @@ from PIL import Image
 import pdslogger
 import pdsfile
 import pdschecksums
+import pdsmanifest
+import pdsshelf
 
 # Holds log file directories temporarily, used by move_old_info()
 LOGDIRS = []
@@ -52,9 +54,10 @@ def generate_infodict(pdsdir, selection, old_infodict={},
 
     def get_info_for_file(abspath, latest_mtime):
 
-        nbytes = os.path.getsize(abspath)
+        st = manifest.stat(abspath)
+        nbytes = st.st_size
         children = 0
-        mtime = os.path.getmtime(abspath)
+        mtime = st.st_mtime
         latest_mtime = max(latest_mtime, mtime)
 
         dt = datetime.datetime.fromtimestamp(mtime)
@@ -80,12 +83,12 @@ def generate_infodict(pdsdir, selection, old_infodict={},
     def get_info(abspath, infodict, old_infodict, checkdict, latest_mtime):
         """Info about the given abspath."""
 
-        if os.path.isdir(abspath):
+        if manifest.isdir(abspath):
             nbytes = 0
             children = 0
             modtime = ''
 
-            files = os.listdir(abspath)
+            files = manifest.listdir(abspath)
             for file in files:
                 absfile = os.path.join(abspath, file)
 
@@ -143,6 +146,7 @@ def generate_infodict(pdsdir, selection, old_infodict={},
     try:
         # Load checksum dictionary
         checkdict = pdschecksums.checksum_dict(dirpath, logger=logger)
+        manifest = pdsmanifest.get_manifest(dirpath)
 #         Removed... because we can't ignore empty directories
 #         if not checkdict:
 #             return ({}, 0.)
@@ -258,6 +262,12 @@ def write_infodict(pdsdir, infodict, limits={}, logger=None):
         with open(info_path, 'wb') as f:
             pickle.dump(pickle_dict, f)
 
+        # Write the sorted shelf file, including the table of each
+        # directory's children used by PdsFile.os_listdir()
+        shelf_path = pdsshelf.shelf_path_for_pickle(info_path)
+        logger.info('Sorted shelf file', shelf_path)
+        pdsshelf.write_shelf(shelf_path, pickle_dict, directories=True)
+
     except (Exception, KeyboardInterrupt) as e:
         logger.exception(e)
         raise
@@ -419,8 +429,12 @@ def move_old_info(shelf_file, logger=None):
         logger.info('Info shelf file moved to', dest)
 
         python_file = shelf_file.rpartition('.')[0] + '.py'
-        dest = dest.rpartition('.')[0] + '.py'
-        shutil.copy(python_file, dest)
+        python_dest = dest.rpartition('.')[0] + '.py'
+        shutil.copy(python_file, python_dest)
+
+        sorted_file = pdsshelf.shelf_path_for_pickle(shelf_file)
+        if os.path.exists(sorted_file):
+            shutil.copy(sorted_file, pdsshelf.shelf_path_for_pickle(dest))
 
 ################################################################################
 # Simplified functions to perform tasks
@@ -19,6 +19,8 @@ import sys
 
 import pdslogger
 import pdsfile
+import pdsmanifest
+import pdsshelf
 import translator
 
 LOGNAME = 'pds.validation.links'
@@ -696,13 +698,14 @@ def generate_links(dirpath, old_links={},
       latest_mtime = 0.
 
       # Walk the directory tree, one subdirectory "root" at a time...
-      for (root, dirs, files) in os.walk(dirpath):
+      manifest = pdsmanifest.get_manifest(dirpath)
+      for (root, dirs, files) in manifest.walk():
 
         local_basenames = []            # Tracks the basenames in this directory
         local_basenames_uc = []         # Same as above, but upper case
         for basename in files:
             abspath = os.path.join(root, basename)
-            latest_mtime = max(latest_mtime, os.path.getmtime(abspath))
+            latest_mtime = max(latest_mtime, manifest.getmtime(abspath))
 
             if basename == '.DS_Store':    # skip .DS_Store files
                 logger.ds_store('.DS_Store file skipped', abspath)
@@ -1219,6 +1222,12 @@ def write_linkdict(dirpath, link_dict, limits={}, logger=None):
         with open(link_path, 'wb') as f:
             pickle.dump(interior_dict, f)
 
+        # Write the sorted shelf file
+        shelf_path = pdsshelf.shelf_path_for_pickle(link_path)
+        logger.info('Sorted shelf file', shelf_path)
+        pdsshelf.write_shelf(shelf_path, interior_dict,
+                             directories=False)
+
     except (Exception, KeyboardInterrupt) as e:
         logger.exception(e)
         raise
@@ -1377,6 +1386,10 @@ def move_old_links(shelf_file, logger=None):
         pickle_dest = dest.rpartition('.')[0] + '.pickle'
         shutil.copy(pickle_src, pickle_dest)
 
+        sorted_src = pdsshelf.shelf_path_for_pickle(pickle_src)
+        if os.path.exists(sorted_src):
+            shutil.copy(sorted_src, pdsshelf.shelf_path_for_pickle(pickle_dest))
+
 ################################################################################
 # Simplified functions to perform tasks
 ################################################################################
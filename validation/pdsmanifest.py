@@ -0,0 +1,190 @@
+################################################################################
+# pdsmanifest.py library
+#
+# A Manifest is an in-memory listing of a volume directory tree, built with a
+# single os.scandir() pass. It holds the stat of every file and directory and,
+# optionally, the MD5 checksum of every file. The validation tools use it in
+# place of their own calls to os.walk(), os.listdir() and os.path.getmtime().
+#
+# Within a program that runs several tools on the same volume, such as
+# re-validate.py, call use_cache() so that each volume is only scanned once.
+################################################################################
+
+import os
+
+import pdschecksums
+
+# Manifests keyed by directory path; None if caching is disabled
+CACHE = None
+
+################################################################################
+# Manifest class
+################################################################################
+
+class Manifest(object):
+    """The paths and stats of every file and directory in a tree."""
+
+    def __init__(self, dirpath, hashes=False, workers=None):
+        """Scan a directory tree.
+
+        Input:
+            dirpath     path to the top directory.
+            hashes      True to calculate the MD5 checksum of every file too.
+            workers     number of files to hash at once; see
+                        pdschecksums.hash_files().
+        """
+
+        self.dirpath = os.path.abspath(dirpath)
+        self.names = {}         # basenames in os.listdir order, keyed by the
+                                # abspath of each directory scanned
+        self.dirs = set()       # abspaths of directories
+        self.stats = {}         # os.stat_result keyed by abspath
+        self.checksums = {}     # MD5 checksums keyed by abspath
+
+        self.stats[self.dirpath] = os.stat(self.dirpath)
+        self.dirs.add(self.dirpath)
+
+        # Like os.walk(), do not descend into links to directories
+        stack = [self.dirpath]
+        while stack:
+            path = stack.pop()
+            names = []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    names.append(entry.name)
+                    try:
+                        self.stats[entry.path] = entry.stat()
+                    except OSError:     # broken link; os.stat() will fail too
+                        continue
+
+                    if entry.is_dir():
+                        self.dirs.add(entry.path)
+                        if not entry.is_symlink():
+                            stack.append(entry.path)
+
+            self.names[path] = names
+
+        if hashes:
+            self.hash_files(workers=workers)
+
+    def __contains__(self, abspath):
+        return abspath in self.stats
+
+    def walk(self, top=None):
+        """Generator that works the same as os.walk(top), without touching the
+        file system."""
+
+        top = top or self.dirpath
+        names = self.names[top]
+        dirs = []
+        files = []
+        for name in names:
+            if os.path.join(top, name) in self.dirs:
+                dirs.append(name)
+            else:
+                files.append(name)
+
+        yield (top, dirs, files)
+
+        for name in dirs:
+            path = os.path.join(top, name)
+            if path in self.names:
+                yield from self.walk(path)
+
+    def files(self):
+        """List of the abspaths of all files, in os.walk() order."""
+
+        abspaths = []
+        for (root, _, files) in self.walk():
+            abspaths += [os.path.join(root, f) for f in files]
+
+        return abspaths
+
+    def hash_files(self, abspaths=None, workers=None, processes=False):
+        """Calculate the MD5 checksums of the given files, by default all of
+        them, if they are not already known."""
+
+        if abspaths is None:
+            abspaths = self.files()
+
+        abspaths = [p for p in abspaths if p not in self.checksums]
+        md5s = pdschecksums.hash_files(abspaths, workers=workers,
+                                       processes=processes)
+        for (abspath, md5) in zip(abspaths, md5s):
+            self.checksums[abspath] = md5
+
+    ############################################################################
+    # Replacements for functions in os and os.path. Paths outside this tree are
+    # passed to the file system, so errors are the same as before.
+    ############################################################################
+
+    def stat(self, abspath):
+        try:
+            return self.stats[abspath]
+        except KeyError:
+            return os.stat(abspath)
+
+    def getsize(self, abspath):
+        return self.stat(abspath).st_size
+
+    def getmtime(self, abspath):
+        return self.stat(abspath).st_mtime
+
+    def isdir(self, abspath):
+        if abspath in self.stats:
+            return abspath in self.dirs
+
+        return os.path.isdir(abspath)
+
+    def listdir(self, abspath):
+        try:
+            return list(self.names[abspath])
+        except KeyError:
+            return os.listdir(abspath)
+
+################################################################################
+# Cache
+################################################################################
+
+def use_cache(status=True):
+    """Enable or disable the caching of manifests."""
+
+    global CACHE
+
+    CACHE = {} if status else None
+
+def clear_cache():
+    """Forget all cached manifests, e.g., before moving on to another volume."""
+
+    if CACHE is not None:
+        CACHE.clear()
+
+def get_manifest(dirpath, hashes=False, workers=None):
+    """Manifest for a directory tree, from the cache if possible."""
+
+    dirpath = os.path.abspath(dirpath)
+    if CACHE is not None and dirpath in CACHE:
+        manifest = CACHE[dirpath]
+        if hashes:
+            manifest.hash_files(workers=workers)
+        return manifest
+
+    manifest = Manifest(dirpath, hashes=hashes, workers=workers)
+    if CACHE is not None:
+        CACHE[dirpath] = manifest
+
+    return manifest
+
+def find_manifest(abspath):
+    """The cached manifest containing the given path; None if not found."""
+
+    if not CACHE:
+        return None
+
+    for (dirpath, manifest) in CACHE.items():
+        if abspath == dirpath or abspath.startswith(dirpath + '/'):
+            return manifest
+
+    return None
+
+################################################################################
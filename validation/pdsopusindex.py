@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+################################################################################
+# pdsopusindex.py library and main program
+#
+# Syntax:
+#   pdsopusindex.py --task path [path ...]
+#
+# Enter the --help option to see more information.
+################################################################################
+
+import argparse
+import datetime
+import os
+import pickle
+import sys
+
+import pdslogger
+import pdsfile
+import pdsshelf
+
+LOGNAME = 'pds.validation.opusindex'
+LOGROOT_ENV = 'PDS_LOG_ROOT'
+
+################################################################################
+
+def generate_opusdict(pdsdir, logger=None):
+    """Generate a dictionary keyed by OPUS ID for every primary product in the
+    volume. The value returned is a tuple of the paths of the primary products,
+    relative to the volume directory, in sorted order.
+
+    Also return the latest modification date among the primary products.
+    """
+
+    logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+    logger.replace_root(pdsdir.root_)
+    logger.open('Generating OPUS ID index for', pdsdir.abspath)
+
+    try:
+        lskip = len(pdsdir.abspath) + 1
+        latest_mtime = 0.
+        opusdict = {}
+        for pdsf in pdsdir.iter_opus_primary_pdsfiles():
+            interior = pdsf.abspath[lskip:]
+            opusdict.setdefault(pdsf.opus_id, []).append(interior)
+            latest_mtime = max(latest_mtime, os.path.getmtime(pdsf.abspath))
+            logger.normal('OPUS ID ' + pdsf.opus_id, pdsf.abspath)
+
+        opusdict = {k:tuple(sorted(v)) for (k,v) in opusdict.items()}
+
+        logger.info('OPUS IDs indexed', str(len(opusdict)), force=True)
+
+        dt = datetime.datetime.fromtimestamp(latest_mtime)
+        logger.info('Latest primary file modification date',
+                    dt.strftime('%Y-%m-%dT%H-%M-%S'), force=True)
+
+    except (Exception, KeyboardInterrupt) as e:
+        logger.exception(e)
+        raise
+
+    finally:
+        _ = logger.close()
+
+    return (opusdict, latest_mtime)
+
+################################################################################
+
+def write_opusdict(pdsdir, opusdict, logger=None):
+    """Write a new OPUS ID index shelf file for a volume."""
+
+    logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+    logger.replace_root(pdsdir.root_)
+    logger.open('Writing OPUS ID index for', pdsdir.abspath)
+
+    try:
+        pdsfile.PdsFile.close_all_shelves() # prevents using a cached shelf file
+
+        opus_path = pdsdir.shelf_path_and_lskip('opus')[0]
+        logger.info('OPUS ID index shelf file', opus_path)
+
+        # Create parent directory if necessary
+        parent = os.path.split(opus_path)[0]
+        if not os.path.exists(parent):
+            logger.info('Creating parent directory', parent)
+            os.makedirs(parent)
+
+        # Write the pickle file
+        with open(opus_path, 'wb') as f:
+            pickle.dump(opusdict, f)
+
+        # Write the sorted shelf file
+        shelf_path = pdsshelf.shelf_path_for_pickle(opus_path)
+        logger.info('Sorted shelf file', shelf_path)
+        pdsshelf.write_shelf(shelf_path, opusdict, directories=False)
+
+        # Write the Python file
+        python_path = opus_path.rpartition('.')[0] + '.py'
+        logger.info('Writing Python file', python_path)
+
+        # Determine the maximum length of the keys
+        len_key = 0
+        for key in opusdict:
+            len_key = max(len_key, len(key))
+
+        name = os.path.basename(opus_path).rpartition('.')[0]
+        with open(python_path, 'w', encoding='latin-1') as f:
+            f.write(name + ' = {\n')
+            for key in sorted(opusdict.keys()):
+                f.write('    "%s: ' % (key + '"' + (len_key-len(key)) * ' '))
+                f.write('(%s),\n' % ''.join(['"%s", ' % p
+                                             for p in opusdict[key]])[:-1])
+
+            f.write('}\n\n')
+
+        logger.info('Three files written')
+
+    except (Exception, KeyboardInterrupt) as e:
+        logger.exception(e)
+        raise
+
+    finally:
+        _ = logger.close()
+
+################################################################################
+
+def load_opusdict(pdsdir, logger=None):
+
+    logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+    logger.replace_root(pdsdir.root_)
+    logger.open('Reading OPUS ID index for', pdsdir.abspath)
+
+    try:
+        opus_path = pdsdir.shelf_path_and_lskip('opus')[0]
+        logger.info('OPUS ID index shelf file', opus_path)
+
+        if not os.path.exists(opus_path):
+            logger.error('OPUS ID index shelf file not found', opus_path)
+            return {}
+
+        with open(opus_path, 'rb') as f:
+            opusdict = pickle.load(f)
+
+        logger.info('Shelf records loaded', str(len(opusdict)))
+
+    except pickle.PickleError as e:
+        logger.exception(e)
+        raise
+
+    finally:
+        logger.close()
+
+    return opusdict
+
+################################################################################
+
+def validate_opusdict(pdsdir, dirdict, shelfdict, logger=None):
+    """Compare the OPUS ID index in a shelf file against the one generated from
+    the volume. Every stale entry in the shelf is logged as an error: an OPUS ID
+    that no longer has a primary product, or a path that no longer exists or is
+    no longer the primary product for its OPUS ID. Any OPUS ID missing from the
+    shelf is also logged as an error.
+    """
+
+    logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+    logger.replace_root(pdsdir.root_)
+    logger.open('Validating OPUS ID index for', pdsdir.abspath)
+
+    volume_ = pdsdir.abspath + '/'
+    try:
+        for opus_id in sorted(shelfdict.keys()):
+            if opus_id not in dirdict:
+                for interior in shelfdict[opus_id]:
+                    logger.error('Stale OPUS ID ' + opus_id,
+                                 volume_ + interior)
+                continue
+
+            new_interiors = set(dirdict[opus_id])
+            agreement = True
+            for interior in shelfdict[opus_id]:
+                if interior not in new_interiors:
+                    logger.error('Stale primary product for OPUS ID ' +
+                                 opus_id, volume_ + interior)
+                    agreement = False
+
+            old_interiors = set(shelfdict[opus_id])
+            for interior in dirdict[opus_id]:
+                if interior not in old_interiors:
+                    logger.error('Missing primary product for OPUS ID ' +
+                                 opus_id, volume_ + interior)
+                    agreement = False
+
+            if agreement:
+                logger.normal('OPUS ID matches ' + opus_id,
+                              volume_ + dirdict[opus_id][0])
+
+        for opus_id in sorted(dirdict.keys()):
+            if opus_id not in shelfdict:
+                logger.error('Missing OPUS ID ' + opus_id,
+                             volume_ + dirdict[opus_id][0])
+
+    except (Exception, KeyboardInterrupt) as e:
+        logger.exception(e)
+        raise
+
+    finally:
+        return logger.close()
+
+################################################################################
+# Simplified functions to perform tasks
+################################################################################
+
+def initialize(pdsdir, logger=None):
+
+    opus_path = pdsdir.shelf_path_and_lskip('opus')[0]
+
+    # Make sure file does not exist
+    if os.path.exists(opus_path):
+        logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+        logger.error('OPUS ID index shelf file already exists', opus_path)
+        return
+
+    # Generate the index
+    (opusdict, _) = generate_opusdict(pdsdir, logger=logger)
+
+    # Save the index
+    write_opusdict(pdsdir, opusdict, logger=logger)
+
+def reinitialize(pdsdir, logger=None):
+
+    opus_path = pdsdir.shelf_path_and_lskip('opus')[0]
+
+    # Warn if shelf file does not exist
+    if not os.path.exists(opus_path):
+        logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+        logger.warn('OPUS ID index shelf file does not exist; initializing',
+                    opus_path)
+        initialize(pdsdir, logger=logger)
+        return
+
+    # Generate the index
+    (opusdict, _) = generate_opusdict(pdsdir, logger=logger)
+
+    # Save the index
+    write_opusdict(pdsdir, opusdict, logger=logger)
+
+def validate(pdsdir, logger=None):
+
+    opus_path = pdsdir.shelf_path_and_lskip('opus')[0]
+
+    # Make sure file exists
+    if not os.path.exists(opus_path):
+        logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+        logger.error('OPUS ID index shelf file does not exist', opus_path)
+        return
+
+    # Read the shelf file
+    shelf_opusdict = load_opusdict(pdsdir, logger=logger)
+
+    # Generate the index
+    (dir_opusdict, _) = generate_opusdict(pdsdir, logger=logger)
+
+    # Validate
+    validate_opusdict(pdsdir, dir_opusdict, shelf_opusdict, logger=logger)
+
+def repair(pdsdir, logger=None):
+
+    opus_path = pdsdir.shelf_path_and_lskip('opus')[0]
+
+    # Make sure file exists
+    if not os.path.exists(opus_path):
+        logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+        logger.warn('OPUS ID index shelf file does not exist; initializing',
+                    opus_path)
+        initialize(pdsdir, logger=logger)
+        return
+
+    # Read the shelf file
+    shelf_opusdict = load_opusdict(pdsdir, logger=logger)
+
+    # Generate the index
+    (dir_opusdict, latest_mtime) = generate_opusdict(pdsdir, logger=logger)
+
+    # Compare
+    if dir_opusdict == shelf_opusdict:
+        logger = logger or pdslogger.PdsLogger.get_logger(LOGNAME)
+        logger.info('!!! OPUS ID index shelf file is up to date; ' +
+                    'repair canceled', opus_path, force=True)
+        return
+
+    # Write the new index
+    write_opusdict(pdsdir, dir_opusdict, logger=logger)
+
+################################################################################
+################################################################################
+
+if __name__ == '__main__':
+
+    # Set up parser
+    parser = argparse.ArgumentParser(
+        description='pdsopusindex: Create, maintain and validate shelf files ' +
+                    'mapping each OPUS ID to the primary products of a '       +
+                    'volume.')
+
+    parser.add_argument('--initialize', '--init', const='initialize',
+                        default='', action='store_const', dest='task',
+                        help='Create an OPUS ID index file for a volume. '     +
+                             'Abort if the file already exists.')
+
+    parser.add_argument('--reinitialize', '--reinit', const='reinitialize',
+                        default='', action='store_const', dest='task',
+                        help='Create an OPUS ID index file for a volume. '     +
+                             'Replace the file if it already exists.')
+
+    parser.add_argument('--validate', const='validate',
+                        default='', action='store_const', dest='task',
+                        help='Validate the OPUS ID index file of a volume. '   +
+                             'Report every stale entry and every missing '     +
+                             'OPUS ID.')
+
+    parser.add_argument('--repair', const='repair',
+                        default='', action='store_const', dest='task',
+                        help='Validate the OPUS ID index file of a volume; '   +
+                             'replace it only if necessary.')
+
+    parser.add_argument('volume', nargs='+', type=str,
+                        help='The path to the root of the volume or volume '   +
+                             'set. For a volume set, all the volume '          +
+                             'directories inside it are handled in sequence.')
+
+    parser.add_argument('--log', '-l', type=str, default='',
+                        help='Optional root directory for a duplicate of the ' +
+                             'log files. If not specified, the value of '      +
+                             'environment variable "%s" ' % LOGROOT_ENV        +
+                             'is used. In addition, individual logs are '      +
+                             'written into the "logs" directory parallel to '  +
+                             '"holdings". Logs are created inside the '        +
+                             '"pdsopusindex" subdirectory of each log root '   +
+                             'directory.')
+
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='Do not also log to the terminal.')
+
+    # Parse and validate the command line
+    args = parser.parse_args()
+
+    if not args.task:
+        print('pdsopusindex error: Missing task')
+        sys.exit(1)
+
+    status = 0
+
+    # Define the logging directory
+    if args.log == '':
+        try:
+            args.log = os.environ[LOGROOT_ENV]
+        except KeyError:
+            args.log = None
+
+    # Initialize the logger
+    logger = pdslogger.PdsLogger(LOGNAME)
+    pdsfile.PdsFile.set_log_root(args.log)
+
+    if not args.quiet:
+        logger.add_handler(pdslogger.stdout_handler)
+
+    if args.log:
+        path = os.path.join(args.log, 'pdsopusindex')
+        warning_handler = pdslogger.warning_handler(path)
+        logger.add_handler(warning_handler)
+
+        error_handler = pdslogger.error_handler(path)
+        logger.add_handler(error_handler)
+
+    # Generate a list of volume PdsFiles
+    pdsdirs = []
+    for path in args.volume:
+
+        # Make sure path makes sense
+        path = os.path.abspath(path)
+        parts = path.partition('/holdings/')
+        if not parts[1]:
+            print('Not a holdings subdirectory: ' + path)
+            sys.exit(1)
+
+        if not parts[2].startswith('volumes/'):
+            print('OPUS ID indices are only for volumes: ' + path)
+            sys.exit(1)
+
+        pdsf = pdsfile.PdsFile.from_abspath(path, must_exist=True)
+
+        if pdsf.is_volset_dir:
+            children = [pdsf.child(c) for c in pdsf.childnames]
+            pdsdirs += [c for c in children if c.isdir]
+                    # "if c.isdir" is False for volset level readme files
+
+        elif pdsf.is_volume_dir:
+            pdsdirs.append(pdsf)
+
+        else:
+            print('Not a volume or volume set: ' + path)
+            sys.exit(1)
+
+    # Open logger and loop through volumes...
+    logger.open(' '.join(sys.argv))
+    try:
+        for pdsdir in pdsdirs:
+
+            # Save logs in up to two places
+            logfiles = set([pdsdir.log_path_for_volume('_opus',
+                                                       task=args.task,
+                                                       dir='pdsopusindex'),
+                            pdsdir.log_path_for_volume('_opus',
+                                                       task=args.task,
+                                                       dir='pdsopusindex',
+                                                       place='parallel')])
+
+            # Create all the handlers for this level in the logger
+            local_handlers = []
+            for logfile in logfiles:
+                local_handlers.append(pdslogger.file_handler(logfile))
+                logdir = os.path.split(logfile)[0]
+
+                # These handlers are only used if they don't already exist
+                warning_handler = pdslogger.warning_handler(logdir)
+                error_handler = pdslogger.error_handler(logdir)
+                local_handlers += [warning_handler, error_handler]
+
+            # Open the next level of the log
+            if len(pdsdirs) > 1:
+                logger.blankline()
+
+            logger.open('Task "' + args.task + '" for', pdsdir.abspath,
+                        handler=local_handlers)
+
+            try:
+                for logfile in logfiles:
+                    logger.info('Log file', logfile)
+
+                if args.task == 'initialize':
+                    initialize(pdsdir)
+
+                elif args.task == 'reinitialize':
+                    reinitialize(pdsdir)
+
+                elif args.task == 'validate':
+                    validate(pdsdir)
+
+                else:   # repair
+                    repair(pdsdir)
+
+            except (Exception, KeyboardInterrupt) as e:
+                logger.exception(e)
+                raise
+
+            finally:
+                _ = logger.close()
+
+    except (Exception, KeyboardInterrupt) as e:
+        logger.exception(e)
+        print(sys.exc_info()[2])
+        status = 1
+        raise
+
+    finally:
+        (fatal, errors, warnings, tests) = logger.close()
+        if fatal or errors:
+            status = 1
+
+    sys.exit(status)
@@ -22,7 +22,9 @@ import pdschecksums
 import pdsarchives
 import pdsinfoshelf
 import pdslinkshelf
+import pdsopusindex
 import pdsdependency
+import pdsmanifest
 
 LOGNAME = 'pds.validation.re-validate'
 LOGROOT_ENV = 'PDS_LOG_ROOT'
@@ -82,7 +84,8 @@ def validate_one_volume(pdsdir, voltypes, tests, args, logger):
             if args.checksums:
                 logger.open('Checksum re-validatation for', abspath)
                 try:
-                    pdschecksums.validate(temp_pdsdir, logger=logger)
+                    pdschecksums.validate(temp_pdsdir, logger=logger,
+                                          trust_stat=args.trust_stat)
                 finally:
                     tests_performed += 1
                     logger.close()
@@ -111,7 +114,8 @@ def validate_one_volume(pdsdir, voltypes, tests, args, logger):
                 temp_pdsdir = pdsfile.PdsFile.from_abspath(prefix)
                 logger.open('Checksum re-validatation for', abspath)
                 try:
-                    pdschecksums.validate(temp_pdsdir, basename, logger)
+                    pdschecksums.validate(temp_pdsdir, basename, logger,
+                                          trust_stat=args.trust_stat)
                 finally:
                     tests_performed += 1
                     logger.close()
@@ -141,6 +145,17 @@ def validate_one_volume(pdsdir, voltypes, tests, args, logger):
                         tests_performed += 1
                         logger.close()
 
+        # OPUS ID index, if the volume has one...
+        if args.opusindex and 'volumes' in voltypes:
+            opus_path = pdsdir.shelf_path_and_lskip('opus')[0]
+            if os.path.exists(opus_path):
+                logger.open('OPUS ID index re-validatation for', pdsdir.abspath)
+                try:
+                    pdsopusindex.validate(pdsdir, logger=logger)
+                finally:
+                    tests_performed += 1
+                    logger.close()
+
         # Infoshelves for each 'archive-' + voltype...
         if args.infoshelves and args.archives:
             for voltype in voltypes:
@@ -179,6 +194,7 @@ def validate_one_volume(pdsdir, voltypes, tests, args, logger):
         logger.exception(e)
 
     finally:
+        pdsmanifest.clear_cache()   # each volume is only scanned once
         if tests_performed == 1:
             logger.info('1 re-validation test performed', pdsdir.abspath)
         else:
@@ -479,13 +495,17 @@ parser.add_argument('--info', '-I', action='store_true',
 parser.add_argument('--links', '-L', action='store_true',
                     help='Validate linkshelves.')
 
+parser.add_argument('--opus', '-O', action='store_true',
+                    help='Validate OPUS ID index shelves.')
+
 parser.add_argument('--dependencies', '-D', action='store_true',
                     help='Validate dependencies.')
 
 parser.add_argument('--full', '-F', action='store_true',
                     help='Perform the full set of validation tests '           +
                          '(checksums, archives, infoshelves, linkshelves, '    +
-                         'dependencies). This is the default.')
+                         'OPUS ID indexes, dependencies). This is the '        +
+                         'default.')
 
 parser.add_argument('--timeless', '-T', action='store_true',
                     help='Suppress "newer modification date" tests for '       +
@@ -494,6 +514,11 @@ parser.add_argument('--timeless', '-T', action='store_true',
                          'checksum and shelf files are also checked, so the '  +
                          'dates on these files are immaterial.')
 
+parser.add_argument('--trust-stat', dest='trust_stat', action='store_true',
+                    help='During checksum validation, do not read files '     +
+                         'whose size, modification time and inode are '        +
+                         'unchanged since their checksums were calculated.')
+
 parser.add_argument('--volumes', '-v', action='store_true',
                     help='Check volume directories.')
 
@@ -519,6 +544,9 @@ parser.add_argument('--all', '-a', action='store_true',
 # Parse and validate the command line
 args = parser.parse_args()
 
+# All the tests of one volume share one scan of each directory tree
+pdsmanifest.use_cache()
+
 # Interpret file types
 voltypes = []
 if args.volumes:
@@ -540,16 +568,19 @@ checksums    = args.checksums
 archives     = args.archives
 infoshelves  = args.info
 linkshelves  = args.links
+opusindex    = args.opus
 dependencies = args.dependencies
 
 if args.full or not (checksums or archives or infoshelves or linkshelves or
-                     dependencies):
+                     opusindex or dependencies):
     checksums    = True
     archives     = True
     infoshelves  = True
     linkshelves  = True
+    opusindex    = True
     dependencies = True
 
+opusindex    &= ('volumes' in voltypes)
 dependencies &= ('volumes' in voltypes)
 linkshelves  &= (('volumes' in voltypes or 'metadata' in voltypes or
                                            'calibrated' in voltypes))
@@ -558,6 +589,7 @@ args.checksums    = checksums
 args.archives     = archives
 args.infoshelves  = infoshelves
 args.linkshelves  = linkshelves
+args.opusindex    = opusindex
 args.dependencies = dependencies
 
 tests = []
@@ -565,6 +597,7 @@ if checksums   : tests.append('checksums')
 if archives    : tests.append('archives')
 if infoshelves : tests.append('infoshelves')
 if linkshelves : tests.append('linkshelves')
+if opusindex   : tests.append('opusindex')
 if dependencies: tests.append('dependencies')
 
 args.timeless = args.timeless and args.dependencies
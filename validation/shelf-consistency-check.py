@@ -47,7 +47,8 @@ for path in paths:
             continue
 
         # Check the file extension
-        if not (name.endswith('.py') or name.endswith('.pickle')):
+        if not (name.endswith('.py') or name.endswith('.pickle') or
+                name.endswith('.shelf')):
             print('*** Extraneous file found: ' + shelf_path)
             errors += 1
             continue